@@ -0,0 +1,73 @@
+"""
+Clientes boto3 compartilhados pelo pipeline, criados no primeiro uso.
+"""
+import os
+import threading
+
+from limiter import LIMITED_SERVICES
+
+# Uploads paralelos de frames compartilham o pool de conexões do cliente S3
+FRAME_UPLOAD_WORKERS = int(os.environ.get('FRAME_UPLOAD_WORKERS', '8'))
+
+# Vídeos de um lote (várias notificações num mesmo evento ou manifesto) processados ao mesmo tempo
+BATCH_WORKERS = max(1, int(os.environ.get('BATCH_WORKERS', '4')))
+
+class ClientRegistry:
+    """
+    Clientes boto3 criados no primeiro uso a partir de uma única sessão (a criação de cada cliente, que carrega
+    o modelo do serviço, era o maior custo do import). Os vídeos do lote compartilham os clientes, então os
+    pools de conexão crescem com BATCH_WORKERS.
+    """
+
+    def __init__(self, pool_sizes):
+        self.pool_sizes = pool_sizes
+        self._session = None
+        self._clients = {}
+        self._lock = threading.Lock()
+
+    def get(self, service):
+        client = self._clients.get(service)
+        if client is not None:
+            return client
+        # Sessões do boto3 não são thread-safe: a criação é serializada
+        with self._lock:
+            if service not in self._clients:
+                import boto3.session
+                from botocore.config import Config
+                if self._session is None:
+                    self._session = boto3.session.Session()
+                config = Config(max_pool_connections=self.pool_sizes.get(service, 10))
+                if service in LIMITED_SERVICES:
+                    # Uma tentativa só: o ServiceLimiter decide backoff e novas tentativas; os retries do botocore
+                    # multiplicariam as tentativas e esconderiam o throttle do limiter (S3 e Lambda seguem o padrão)
+                    config = config.merge(Config(retries={'mode': 'standard', 'total_max_attempts': 1}))
+                self._clients[service] = self._session.client(service, config=config)
+            return self._clients[service]
+
+    def use(self, service, client):
+        """Substitui o cliente de um serviço (dublês locais do benchmark e dos testes)."""
+        with self._lock:
+            self._clients[service] = client
+
+class LazyClient:
+    """Ocupa o lugar do cliente nos módulos (s3_client, ...) e delega ao registro: CLIENTS.use troca o cliente em todos."""
+
+    def __init__(self, registry, service):
+        self._registry = registry
+        self._service = service
+
+    def __getattr__(self, name):
+        return getattr(self._registry.get(self._service), name)
+
+CLIENTS = ClientRegistry({
+    's3': max(10, (FRAME_UPLOAD_WORKERS + 2) * BATCH_WORKERS),
+    'rekognition': max(10, 4 * BATCH_WORKERS),
+    'transcribe': max(10, 4 * BATCH_WORKERS),
+    'comprehend': max(10, 4 * BATCH_WORKERS),
+    'bedrock-runtime': max(10, 4 * BATCH_WORKERS),
+})
+s3_client = LazyClient(CLIENTS, 's3')
+rekognition_client = LazyClient(CLIENTS, 'rekognition')
+transcribe_client = LazyClient(CLIENTS, 'transcribe')
+comprehend_client = LazyClient(CLIENTS, 'comprehend')
+bedrock_runtime = LazyClient(CLIENTS, 'bedrock-runtime')
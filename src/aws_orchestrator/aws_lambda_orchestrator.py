@@ -1,298 +1,854 @@
 import json
-import boto3
+import re
+import math
+from botocore.exceptions import ClientError
 import time
 import logging
-import urllib.request
-import subprocess
 import os
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_EXCEPTION
+from collections import Counter
 from urllib.parse import unquote_plus
 
+# Etapas do pipeline em módulos próprios; este módulo mantém o handler, o filtro, a orquestração e o pré-voo
+from aws_clients import BATCH_WORKERS, CLIENTS, s3_client
+from batch import process_batch
+from checkpoint import NO_CACHE, PipelineCheckpoint, delete_run_markers, file_id_for, get_content_key, get_json, put_json, run_prefix
+from chunking import CHUNK_MIN_DURATION_SECONDS, CHUNK_SECONDS, run_chunked_analysis, split_video, summarize_chunks
+from frames import FFMPEG_PATH, FRAME_WIDTH, extract_and_upload_frames, presign_frames, select_frames_by_risk
+from jobs import (POLL_INITIAL_SECONDS, POLL_MAX_SECONDS, JobFailedError, PipelineCancelled, PollDeadlineExceeded,
+                  get_transcription_results, get_video_analysis_results, start_transcription, start_video_analysis)
+from report import ReportFormatError, format_report, generate_multimodal_report
+from sentiment import analyze_text
+from status_writer import PROGRESS_PUBLISHER, STATUS_WRITER, publish_progress, update_status
+from timeline import MultimodalTimeline, summarize_emotions
+from tracing import emit_metrics, span, start_trace, submit_with_context, use_plan
+
+# boto3, NumPy, urllib.request e subprocess são importados sob demanda: um evento ignorado
+# (ou uma invocação que não chega ao FFmpeg) não paga esses imports no cold start
+
 # Configuração de Logging
 logger = logging.getLogger()
 logger.setLevel(logging.INFO)
 
-# Inicialização dos Clientes AWS
-s3_client = boto3.client('s3')
-rekognition_client = boto3.client('rekognition')
-transcribe_client = boto3.client('transcribe')
-comprehend_client = boto3.client('comprehend')
-bedrock_runtime = boto3.client('bedrock-runtime')
-
-def update_status(bucket, file_id, step, message, details=None):
-    """Salva um arquivo de status no S3 para o frontend monitorar."""
-    status_data = {
-        "step": step,
-        "message": message,
-        "timestamp": time.time(),
-        "details": details,
-        "status": "processing" if step != "COMPLETED" else "finished"
-    }
-    status_key = f"status/{file_id}.json"
+# Filtro antes do despacho (listas separadas por vírgula). Com a notificação do bucket ampla, as gravações
+# do próprio pipeline (status/, reports/, frames/...) também invocam a Lambda e são descartadas aqui
+UPLOAD_PREFIXES = tuple(p.strip() for p in os.environ.get('UPLOAD_PREFIXES', 'uploads/').split(',') if p.strip())
+PIPELINE_PREFIXES = tuple(p.strip() for p in os.environ.get('PIPELINE_PREFIXES', 'status/,reports/,frames/,chunks/,state/,cache/').split(',') if p.strip())
+UPLOAD_EXTENSIONS = tuple(e.strip().lower() for e in os.environ.get('UPLOAD_EXTENSIONS', '.mp4,.mov,.avi,.mkv').split(',') if e.strip())
+UPLOAD_MIN_BYTES = int(os.environ.get('UPLOAD_MIN_BYTES', '1'))
+UPLOAD_MAX_BYTES = int(os.environ.get('UPLOAD_MAX_BYTES', '0'))  # 0 = sem limite
+# Prefixos de Content-Type aceitos (ex.: "video/"); vazio dispensa o HEAD, já que o evento do S3 não traz o tipo
+UPLOAD_CONTENT_TYPES = tuple(t.strip().lower() for t in os.environ.get('UPLOAD_CONTENT_TYPES', '').split(',') if t.strip())
+
+# Expressões regulares compiladas uma única vez
+FFMPEG_DURATION_PATTERN = re.compile(r'Duration: (\d+):(\d+):(\d+\.\d+)')
+FFMPEG_FORMAT_PATTERN = re.compile(r'Input #0, (.+?), from ')
+FFMPEG_STREAM_PATTERN = re.compile(r'Stream #\d+:\d+\S*: (Video|Audio): (\w+)(.*)')
+FFMPEG_RESOLUTION_PATTERN = re.compile(r', (\d{2,5})x(\d{2,5})')
+FFMPEG_FPS_PATTERN = re.compile(r'([\d.]+) fps')
+FFMPEG_SAMPLE_RATE_PATTERN = re.compile(r'(\d+) Hz, ([\w.()]+)')
+FFMPEG_ROTATION_PATTERN = re.compile(r'rotation of (-?[\d.]+) degrees')
+
+# Modo de orquestração: 'concurrent' aguarda vídeo e áudio em paralelo, 'sequential' mantém o fluxo antigo
+# e 'event' encerra após iniciar os jobs e retoma quando as notificações de conclusão chegam
+ORCHESTRATION_MODE = os.environ.get('ORCHESTRATION_MODE', 'concurrent')
+
+# Ao parar perto do timeout, reinvoca a função de forma assíncrona para continuar do checkpoint
+RESUME_ON_DEADLINE = os.environ.get('RESUME_ON_DEADLINE', 'true').lower() == 'true'
+# Falhas transitórias seguidas (com os jobs preservados) antes de encerrar o vídeo com ERROR;
+# 3 = a invocação original mais os 2 retries assíncronos padrão da Lambda
+PIPELINE_MAX_ATTEMPTS = int(os.environ.get('PIPELINE_MAX_ATTEMPTS', '3'))
+
+# Pré-voo: o ffprobe lê só o cabeçalho do vídeo (URL assinada, range requests) e o plano de processamento sai dele
+PREFLIGHT_ENABLED = os.environ.get('PREFLIGHT_ENABLED', 'true').lower() == 'true'
+FFPROBE_PATH = os.environ.get('FFPROBE_PATH') or os.path.join(os.path.dirname(FFMPEG_PATH), 'ffprobe')
+PREFLIGHT_PROBE_BYTES = int(os.environ.get('PREFLIGHT_PROBE_BYTES', '1000000'))
+# Frames de vídeos mais largos que isso são reduzidos na extração (0 = nunca; FRAME_WIDTH fixo tem prioridade)
+FRAME_MAX_WIDTH = int(os.environ.get('FRAME_MAX_WIDTH', '1280'))
+# Duração esperada dos jobs (base + por minuto de mídia), usada no intervalo inicial do polling
+EXPECTED_JOB_BASE_SECONDS = float(os.environ.get('EXPECTED_JOB_BASE_SECONDS', '20'))
+EXPECTED_JOB_SECONDS_PER_MEDIA_MINUTE = float(os.environ.get('EXPECTED_JOB_SECONDS_PER_MEDIA_MINUTE', '30'))
+
+def lambda_handler(event, context):
     try:
-        s3_client.put_object(
-            Bucket=bucket,
-            Key=status_key,
-            Body=json.dumps(status_data, indent=4, ensure_ascii=False),
-            ContentType='application/json'
-        )
+        return _handle_event(event, context)
+    finally:
+        # A Lambda congela threads em segundo plano após o retorno: nada pendente pode ficar para trás
+        STATUS_WRITER.flush()
+        PROGRESS_PUBLISHER.flush()
+
+def _handle_event(event, context):
+    # Eventos de conclusão (SNS/SQS/EventBridge) retomam um pipeline iniciado no modo 'event'
+    completions = parse_completion_events(event)
+    if completions:
+        return handle_completion_events(completions)
+
+    # Retomada explícita a partir do checkpoint ({"resume": {"bucket": ..., "file_id": ...}})
+    if 'resume' in event:
+        return resume_from_checkpoint(event['resume']['bucket'], event['resume']['file_id'], context)
+
+    uploads = parse_upload_records(event)
+    videos = filter_uploads(uploads)
+    # Nada a processar: responde antes de qualquer cliente ou thread (para o SQS, sem falhas = lote concluído)
+    if not videos:
+        return {'statusCode': 200, 'body': 'Ignored'}
+    # Mensagens do SQS sempre passam pelo lote, que sabe devolver batchItemFailures
+    if len(uploads) > 1 or 'manifest' in event or any(message_id for _, _, _, message_id in uploads):
+        return process_batch(videos, context, process_upload, ignored=len(uploads) - len(videos))
+    bucket_name, file_key, record, _ = videos[0]
+    return process_upload(bucket_name, file_key, record, context)
+
+def process_upload(bucket_name, file_key, record, context):
+    logger.info(f"EVENTO RECEBIDO - Bucket: {bucket_name}, Key: {file_key}")
+
+    # --- FILTRO DE SEGURANÇA REFORÇADO (EVITAR LOOP) ---
+    if not is_video_upload(file_key):
+        logger.info(f"FILTRO ATIVADO: Ignorando arquivo '{file_key}' pois não é um vídeo na pasta uploads/.")
+        return {'statusCode': 200, 'body': 'Ignored'}
+    # --------------------------------------------------
+
+    file_id = file_id_for(file_key)
+    checkpoint = None
+    try:
+        with start_trace(file_id):
+            update_status(bucket_name, file_id, "INIT", "Iniciando análise multimodal...")
+
+            content_key = get_content_key(bucket_name, file_key, record)
+            # Uma nova entrega do mesmo evento (retry assíncrono da Lambda) continua do último checkpoint
+            checkpoint = PipelineCheckpoint.begin(bucket_name, file_id, file_key, content_key)
+            return process_video(checkpoint, context)
+
     except Exception as e:
-        logger.error(f"Erro ao atualizar status: {str(e)}")
+        response = failure_response(bucket_name, file_id, checkpoint, e)
+        if response is None:
+            raise
+        return response
 
-def lambda_handler(event, context):
+def failure_response(bucket, file_id, checkpoint, error):
+    """
+    Decide o destino de uma falha do pipeline. Erros transitórios devolvem None: quem chamou relança a exceção
+    para a plataforma (retry assíncrono da Lambda, nova entrega do SQS), e a próxima tentativa continua do
+    checkpoint com os jobs que seguem rodando. Job com FAILED, relatório fora do contrato ou tentativas
+    esgotadas encerram o vídeo com ERROR e devolvem a resposta 500.
+    """
+    if isinstance(error, PollDeadlineExceeded):
+        # Sem autoinvocação: o progresso já está salvo e a nova entrega retoma dele
+        return None
+    if isinstance(error, JobFailedError) and checkpoint is not None:
+        checkpoint.clear_job(error.job_id)
+    error_msg = f"Erro: {str(error)}"
+    logger.error(error_msg)
+    if checkpoint is not None and not isinstance(error, (JobFailedError, ReportFormatError)):
+        try:
+            attempts = checkpoint.record_failure()
+        except Exception:
+            attempts = 0
+        if attempts < PIPELINE_MAX_ATTEMPTS:
+            try:
+                update_status(bucket, file_id, "RETRYING", f"Falha temporária ({error}); nova tentativa a partir do último checkpoint...",
+                              {"tentativa": attempts + 1, "max_tentativas": PIPELINE_MAX_ATTEMPTS})
+            except Exception: pass
+            return None
     try:
-        bucket_name = event['Records'][0]['s3']['bucket']['name']
-        raw_file_key = event['Records'][0]['s3']['object']['key']
-        file_key = unquote_plus(raw_file_key)
-        
-        logger.info(f"EVENTO RECEBIDO - Bucket: {bucket_name}, Key: {file_key}")
-        
-        # --- FILTRO DE SEGURANÇA REFORÇADO (EVITAR LOOP) ---
-        is_video = any(file_key.lower().endswith(ext) for ext in ['.mp4', '.mov', '.avi', '.mkv'])
-        is_in_upload = file_key.startswith('uploads/')
-        
-        if not (is_in_upload and is_video):
-            logger.info(f"FILTRO ATIVADO: Ignorando arquivo '{file_key}' pois não é um vídeo na pasta uploads/.")
-            return {'statusCode': 200, 'body': 'Ignored'}
-        # --------------------------------------------------
-
-        file_id = file_key.split('/')[-1].split('.')[0]
-        update_status(bucket_name, file_id, "INIT", "Iniciando análise multimodal...")
-
-        # 1. Iniciar Jobs
+        update_status(bucket, file_id, "ERROR", error_msg)
+    except Exception: pass
+    return {'statusCode': 500, 'body': error_msg}
+
+def is_video_upload(file_key):
+    return key_reject_reason(file_key) is None
+
+# --- FILTRO ANTES DO DESPACHO ---
+
+# Eventos descartados por motivo desde o início do container (acumula entre invocações quentes)
+IGNORED_EVENTS = Counter()
+
+def key_reject_reason(file_key):
+    """Motivo para descartar a chave (None = vídeo em UPLOAD_PREFIXES), só com comparações de string."""
+    if file_key.startswith(PIPELINE_PREFIXES) or (UPLOAD_PREFIXES and not file_key.startswith(UPLOAD_PREFIXES)):
+        return 'prefix'
+    if not file_key.lower().endswith(UPLOAD_EXTENSIONS):
+        return 'extension'
+    return None
+
+def size_allowed(size):
+    return size >= UPLOAD_MIN_BYTES and (not UPLOAD_MAX_BYTES or size <= UPLOAD_MAX_BYTES)
+
+def upload_reject_reason(file_key, record):
+    """Filtro com o que veio no evento (tipo do evento, chave e tamanho), sem chamadas à AWS."""
+    if not record.get('eventName', 'ObjectCreated').startswith('ObjectCreated'):
+        return 'event_type'
+    reason = key_reject_reason(file_key)
+    if reason:
+        return reason
+    size = record.get('s3', {}).get('object', {}).get('size')
+    if size is not None and not size_allowed(size):
+        return 'size'
+    return None
+
+def needs_head(record):
+    """HEAD só quando há filtro de Content-Type ou o tamanho não veio no evento (ex.: manifesto)."""
+    return bool(UPLOAD_CONTENT_TYPES) or record.get('s3', {}).get('object', {}).get('size') is None
+
+def head_reject_reason(bucket, file_key, record):
+    """
+    Filtro de tamanho e Content-Type pelo HEAD. O ETag e o tamanho ficam no record, e get_content_key
+    não repete a chamada. Um erro que não seja 404 deixa o vídeo seguir (o pipeline reporta a falha).
+    """
+    try:
+        head = s3_client.head_object(Bucket=bucket, Key=file_key)
+    except ClientError as e:
+        if e.response.get('Error', {}).get('Code') in ('404', 'NoSuchKey', 'NotFound'):
+            return 'not_found'
+        logger.warning(f"HEAD de {file_key} falhou ({e}); o filtro deixa o vídeo seguir.")
+        return None
+    obj = record.setdefault('s3', {}).setdefault('object', {})
+    obj.setdefault('size', head['ContentLength'])
+    obj.setdefault('eTag', head['ETag'])
+    if not size_allowed(head['ContentLength']):
+        return 'size'
+    if UPLOAD_CONTENT_TYPES and not head.get('ContentType', '').lower().startswith(UPLOAD_CONTENT_TYPES):
+        return 'content_type'
+    return None
+
+def filter_uploads(uploads):
+    """
+    Filtro antes do despacho: descarta eventos que não são criação de objeto, chaves fora de UPLOAD_PREFIXES
+    (ou nas pastas do próprio pipeline), extensões que não são de vídeo e objetos fora dos limites de tamanho.
+    Só os candidatos que precisam de HEAD (Content-Type ou tamanho ausente) chegam ao S3, em paralelo.
+    """
+    ignored = Counter()
+    candidates = []
+    for upload in uploads:
+        reason = upload_reject_reason(upload[1], upload[2])
+        if reason:
+            ignored[reason] += 1
+        else:
+            candidates.append(upload)
+
+    to_head = [upload for upload in candidates if needs_head(upload[2])]
+    if to_head:
+        with ThreadPoolExecutor(max_workers=min(BATCH_WORKERS, len(to_head))) as executor:
+            reasons = dict(zip(map(id, to_head), executor.map(lambda upload: head_reject_reason(*upload[:3]), to_head)))
+        for reason in reasons.values():
+            if reason:
+                ignored[reason] += 1
+        candidates = [upload for upload in candidates if not reasons.get(id(upload))]
+
+    if not uploads:
+        ignored['no_records'] += 1
+    if ignored:
+        IGNORED_EVENTS.update(ignored)
+        logger.info(f"FILTRO ATIVADO: {sum(ignored.values())} ignorados {dict(ignored)} "
+                    f"(desde o início do container: {dict(IGNORED_EVENTS)})")
+        emit_metrics("filter", unit="Count", IgnoredEvents=sum(ignored.values()))
+    return candidates
+
+# --- LOTES (VÁRIOS VÍDEOS POR EVENTO) ---
+
+def parse_upload_records(event):
+    """
+    Uploads de um evento como tuplas (bucket, file_key, record, message_id), na ordem de chegada.
+    Aceita notificações do S3 diretas, via SNS ou SQS (message_id é o da mensagem do SQS, usado em
+    batchItemFailures) e o evento {"manifest": {"bucket": ..., "key": ...}} com a lista de vídeos no S3.
+    """
+    if 'manifest' in event:
+        return read_upload_manifest(event['manifest']['bucket'], event['manifest']['key'])
+    uploads = []
+    for record in event.get('Records', []):
+        message_id = record.get('messageId')
+        if 's3' in record:
+            s3_records = [record]
+        else:
+            message = record.get('body') or record.get('Sns', {}).get('Message')
+            try:
+                payload = json.loads(message) if message else {}
+            except ValueError:
+                continue
+            # Notificação do S3 publicada no SNS e entregue ao SQS sem raw delivery
+            if isinstance(payload, dict) and 'Message' in payload and 'Records' not in payload:
+                try:
+                    payload = json.loads(payload['Message'])
+                except (ValueError, TypeError):
+                    continue
+            if not isinstance(payload, dict):
+                continue
+            s3_records = payload.get('Records', [])
+        for s3_record in s3_records:
+            if 's3' in s3_record:
+                uploads.append((s3_record['s3']['bucket']['name'], unquote_plus(s3_record['s3']['object']['key']), s3_record, message_id))
+    return uploads
+
+def read_upload_manifest(bucket, key):
+    """Manifesto de lote: JSON com uma lista de chaves (ou de {"bucket", "key"}), ou uma chave por linha."""
+    body = s3_client.get_object(Bucket=bucket, Key=key)['Body'].read().decode('utf-8')
+    try:
+        entries = json.loads(body)
+    except ValueError:
+        entries = [line.strip() for line in body.splitlines() if line.strip()]
+    if isinstance(entries, dict):
+        entries = entries.get('keys', [])
+    return [(entry.get('bucket', bucket), entry['key'], {}, None) if isinstance(entry, dict) else (bucket, entry, {}, None)
+            for entry in entries]
+
+def resume_from_checkpoint(bucket, file_id, context):
+    checkpoint = PipelineCheckpoint.load(bucket, file_id)
+    if checkpoint is None:
+        logger.error(f"Nenhum checkpoint encontrado para {file_id}")
+        return {'statusCode': 404, 'body': 'Checkpoint not found'}
+    update_status(bucket, file_id, "INIT", "Retomando análise a partir do último checkpoint...")
+    try:
+        with start_trace(file_id):
+            return process_video(checkpoint, context)
+    except Exception as e:
+        response = failure_response(bucket, file_id, checkpoint, e)
+        if response is None:
+            raise
+        return response
+
+def process_video(checkpoint, context):
+    """Executa (ou continua) o pipeline pulando as etapas que já têm saída no checkpoint."""
+    plan = plan_processing(checkpoint)
+    with use_plan(plan):
+        response = _process_video(checkpoint, context, plan)
+    if checkpoint.manifest.get('failures'):
+        # A execução avançou: a contagem de falhas seguidas recomeça
+        checkpoint.manifest['failures'] = 0
+        checkpoint.save()
+    return response
+
+def _process_video(checkpoint, context, plan):
+    bucket_name = checkpoint.bucket
+    file_id = checkpoint.file_id
+    file_key = checkpoint.manifest['file_key']
+
+    video_results = checkpoint.get('VIDEO_DONE')
+    transcript = checkpoint.get('AUDIO_DONE')
+    # Sem faixa de áudio não há o que transcrever: nenhum job do Transcribe e nenhuma chamada ao Comprehend
+    if transcript is None and not plan['audio']:
+        transcript = ""
+        checkpoint.put('AUDIO_DONE', transcript)
+        update_status(bucket_name, file_id, "AUDIO_DONE", "Vídeo sem faixa de áudio: transcrição dispensada.")
+    if video_results is None and not plan['video']:
+        video_results = []
+        checkpoint.put('VIDEO_DONE', video_results)
+        update_status(bucket_name, file_id, "VIDEO_DONE", "Arquivo sem faixa de vídeo: análise facial dispensada.", {"faces": 0})
+
+    # Vídeo e áudio já processados: nenhum job novo, direto para o relatório (ou COMPLETED se tudo estiver salvo)
+    if video_results is not None and transcript is not None:
+        text_analysis = checkpoint.stage('TEXT_ANALYSIS', lambda: analyze_text(transcript))
+        finalize_analysis(bucket_name, file_key, file_id, video_results, transcript, text_analysis, checkpoint,
+                          checkpoint.manifest.get('chunks'))
+        return {'statusCode': 200, 'body': 'Success'}
+
+    # Vídeo longo: dividido em trechos analisados em paralelo (os trechos ficam no manifesto para a retomada)
+    chunks = checkpoint.manifest.get('chunks')
+    if chunks is None and plan['chunk_seconds'] and video_results is None:
+        update_status(bucket_name, file_id, "VIDEO_START", "Vídeo longo: dividindo em trechos para análise paralela...")
+        chunks = split_video(bucket_name, file_key, file_id, plan['chunk_seconds'])
+        checkpoint.set_job('chunks', chunks)
+
+    # 1. Iniciar Jobs (só os que não têm saída nem job em andamento)
+    notification_channel = get_notification_channel() if ORCHESTRATION_MODE == 'event' else None
+    rek_job_id = checkpoint.manifest.get('rek_job_id')
+    trans_job_name = checkpoint.manifest.get('trans_job_name')
+    if not chunks and video_results is None and rek_job_id is None:
         update_status(bucket_name, file_id, "VIDEO_START", "Iniciando Amazon Rekognition (Vídeo)...")
-        rek_job_id = start_video_analysis(bucket_name, file_key)
-        
+        rek_job_id = start_video_analysis(bucket_name, file_key, notification_channel)
+        checkpoint.set_job('rek_job_id', rek_job_id)
+    
+    if not chunks and transcript is None and trans_job_name is None:
         update_status(bucket_name, file_id, "AUDIO_START", "Iniciando Amazon Transcribe (Áudio)...")
         trans_job_name = start_transcription(bucket_name, file_key)
-        
-        # 2. Aguardar Vídeo
-        update_status(bucket_name, file_id, "VIDEO_WAIT", "Aguardando processamento de frames e emoções...")
-        video_results = get_video_analysis_results(rek_job_id)
-        
-        # 3. Aguardar Áudio
-        update_status(bucket_name, file_id, "AUDIO_WAIT", "Aguardando transcrição de áudio para texto...")
-        transcript = get_transcription_results(trans_job_name)
-        update_status(bucket_name, file_id, "AUDIO_DONE", "Transcrição concluída.", {"transcript_preview": transcript[:100] + "..."})
-        
-        # 4. Comprehend
-        update_status(bucket_name, file_id, "TEXT_ANALYSIS", "Analisando sentimento e linguagem no texto...")
-        text_analysis = analyze_text(transcript)
-        
-        # 5. Bedrock
-        update_status(bucket_name, file_id, "FUSION", "Realizando fusão multimodal e gerando justificativas...")
-        final_report = generate_multimodal_report(video_results, transcript, text_analysis, [])
-        
-        import re
-
-        match = re.search(r'Score de Risco:\s*(\d+)', final_report)
-        risk_score = int(match.group(1)) if match else 50
-
-        print("Risk Score Extraído:", risk_score)
-
-        coherent_frames = select_frames_by_risk(video_results, risk_score)
-
-        coherent_frames = extract_and_upload_frames(
-            bucket_name,
-            file_key,
-            file_id,
-            coherent_frames
-        )
+        checkpoint.set_job('trans_job_name', trans_job_name)
 
-        # 6. Finalizar
-        report_key = f"reports/{file_id}_report.json"
+    if ORCHESTRATION_MODE == 'event':
+        # A Lambda encerra aqui; a conclusão dos jobs chega como evento e retoma em resume_pipeline
+        register_event_jobs(checkpoint, None if video_results is not None else rek_job_id, None if transcript is not None else trans_job_name)
+        update_status(bucket_name, file_id, "VIDEO_WAIT", "Aguardando processamento de frames, emoções e transcrição de áudio...")
+        return {'statusCode': 202, 'body': 'Started'}
+    
+    # 2-4. Aguardar Vídeo, Áudio e Comprehend
+    try:
+        if chunks:
+            video_results, transcript, text_analysis = run_chunked_analysis(bucket_name, file_id, chunks, context, checkpoint)
+        elif ORCHESTRATION_MODE == 'sequential':
+            video_results, transcript, text_analysis = run_sequential_analysis(bucket_name, file_id, rek_job_id, trans_job_name, context, checkpoint)
+        else:
+            video_results, transcript, text_analysis = run_concurrent_analysis(bucket_name, file_id, rek_job_id, trans_job_name, context, checkpoint)
+    except PollDeadlineExceeded as e:
+        # Encerra antes do timeout preservando os IDs dos jobs, que continuam rodando na AWS
+        logger.warning(str(e))
+        update_status(bucket_name, file_id, "VIDEO_WAIT", "Tempo limite da Lambda próximo: progresso salvo para retomada.", {"checkpoint": f"state/{file_id}.json"})
+        if not schedule_resume(bucket_name, file_id, context):
+            # Sem autoinvocação, a exceção devolve o evento à plataforma, que o entrega de novo a partir do checkpoint
+            raise
+        return {'statusCode': 202, 'body': 'Checkpointed'}
+
+    finalize_analysis(bucket_name, file_key, file_id, video_results, transcript, text_analysis, checkpoint, chunks)
+    return {'statusCode': 200, 'body': 'Success'}
+
+def schedule_resume(bucket, file_id, context):
+    """Com RESUME_ON_DEADLINE, reinvoca a própria função de forma assíncrona para continuar do checkpoint."""
+    if not RESUME_ON_DEADLINE or context is None:
+        return False
+    try:
+        CLIENTS.get('lambda').invoke(
+            FunctionName=context.function_name,
+            InvocationType='Event',
+            Payload=json.dumps({"resume": {"bucket": bucket, "file_id": file_id}})
+        )
+        return True
+    except Exception as e:
+        logger.error(f"Erro ao agendar retomada: {str(e)}")
+        return False
+
+def finalize_analysis(bucket_name, file_key, file_id, video_results, transcript, text_analysis, checkpoint=NO_CACHE, chunks=None):
+    """Etapas finais comuns a todos os modos: Bedrock, frames críticos e relatório."""
+    timeline = MultimodalTimeline(video_results, transcript, checkpoint.get('AUDIO_WORDS'), text_analysis)
+    emotion_summary = summarize_emotions(timeline.faces)
+
+    # 5. Bedrock
+    final_report = checkpoint.get('FUSION')
+    if not isinstance(final_report, dict):
+        # Checkpoints anteriores ao contrato estruturado guardavam texto livre
+        final_report = None
+    # Frames salvos só valem junto com o relatório que definiu o score deles
+    coherent_frames = checkpoint.get('COMPLETED') if final_report is not None else None
+    early_frames = {}
+    frame_executor = ThreadPoolExecutor(max_workers=1)
+    try:
+        if final_report is None:
+            update_status(bucket_name, file_id, "FUSION", "Realizando fusão multimodal e gerando justificativas...")
+
+            def on_score(score):
+                # Seleção e extração dos frames começam enquanto o Bedrock ainda escreve a análise
+                if score not in early_frames:
+                    early_frames[score] = submit_with_context(frame_executor, select_and_extract_frames, bucket_name, file_key, file_id, video_results, score, timeline)
+
+            def on_text(partial_report):
+                publish_progress(file_id, "FUSION", "Gerando relatório...", {"partial_report": partial_report})
+
+            final_report = generate_multimodal_report(video_results, transcript, text_analysis, [], summarize_chunks(timeline, chunks), timeline, emotion_summary,
+                                                      on_text=on_text, on_score=on_score)
+            checkpoint.put('FUSION', final_report)
+
+        risk_score = final_report["score"]
+        logger.info(f"RISCO {file_id}: score {risk_score} ({final_report['nivel']})")
+
+        if coherent_frames is not None:
+            # Os JPEGs já estão no S3; só as URLs assinadas precisam ser renovadas
+            coherent_frames = presign_frames(bucket_name, coherent_frames)
+        else:
+            if risk_score in early_frames:
+                coherent_frames = early_frames[risk_score].result()
+            else:
+                coherent_frames = select_and_extract_frames(bucket_name, file_key, file_id, video_results, risk_score, timeline)
+            checkpoint.put('COMPLETED', coherent_frames)
+    finally:
+        frame_executor.shutdown(wait=True)
+        # Extrações antecipadas com outro score (ou interrompidas por uma falha) não podem ficar órfãs no S3
+        delete_unused_frames(bucket_name, early_frames, coherent_frames)
+
+    # 6. Finalizar
+    report_key = f"reports/{file_id}_report.json"
+    report_body = json.dumps({
+        "report": format_report(final_report),
+        "risk_score": final_report["score"],
+        "risk_level": final_report["nivel"],
+        "evidence": final_report["evidencias"],
+        "recommendations": final_report["recomendacoes"],
+        "transcript": transcript, 
+        "video_data": video_results,
+        "timeline": timeline.speech_emotions(),
+        "emotion_summary": emotion_summary,
+        "critical_frames": coherent_frames
+    }, indent=4, ensure_ascii=False)
+    with span("s3.put_report", bytes=len(report_body.encode('utf-8'))):
         s3_client.put_object(
             Bucket=bucket_name,
             Key=report_key,
-            Body=json.dumps({
-                "report": final_report, 
-                "transcript": transcript, 
-                "video_data": video_results,
-                "critical_frames": coherent_frames
-            }, indent=4, ensure_ascii=False),
+            Body=report_body,
             ContentType='application/json'
         )
-        
-        update_status(bucket_name, file_id, "COMPLETED", "Análise completa! Relatório com frames críticos gerado.", {"report_key": report_key})
-        
-        return {'statusCode': 200, 'body': 'Success'}
-
-    except Exception as e:
-        error_msg = f"Erro: {str(e)}"
-        logger.error(error_msg)
-        try: 
-            if 'file_id' in locals():
-                update_status(bucket_name, file_id, "ERROR", error_msg)
-        except: pass
-        return {'statusCode': 500, 'body': error_msg}
-
-def start_video_analysis(bucket, key):
-    return rekognition_client.start_face_detection(Video={'S3Object': {'Bucket': bucket, 'Name': key}}, FaceAttributes='ALL')['JobId']
-
-def get_video_analysis_results(job_id):
-    while True:
-        res = rekognition_client.get_face_detection(JobId=job_id)
-        if res['JobStatus'] == 'SUCCEEDED':
-            results = []
-            for f in res['Faces']:
-                if 'Emotions' in f['Face']:
-                    top_emotion = max(f['Face']['Emotions'], key=lambda x: x['Confidence'])
-                    results.append({
-                        "Timestamp": f['Timestamp'],
-                        "Emotion": top_emotion['Type'],
-                        "Confidence": top_emotion['Confidence']
-                    })
-            return results
-        if res['JobStatus'] == 'FAILED': raise Exception(f"Rekognition Failed: {res.get('StatusMessage', 'Unknown')}")
-        time.sleep(5)
-
-def select_critical_frames(video_results, count=6):
-    """Seleciona os frames mais relevantes baseados em emoções de risco."""
-    critical_emotions = ['FEAR', 'SADNESS', 'ANGRY', 'CONFUSED']
-    # Filtrar apenas emoções críticas
-    filtered = [r for r in video_results if r['Emotion'] in critical_emotions]
-    # Se não houver críticas, pega as de maior confiança geral
-    if not filtered: filtered = video_results
-    
-    # Ordenar por confiança e pegar os top N únicos por segundo aproximado
-    sorted_res = sorted(filtered, key=lambda x: x['Confidence'], reverse=True)
-    seen_seconds = set()
-    selected = []
-    for r in sorted_res:
-        sec = round(r['Timestamp'] / 1000)
-        if sec not in seen_seconds:
-            selected.append(r)
-            seen_seconds.add(sec)
-        if len(selected) >= count: break
     
-    return selected
-
-def extract_and_upload_frames(bucket, file_key, file_id, critical_frames):
+    update_status(bucket_name, file_id, "COMPLETED", "Análise completa! Relatório com frames críticos gerado.", {"report_key": report_key})
+    return report_key
+
+def delete_unused_frames(bucket, early_frames, kept_frames):
+    """Remove os JPEGs das extrações antecipadas que não entraram no relatório (timestamps comuns são o mesmo objeto)."""
+    kept = {frame.get("FrameKey") for frame in kept_frames or []}
+    unused = {frame.get("FrameKey") for future in early_frames.values() if future.exception() is None
+              for frame in future.result()} - kept - {None}
+    if not unused:
+        return
+    try:
+        s3_client.delete_objects(Bucket=bucket, Delete={'Objects': [{'Key': key} for key in sorted(unused)], 'Quiet': True})
+    except Exception as e:
+        logger.error(f"Erro ao remover frames não usados: {str(e)}")
+
+def select_and_extract_frames(bucket_name, file_key, file_id, video_results, risk_score, timeline):
+    # Cópias: os frames recebem chaves próprias (Fala, FrameKey) que não pertencem a video_data
+    # "Fala" é o que estava sendo dito no momento do frame (janela de ±2s)
+    coherent_frames = [dict(frame, Fala=timeline.text_between(frame["Timestamp"] - 2000, frame["Timestamp"] + 2000))
+                       for frame in select_frames_by_risk(video_results, risk_score, timeline=timeline)]
+    return extract_and_upload_frames(bucket_name, file_key, file_id, coherent_frames)
+
+# --- MODO ORIENTADO A EVENTOS (SEM SLEEP-POLLING) ---
+
+def get_notification_channel():
+    """NotificationChannel do Rekognition a partir do ambiente (o Transcribe notifica via regra do EventBridge)."""
+    topic_arn = os.environ.get('REKOGNITION_SNS_TOPIC_ARN')
+    role_arn = os.environ.get('REKOGNITION_ROLE_ARN')
+    if not (topic_arn and role_arn):
+        raise Exception("Modo 'event' requer REKOGNITION_SNS_TOPIC_ARN e REKOGNITION_ROLE_ARN.")
+    return {'SNSTopicArn': topic_arn, 'RoleArn': role_arn}
+
+def register_event_jobs(checkpoint, rek_job_id, trans_job_name):
     """
-    Extrai frames usando FFmpeg e salva no S3.
+    Índice job -> (file_id, execução) usado pelos eventos de conclusão.
+    Os marcadores .done (video, audio e failed) e o resume.lock ficam em state/{file_id}/runs/{run_id}/: jobs novos (reenvio do mesmo
+    nome com outro conteúdo, jobs reiniciados após falha) abrem outra execução e não herdam os da anterior.
+    Etapas que já têm saída no checkpoint (job None) são marcadas como concluídas.
     """
-    local_video = "/tmp/video.mp4"
-
-    # Baixar vídeo para /tmp
-    s3_client.download_file(bucket, file_key, local_video)
-
-    enriched_frames = []
-
-    for frame in critical_frames:
-        timestamp_sec = frame["Timestamp"] / 1000
-        output_image = f"/tmp/frame_{int(frame['Timestamp'])}.jpg"
-
-        command = [
-            "/opt/bin/ffmpeg",  # já validamos que funciona
-            "-ss", str(timestamp_sec),
-            "-i", local_video,
-            "-frames:v", "1",
-            "-q:v", "2",
-            output_image
-        ]
+    bucket, file_id = checkpoint.bucket, checkpoint.file_id
+    jobs = [rek_job_id, trans_job_name]
+    previous = checkpoint.manifest.get('event_run')
+    if previous and previous['jobs'] == jobs:
+        # Reentrega do mesmo evento: os mesmos jobs continuam na mesma execução
+        run_id = previous['id']
+    else:
+        run_id = uuid.uuid4().hex
+        checkpoint.set_job('event_run', {"id": run_id, "jobs": jobs})
+        delete_run_markers(bucket, file_id, previous)
 
-        subprocess.run(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    for source, job_id in (('video', rek_job_id), ('audio', trans_job_name)):
+        if job_id is None:
+            put_json(bucket, f"{run_prefix(file_id, run_id)}/{source}.done", {"job_id": None, "cached": True, "timestamp": time.time()})
+        else:
+            put_json(bucket, f"state/jobs/{job_id}.json", {"file_id": file_id, "run_id": run_id})
 
-        # Confirma se o frame foi criado
-        if not os.path.exists(output_image):
-            print("ERRO: Frame não gerado:", output_image)
+def parse_completion_events(event):
+    """
+    Normaliza notificações de conclusão em tuplas (source, job_id, status, message_id).
+    Aceita SNS do Rekognition (direto ou via SQS) e eventos do EventBridge do Transcribe; message_id é o
+    da mensagem do SQS, usado em batchItemFailures.
+    """
+    if not isinstance(event, dict):
+        return []
+    if event.get('detail-type') == 'Transcribe Job State Change':
+        detail = event['detail']
+        return [('AUDIO', detail['TranscriptionJobName'], detail['TranscriptionJobStatus'], None)]
+
+    completions = []
+    malformed = 0
+    for record in event.get('Records', []):
+        if 's3' in record:
+            return []
+        if 'Sns' in record:
+            message = record['Sns']['Message']
+        elif 'body' in record:
+            message = record['body']
+        else:
             continue
+        try:
+            completion = parse_completion_message(message)
+        except (ValueError, KeyError, TypeError, AttributeError) as e:
+            # Uma mensagem que não é JSON válido nunca vai ser lida: devolvê-la à fila só adiaria o descarte
+            malformed += 1
+            logger.warning(f"Mensagem de conclusão malformada ignorada ({record.get('messageId')}): {str(e)}")
+            continue
+        if completion:
+            completions.append(completion + (record.get('messageId'),))
+    if malformed:
+        emit_metrics("completion", unit="Count", MalformedCompletions=malformed)
+    return completions
+
+def parse_completion_message(message):
+    """(source, job_id, status) de uma notificação, ou None se ela não for de conclusão de job."""
+    payload = json.loads(message) if isinstance(message, str) else message
+    # Mensagens SNS entregues ao SQS sem raw delivery vêm envelopadas
+    if 'Message' in payload and 'JobId' not in payload:
+        payload = json.loads(payload['Message'])
+    if payload.get('detail-type') == 'Transcribe Job State Change':
+        detail = payload['detail']
+        return ('AUDIO', detail['TranscriptionJobName'], detail['TranscriptionJobStatus'])
+    if 'JobId' in payload:
+        return ('VIDEO', payload['JobId'], payload['Status'])
+    return None
+
+def handle_completion_events(completions):
+    bucket = os.environ.get('PIPELINE_BUCKET')
+    if not bucket:
+        logger.error("PIPELINE_BUCKET não configurado; eventos de conclusão ignorados.")
+        return {'statusCode': 500, 'body': 'PIPELINE_BUCKET not set'}
+
+    results = []
+    failed_messages = []
+    for source, job_id, status, message_id in completions:
+        try:
+            results.append(handle_job_completion(bucket, source, job_id, status))
+        except Exception:
+            # Falha transitória: no SQS só esta mensagem volta para a fila; SNS/EventBridge reentregam o evento
+            if not message_id:
+                raise
+            results.append('Retry')
+            failed_messages.append(message_id)
+    return {
+        'statusCode': 200,
+        'body': json.dumps(results),
+        'batchItemFailures': [{"itemIdentifier": message_id} for message_id in failed_messages]
+    }
 
-        s3_frame_key = f"frames/{file_id}_{int(frame['Timestamp'])}.jpg"
-
-        # Upload para S3
-        s3_client.upload_file(
-            output_image,
-            bucket,
-            s3_frame_key,
-            ExtraArgs={'ContentType': 'image/jpeg'}
-        )
+def handle_job_completion(bucket, source, job_id, status):
+    """Registra a conclusão de um job e retoma o pipeline quando vídeo e áudio terminaram."""
+    index = get_json(bucket, f"state/jobs/{job_id}.json")
+    if index is None:
+        logger.info(f"Job desconhecido ignorado: {job_id}")
+        return 'Ignored'
+    file_id = index['file_id']
+    # Conclusões de jobs de uma execução substituída (outro conteúdo, jobs reiniciados) não retomam a atual
+    manifest = get_json(bucket, f"state/{file_id}.json")
+    if manifest is None or (manifest.get('event_run') or {}).get('id') != index.get('run_id'):
+        logger.info(f"Conclusão de uma execução anterior ignorada: {job_id}")
+        return 'Stale'
+    prefix = run_prefix(file_id, index['run_id'])
+    # Entregas duplicadas (SQS é at-least-once) não podem regredir um status já finalizado
+    if get_json(bucket, f"{prefix}/resume.lock") is not None:
+        return 'AlreadyResumed'
+    # Depois de um job FAILED, a conclusão do outro job não pode trocar o ERROR por VIDEO_DONE/AUDIO_DONE
+    if get_json(bucket, f"{prefix}/failed.done") is not None:
+        logger.info(f"Conclusão de uma execução encerrada com ERROR ignorada: {job_id}")
+        return 'AlreadyFailed'
 
-        # Gerar URL assinada (1 hora)
-        presigned_url = s3_client.generate_presigned_url(
-            'get_object',
-            Params={'Bucket': bucket, 'Key': s3_frame_key},
-            ExpiresIn=3600
-        )
-
-        frame["FrameImage"] = presigned_url
-        enriched_frames.append(frame)
+    try:
+        if status not in ('SUCCEEDED', 'COMPLETED'):
+            # Gravado antes do ERROR: a execução já está encerrada quando o status muda
+            put_json(bucket, f"{prefix}/failed.done", {"job_id": job_id, "status": status, "timestamp": time.time()})
+            raise JobFailedError(job_id, f"{'Rekognition' if source == 'VIDEO' else 'Transcribe'} Failed: status {status}")
+
+        put_json(bucket, f"{prefix}/{source.lower()}.done", {"job_id": job_id, "timestamp": time.time()})
+        if source == 'VIDEO':
+            update_status(bucket, file_id, "VIDEO_DONE", "Análise de frames e emoções concluída.")
+        else:
+            update_status(bucket, file_id, "AUDIO_DONE", "Transcrição concluída.")
+
+        other = 'audio' if source == 'VIDEO' else 'video'
+        if get_json(bucket, f"{prefix}/{other}.done") is None:
+            return 'Waiting'
+
+        # Os dois eventos podem chegar juntos: só quem criar o lock retoma
+        try:
+            put_json(bucket, f"{prefix}/resume.lock", {"timestamp": time.time()}, IfNoneMatch='*')
+        except ClientError as e:
+            if e.response['Error']['Code'] in ('PreconditionFailed', 'ConditionalRequestConflict'):
+                return 'AlreadyResumed'
+            raise
+
+        with start_trace(file_id):
+            resume_pipeline(bucket, file_id)
+        return 'Success'
+    except Exception as e:
+        if failure_response(bucket, file_id, PipelineCheckpoint.load(bucket, file_id), e) is None:
+            # Libera a retomada para a nova entrega desta conclusão (SQS/SNS reentregam quando a invocação falha)
+            s3_client.delete_objects(Bucket=bucket, Delete={'Objects': [{'Key': f"{prefix}/resume.lock"}], 'Quiet': True})
+            raise
+        return 'Error'
+
+def resume_pipeline(bucket, file_id):
+    """Etapa de retomada: os jobs já terminaram, então as leituras retornam na primeira consulta."""
+    checkpoint = PipelineCheckpoint.load(bucket, file_id)
+    with use_plan(build_processing_plan(checkpoint.get('PREFLIGHT'))):
+        video_results = checkpoint.stage('VIDEO_DONE', lambda: get_video_analysis_results(checkpoint.manifest['rek_job_id']))
+        transcript = checkpoint.stage('AUDIO_DONE', lambda: get_transcription_results(checkpoint.manifest['trans_job_name'], checkpoint=checkpoint))
+
+        update_status(bucket, file_id, "TEXT_ANALYSIS", "Analisando sentimento e linguagem no texto...")
+        text_analysis = checkpoint.stage('TEXT_ANALYSIS', lambda: analyze_text(transcript))
+        finalize_analysis(bucket, checkpoint.manifest['file_key'], file_id, video_results, transcript, text_analysis, checkpoint)
+
+def run_sequential_analysis(bucket_name, file_id, rek_job_id, trans_job_name, context=None, checkpoint=NO_CACHE):
+    """Fluxo original: vídeo, depois áudio, depois Comprehend."""
+    update_status(bucket_name, file_id, "VIDEO_WAIT", "Aguardando processamento de frames e emoções...")
+    video_results = checkpoint.stage('VIDEO_DONE', lambda: get_video_analysis_results(rek_job_id, context=context))
+    
+    update_status(bucket_name, file_id, "AUDIO_WAIT", "Aguardando transcrição de áudio para texto...")
+    transcript = checkpoint.stage('AUDIO_DONE', lambda: get_transcription_results(trans_job_name, context=context, checkpoint=checkpoint))
+    update_status(bucket_name, file_id, "AUDIO_DONE", "Transcrição concluída.", {"transcript_preview": transcript[:100] + "..."})
+    
+    update_status(bucket_name, file_id, "TEXT_ANALYSIS", "Analisando sentimento e linguagem no texto...")
+    text_analysis = checkpoint.stage('TEXT_ANALYSIS', lambda: analyze_text(transcript))
+    return video_results, transcript, text_analysis
+
+def _video_branch(bucket_name, file_id, rek_job_id, cancel_event, context, checkpoint):
+    video_results = checkpoint.stage('VIDEO_DONE', lambda: get_video_analysis_results(rek_job_id, cancel_event, context))
+    update_status(bucket_name, file_id, "VIDEO_DONE", "Análise de frames e emoções concluída.", {"faces": len(video_results)})
+    return video_results
+
+def _audio_branch(bucket_name, file_id, trans_job_name, cancel_event, context, checkpoint):
+    transcript = checkpoint.stage('AUDIO_DONE', lambda: get_transcription_results(trans_job_name, cancel_event, context, checkpoint))
+    update_status(bucket_name, file_id, "AUDIO_DONE", "Transcrição concluída.", {"transcript_preview": transcript[:100] + "..."})
+    # O Comprehend começa assim que a transcrição chega, sem esperar o Rekognition
+    update_status(bucket_name, file_id, "TEXT_ANALYSIS", "Analisando sentimento e linguagem no texto...")
+    return transcript, checkpoint.stage('TEXT_ANALYSIS', lambda: analyze_text(transcript))
+
+def run_concurrent_analysis(bucket_name, file_id, rek_job_id, trans_job_name, context=None, checkpoint=NO_CACHE):
+    """
+    Aguarda Rekognition e Transcribe ao mesmo tempo e roda o Comprehend no ramo de áudio.
+    A latência total fica próxima de max(vídeo, áudio) em vez da soma.
+    """
+    update_status(bucket_name, file_id, "VIDEO_WAIT", "Aguardando processamento de frames, emoções e transcrição de áudio...")
+    cancel_event = threading.Event()
+    executor = ThreadPoolExecutor(max_workers=2)
+    try:
+        video_future = submit_with_context(executor, _video_branch, bucket_name, file_id, rek_job_id, cancel_event, context, checkpoint)
+        audio_future = submit_with_context(executor, _audio_branch, bucket_name, file_id, trans_job_name, cancel_event, context, checkpoint)
 
-    return enriched_frames
+        # Falha em um ramo cancela o outro imediatamente; a causa original tem prioridade sobre o cancelamento
+        done, _ = wait([video_future, audio_future], return_when=FIRST_EXCEPTION)
+        errors = [f.exception() for f in done if f.exception() is not None]
+        if errors:
+            cancel_event.set()
+            errors.sort(key=lambda e: isinstance(e, PipelineCancelled))
+            raise errors[0]
 
-def select_frames_by_risk(video_results, risk_score, count=6):
-    if not video_results:
-        return []
+        transcript, text_analysis = audio_future.result()
+        return video_future.result(), transcript, text_analysis
+    finally:
+        executor.shutdown(wait=True)
 
-    high_risk_emotions = ['FEAR', 'SADNESS', 'ANGRY', 'CONFUSED', 'SURPRISED']
-    low_risk_emotions = ['CALM', 'HAPPY']
+# --- PRÉ-VOO: SONDAGEM DO VÍDEO E PLANO DE PROCESSAMENTO ---
 
-    if risk_score >= 70:
-        candidates = [r for r in video_results if r['Emotion'] in high_risk_emotions]
-        if not candidates:
-            candidates = sorted(video_results, key=lambda x: x['Confidence'])
-    elif risk_score <= 30:
-        candidates = [r for r in video_results if r['Emotion'] in low_risk_emotions]
-        candidates = sorted(candidates, key=lambda x: x['Confidence'], reverse=True)
-    else:
-        # risco médio → mistura equilibrada
-        candidates = video_results
-
-    seen_seconds = set()
-    selected = []
-
-    for r in candidates:
-        sec = round(r['Timestamp'] / 1000)
-        if sec not in seen_seconds:
-            selected.append(r)
-            seen_seconds.add(sec)
-        if len(selected) >= count:
-            break
-
-    return selected
-
-
-def start_transcription(bucket, key):
-    clean_name = "".join([c for c in key.split('/')[-1] if c.isalnum()])[:10]
-    job_name = f"trans_{int(time.time())}_{clean_name}"
-    transcribe_client.start_transcription_job(TranscriptionJobName=job_name, Media={'MediaFileUri': f"s3://{bucket}/{key}"}, LanguageCode='pt-BR')
-    return job_name
-
-def get_transcription_results(job_name):
-    while True:
-        res = transcribe_client.get_transcription_job(TranscriptionJobName=job_name)
-        status = res['TranscriptionJob']['TranscriptionJobStatus']
-        if status == 'COMPLETED':
-            transcript_uri = res['TranscriptionJob']['Transcript']['TranscriptFileUri']
-            with urllib.request.urlopen(transcript_uri) as response:
-                transcript_json = json.load(response)
-            return transcript_json['results']['transcripts'][0]['transcript']    
-        if status == 'FAILED': raise Exception(f"Transcribe Failed: {res['TranscriptionJob'].get('FailureReason', 'Unknown')}")
-        time.sleep(5)
-
-def analyze_text(text):
-    if not text: return {}
-    res = comprehend_client.detect_sentiment(Text=text, LanguageCode='pt')
-    return {'Sentiment': res['Sentiment'], 'Scores': res['SentimentScore']}
-
-def generate_multimodal_report(video_data, transcript, text_analysis, critical_frames):
-    prompt_text = f"""
-    VOCÊ É UM ASSISTENTE ESPECIALIZADO EM SAÚDE DA MULHER E SEGURANÇA.
-    Sua tarefa é analisar dados multimodais e justificar o nível de risco encontrado.
-
-    DADOS DE VÍDEO (Resumo): {json.dumps(video_data[:10])}    
-    TRANSCRIÇÃO: "{transcript}"
-    SENTIMENTO: {json.dumps(text_analysis)}
-
-    POR FAVOR, GERE UM RELATÓRIO COM:
-    1. SCORE DE RISCO (0-100) E NÍVEL.
-    2. EVIDÊNCIAS QUE EMBASAM O SCORE.
-    3. EVIDÊNCIAS VISUAIS: Explique quais tipos de expressões faciais ou momentos do vídeo embasam o score. Caso não haja expressões de risco explícitas, explique como a neutralidade ou estabilidade emocional contribui para a avaliação.
-    4. ANÁLISE DETALHADA E RECOMENDAÇÕES.
+def probe_media(video_input):
+    """
+    Duração, streams, codecs e resolução lidos do cabeçalho pelo ffprobe (com URL assinada, só o início do
+    arquivo e o moov são buscados). Sem o ffprobe na layer, o cabeçalho impresso pelo FFmpeg é interpretado.
+    Devolve {} quando o vídeo não pôde ser lido.
+    """
+    import subprocess
+    with span("ffprobe.preflight") as attrs:
+        try:
+            result = subprocess.run([FFPROBE_PATH, "-v", "error", "-probesize", str(PREFLIGHT_PROBE_BYTES), "-print_format", "json",
+                                     "-show_format", "-show_streams", video_input], stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+            attrs.update(tool="ffprobe", returncode=result.returncode)
+            if result.returncode != 0:
+                logger.warning(f"ffprobe falhou: {result.stderr.decode('utf-8', 'ignore')[-300:]}")
+                return {}
+            return media_from_ffprobe(json.loads(result.stdout or b'{}'))
+        except FileNotFoundError:
+            result = subprocess.run([FFMPEG_PATH, "-hide_banner", "-probesize", str(PREFLIGHT_PROBE_BYTES), "-i", video_input],
+                                    stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+            attrs.update(tool="ffmpeg")
+            return media_from_ffmpeg_banner(result.stderr.decode('utf-8', 'ignore'))
+
+def _ratio(value):
+    numerator, _, denominator = (value or '').partition('/')
+    try:
+        return round(float(numerator) / float(denominator or 1), 3)
+    except (ValueError, ZeroDivisionError):
+        return None
+
+def _display_size(width, height, rotation):
+    # Vídeos de celular gravados em pé vêm com rotação de 90°: o FFmpeg gira antes de escalar
+    if rotation and abs(int(rotation)) % 180 == 90:
+        return height, width
+    return width, height
+
+def media_from_ffprobe(data):
+    streams = data.get('streams', [])
+    video = next((st for st in streams if st.get('codec_type') == 'video' and not st.get('disposition', {}).get('attached_pic')), None)
+    audio = next((st for st in streams if st.get('codec_type') == 'audio'), None)
+    if not streams:
+        return {}
+    duration = data.get('format', {}).get('duration')
+    media = {"duration_s": round(float(duration), 3) if duration else None, "format": data.get('format', {}).get('format_name'),
+             "video": None, "audio": None}
+    if video:
+        rotation = next((side.get('rotation') for side in video.get('side_data_list', []) if 'rotation' in side), None) or video.get('tags', {}).get('rotate')
+        width, height = _display_size(video.get('width'), video.get('height'), float(rotation) if rotation else 0)
+        media["video"] = {"codec": video.get('codec_name'), "width": width, "height": height, "fps": _ratio(video.get('avg_frame_rate'))}
+    if audio:
+        media["audio"] = {"codec": audio.get('codec_name'), "sample_rate": int(audio['sample_rate']) if audio.get('sample_rate') else None,
+                          "channel_layout": audio.get('channel_layout')}
+    return media
+
+def media_from_ffmpeg_banner(banner):
+    streams = [(match.group(1), match.group(2), match.group(3)) for match in FFMPEG_STREAM_PATTERN.finditer(banner)
+               if 'attached pic' not in match.group(3)]
+    if not streams:
+        return {}
+    duration = FFMPEG_DURATION_PATTERN.search(banner)
+    container = FFMPEG_FORMAT_PATTERN.search(banner)
+    media = {"duration_s": None, "format": container.group(1) if container else None, "video": None, "audio": None}
+    if duration:
+        hours, minutes, seconds = duration.groups()
+        media["duration_s"] = int(hours) * 3600 + int(minutes) * 60 + float(seconds)
+    for kind, codec, details in streams:
+        if kind == 'Video' and media["video"] is None:
+            resolution = FFMPEG_RESOLUTION_PATTERN.search(details)
+            fps = FFMPEG_FPS_PATTERN.search(details)
+            rotation = FFMPEG_ROTATION_PATTERN.search(banner)
+            width, height = (int(resolution.group(1)), int(resolution.group(2))) if resolution else (None, None)
+            width, height = _display_size(width, height, float(rotation.group(1)) if rotation else 0)
+            media["video"] = {"codec": codec, "width": width, "height": height, "fps": float(fps.group(1)) if fps else None}
+        elif kind == 'Audio' and media["audio"] is None:
+            sample_rate = FFMPEG_SAMPLE_RATE_PATTERN.search(details)
+            media["audio"] = {"codec": codec, "sample_rate": int(sample_rate.group(1)) if sample_rate else None,
+                              "channel_layout": sample_rate.group(2) if sample_rate else None}
+    return media
+
+def build_processing_plan(media):
     """
-    body = json.dumps({
-        "anthropic_version": "bedrock-2023-05-31",
-        "max_tokens": 2000,
-        "messages": [{"role": "user", "content": [{"type": "text", "text": prompt_text}]}]
-    })
-    res = bedrock_runtime.invoke_model(body=body, modelId="anthropic.claude-3-haiku-20240307-v1:0", accept="application/json", contentType="application/json")
-    return json.loads(res.get('body').read()).get('content')[0].get('text')
+    Plano do vídeo a partir da sondagem: quais análises rodar, tamanho dos trechos, largura dos frames e
+    intervalo inicial do polling. Sem sondagem (media vazio) vale o comportamento padrão.
+    """
+    plan = {"audio": True, "video": True, "chunk_seconds": None}
+    if not media:
+        return plan
+    plan["audio"] = media.get("audio") is not None
+    plan["video"] = media.get("video") is not None
+    duration = media.get("duration_s")
+
+    # No modo 'event' a Lambda não fica esperando os jobs: os trechos exigiriam um estado por trecho nas notificações
+    if (duration and plan["video"] and CHUNK_SECONDS > 0 and ORCHESTRATION_MODE != 'event'
+            and duration >= CHUNK_MIN_DURATION_SECONDS and duration > CHUNK_SECONDS):
+        # Menor número de trechos de até CHUNK_SECONDS, todos do mesmo tamanho: o último não sobra curto
+        count = math.ceil(duration / CHUNK_SECONDS)
+        plan["chunk_seconds"] = round(duration / count, 1)
+
+    width = (media.get("video") or {}).get("width")
+    if not FRAME_WIDTH and FRAME_MAX_WIDTH and width and width > FRAME_MAX_WIDTH:
+        plan["frame_width"] = FRAME_MAX_WIDTH
+
+    if duration:
+        # Cada job cobre um trecho (ou o vídeo inteiro): consultar antes de ~10% do tempo esperado é desperdício
+        expected = EXPECTED_JOB_BASE_SECONDS + (plan["chunk_seconds"] or duration) / 60 * EXPECTED_JOB_SECONDS_PER_MEDIA_MINUTE
+        plan["expected_job_seconds"] = round(expected, 1)
+        plan["poll_initial_seconds"] = round(min(max(POLL_INITIAL_SECONDS, expected / 10), POLL_MAX_SECONDS), 2)
+    return plan
+
+def plan_processing(checkpoint):
+    """
+    Sonda o vídeo uma vez por conteúdo (a saída fica no checkpoint e no cache) e publica o plano no status.
+    Uma sondagem que falha não é gravada e não interrompe o pipeline: segue o plano padrão.
+    """
+    if not PREFLIGHT_ENABLED:
+        return build_processing_plan(None)
+    bucket = checkpoint.bucket
+    file_key = checkpoint.manifest['file_key']
+
+    media = checkpoint.get('PREFLIGHT')
+    if media is None:
+        try:
+            video_url = s3_client.generate_presigned_url('get_object', Params={'Bucket': bucket, 'Key': file_key}, ExpiresIn=900)
+            media = probe_media(video_url)
+        except Exception as e:
+            logger.warning(f"Pré-voo falhou para {file_key}: {str(e)}")
+            media = {}
+        if media:
+            checkpoint.put('PREFLIGHT', media)
+    plan = build_processing_plan(media)
+    logger.info(f"PLANO {file_key}: {json.dumps({'media': media, 'plan': plan}, ensure_ascii=False)}")
+    update_status(bucket, checkpoint.file_id, "INIT", "Vídeo inspecionado: plano de processamento definido.", {"media": media, "plan": plan})
+    return plan
+
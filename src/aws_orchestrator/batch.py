@@ -0,0 +1,105 @@
+"""
+Lotes de vídeos num mesmo evento (pasta enviada de uma vez, lote do SQS ou manifesto).
+"""
+import json
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from aws_clients import BATCH_WORKERS
+from checkpoint import file_id_for
+from tracing import emit_metrics, submit_with_context
+
+logger = logging.getLogger(__name__)
+
+def dedupe_uploads(uploads):
+    """Um pipeline por file_id (status e checkpoint são por file_id): vale a entrega mais recente de cada um."""
+    unique = {}
+    for upload in uploads:
+        identity = (upload[0], file_id_for(upload[1]))
+        unique.pop(identity, None)
+        unique[identity] = upload
+    return list(unique.values())
+
+class BatchProgress:
+    """Contadores do lote (fila, em andamento, concluídos) para o log de progresso e as métricas de vazão."""
+
+    def __init__(self, total):
+        self.total = total
+        self.in_flight = 0
+        self.done = 0
+        self.failed = 0
+        self.started_at = time.time()
+        self._lock = threading.Lock()
+
+    def start(self):
+        with self._lock:
+            self.in_flight += 1
+
+    def finish(self, ok):
+        with self._lock:
+            self.in_flight -= 1
+            self.done += 1
+            self.failed += 0 if ok else 1
+            snapshot = self.snapshot()
+        logger.info(f"LOTE_PROGRESSO {json.dumps(snapshot)}")
+        emit_metrics("batch", unit="Count", QueueDepth=snapshot["fila"], InFlight=snapshot["em_andamento"])
+
+    def snapshot(self):
+        elapsed = time.time() - self.started_at
+        return {
+            "total": self.total,
+            "fila": self.total - self.done - self.in_flight,
+            "em_andamento": self.in_flight,
+            "concluidos": self.done,
+            "falhas": self.failed,
+            "videos_por_minuto": round(self.done / elapsed * 60, 2) if elapsed > 0 else 0.0,
+        }
+
+def process_batch(videos, context, process, ignored=0):
+    """
+    Lote de vídeos já filtrados (pasta enviada de uma vez, lote do SQS ou manifesto): remove duplicados e
+    processa até BATCH_WORKERS vídeos ao mesmo tempo com process(bucket, key, record, context).
+    Cada vídeo mantém o próprio status e checkpoint.
+    """
+    unique = dedupe_uploads(videos)
+    logger.info(f"LOTE RECEBIDO - {len(videos) + ignored} registros, {len(unique)} vídeos "
+                f"({ignored} ignorados, {len(videos) - len(unique)} duplicados)")
+    progress = BatchProgress(len(unique))
+
+    def run(bucket_name, file_key, record):
+        progress.start()
+        try:
+            response = process(bucket_name, file_key, record, context)
+        except Exception as e:
+            # Falha transitória: o checkpoint do vídeo fica para a nova entrega
+            response = {'statusCode': 503, 'body': f"Erro temporário: {str(e)}", 'retry': True}
+        progress.finish(200 <= response['statusCode'] < 300)
+        return response
+
+    with ThreadPoolExecutor(max_workers=min(BATCH_WORKERS, len(unique) or 1)) as executor:
+        futures = [submit_with_context(executor, run, bucket_name, file_key, record) for bucket_name, file_key, record, _ in unique]
+        responses = [future.result() for future in futures]
+
+    summary = progress.snapshot()
+    emit_metrics("batch", unit="Count", BatchVideos=len(unique), BatchFailed=summary["falhas"],
+                 BatchDuplicates=len(videos) - len(unique), BatchIgnored=ignored)
+    emit_metrics("batch", unit="None", VideosPerMinute=summary["videos_por_minuto"])
+    results = [{"file_key": file_key, "statusCode": response['statusCode'], "body": response['body']}
+               for (_, file_key, _, _), response in zip(unique, responses)]
+
+    # SQS com ReportBatchItemFailures: só as mensagens com falha temporária voltam para a fila. Um vídeo encerrado
+    # com ERROR (job FAILED, relatório fora do contrato) é confirmado: cada nova entrega iniciaria outros jobs
+    failed = any(not 200 <= response['statusCode'] < 300 for response in responses)
+    retry_keys = {file_key for (_, file_key, _, _), response in zip(unique, responses) if response.get('retry')}
+    failed_messages = sorted({message_id for _, file_key, _, message_id in videos if message_id and file_key in retry_keys})
+    if retry_keys and not any(message_id for _, _, _, message_id in videos):
+        # Sem mensagens do SQS para devolver: a falha da invocação faz a Lambda reentregar o lote,
+        # e os vídeos já concluídos terminam direto pelo checkpoint
+        raise Exception(f"{len(retry_keys)} vídeo(s) do lote com falha temporária; o lote será reprocessado a partir dos checkpoints.")
+    return {
+        'statusCode': 200 if not failed else 207,
+        'body': json.dumps({"resumo": summary, "videos": results}, ensure_ascii=False),
+        'batchItemFailures': [{"itemIdentifier": message_id} for message_id in failed_messages]
+    }
@@ -0,0 +1,607 @@
+"""
+Benchmark offline do orquestrador.
+
+Roda o lambda_handler de ponta a ponta sobre os vídeos de src/video_samples com os dublês de
+local_stubs.py no lugar de S3, Rekognition, Transcribe, Comprehend e Bedrock. O FFmpeg roda de verdade.
+Cada vídeo roda num processo próprio para que o pico de RSS seja medido isoladamente.
+
+Uso:
+    python benchmark.py --output atual.json
+    python benchmark.py --baseline atual.json --video-job-seconds 2 --audio-job-seconds 3
+    python benchmark.py --batch --baseline atual.json   # todos os vídeos num único evento
+    python benchmark.py --startup --import-budget-ms 150   # cold start: import e primeiro evento
+    python benchmark.py --filter   # custo por evento descartado pelo filtro antes do despacho
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import re
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_SAMPLES_DIR = os.path.join(HERE, '..', 'video_samples')
+BUCKET = 'benchmark-bucket'
+
+
+class LocalContext:
+    """Contexto da Lambda com o mesmo get_remaining_time_in_millis do runtime."""
+
+    function_name = 'benchmark'
+
+    def __init__(self, timeout_seconds):
+        self.deadline = time.time() + timeout_seconds
+
+    def get_remaining_time_in_millis(self):
+        return max(0, int((self.deadline - time.time()) * 1000))
+
+
+def probe_duration_seconds(ffmpeg_path, video_path):
+    result = subprocess.run([ffmpeg_path, '-hide_banner', '-i', video_path], stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    match = re.search(r'Duration: (\d+):(\d+):(\d+\.\d+)', result.stderr.decode('utf-8', 'ignore'))
+    if not match:
+        return 0.0
+    hours, minutes, seconds = match.groups()
+    return int(hours) * 3600 + int(minutes) * 60 + float(seconds)
+
+
+def risk_for_clip(name):
+    """Score simulado pelo Bedrock a partir do nome do vídeo de exemplo."""
+    if 'alto' in name:
+        return 85
+    if 'baixo' in name:
+        return 20
+    if 'medio' in name:
+        return 55
+    return 65
+
+
+def _tmp_usage_bytes():
+    total = 0
+    for entry in os.listdir('/tmp'):
+        # Frames críticos e trechos do FFmpeg (split_video) ocupam o /tmp da Lambda
+        if not entry.startswith(('frames_', 'chunks_')):
+            continue
+        for root, _, files in os.walk(os.path.join('/tmp', entry)):
+            for name in files:
+                try:
+                    total += os.path.getsize(os.path.join(root, name))
+                except OSError:
+                    pass
+    return total
+
+
+class TmpSampler(threading.Thread):
+    """Amostra o uso de /tmp pelos diretórios de trabalho do orquestrador."""
+
+    def __init__(self, interval=0.01):
+        super().__init__(daemon=True)
+        self.interval = interval
+        self.peak = 0
+        self._stop_event = threading.Event()
+
+    def run(self):
+        while not self._stop_event.is_set():
+            self.peak = max(self.peak, _tmp_usage_bytes())
+            self._stop_event.wait(self.interval)
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+
+
+def run_clip_safely(video_path, options, results_queue):
+    """Garante que a fila sempre recebe uma resposta, mesmo se o vídeo falhar."""
+    try:
+        run_clip(video_path, options, results_queue)
+    except Exception as e:
+        results_queue.put({'clip': os.path.basename(video_path), 'error': f"{type(e).__name__}: {e}"})
+
+
+def load_orchestrator(options):
+    """Configura o ambiente do orquestrador (lido no import) e o importa."""
+    os.environ.setdefault('AWS_DEFAULT_REGION', 'us-east-1')
+    os.environ['ORCHESTRATION_MODE'] = options['mode']
+    os.environ['FFMPEG_PATH'] = options['ffmpeg']
+    os.environ['RESULT_CACHE_ENABLED'] = 'false'
+    os.environ['CHUNK_SECONDS'] = str(options['chunk_seconds'])
+    os.environ['CHUNK_MIN_DURATION_SECONDS'] = str(options['chunk_min_duration_seconds'])
+    os.environ['BEDROCK_STREAMING'] = 'true' if options['bedrock_streaming'] else 'false'
+    os.environ['BATCH_WORKERS'] = str(options['batch_workers'])
+    if options.get('trace_dir'):
+        os.environ['TRACE_EXPORT_DIR'] = options['trace_dir']
+    sys.path.insert(0, HERE)
+    # As linhas EMF e os prints do orquestrador iriam para o stdout do relatório
+    sys.stdout = open(os.devnull, 'w')
+
+    import aws_lambda_orchestrator as orchestrator
+    return orchestrator
+
+
+def build_services(options, stub_dir, risk_for_key, report_risk):
+    """Dublês dos serviços AWS. risk_for_key dá o viés das emoções sintéticas de cada objeto do S3."""
+    import local_stubs
+
+    api_latency = options['api_latency_ms'] / 1000
+    s3 = local_stubs.LocalS3(latency=api_latency, materialize_dir=stub_dir)
+
+    # Trechos de vídeos longos (chunks/) têm duração própria: o probe lê a cópia local de cada objeto
+    media_durations = {}
+
+    def media_seconds(bucket, key):
+        if key not in media_durations:
+            media_durations[key] = probe_duration_seconds(options['ffmpeg'], s3.generate_presigned_url('get_object', Params={'Bucket': bucket, 'Key': key}))
+        return media_durations[key]
+
+    def media_seconds_from_uri(uri):
+        return media_seconds(*uri[len('s3://'):].split('/', 1))
+
+    def job_seconds(base, seconds):
+        return base + options['job_seconds_per_media_minute'] * seconds / 60
+
+    services = {
+        's3': s3,
+        'rekognition': local_stubs.LocalRekognition(
+            lambda bucket, key: local_stubs.synthetic_face_detections(media_seconds(bucket, key) * 1000, risk_bias=risk_for_key(key) / 100),
+            job_seconds=lambda bucket, key: job_seconds(options['video_job_seconds'], media_seconds(bucket, key)),
+            latency=api_latency),
+        'transcribe': local_stubs.LocalTranscribe(
+            lambda uri: local_stubs.synthetic_transcript(media_seconds_from_uri(uri)),
+            stub_dir, job_seconds=lambda uri: job_seconds(options['audio_job_seconds'], media_seconds_from_uri(uri)),
+            latency=api_latency),
+        'comprehend': local_stubs.LocalComprehend(latency=api_latency),
+        'bedrock': local_stubs.LocalBedrock(
+            lambda prompt: {
+                "score": report_risk,
+                "nivel": "ALTO" if report_risk >= 70 else "BAIXO" if report_risk <= 30 else "MÉDIO",
+                "evidencias": [{"fonte": "VIDEO", "momento_s": 1.0, "descricao": "Evidência simulada pelo benchmark."}],
+                "recomendacoes": ["Recomendação simulada pelo benchmark."],
+                "analise": "Relatório gerado pelo benchmark. " * 20,
+            },
+            latency=options['bedrock_latency_ms'] / 1000),
+    }
+    # Cotas simuladas: acima delas o dublê responde com ThrottlingException, como a AWS
+    for name, tps, concurrency in options.get('quotas', []):
+        services[name] = local_stubs.QuotaEnforcer(services[name], tps=tps, concurrency=concurrency)
+    return services
+
+
+def install_services(orchestrator, services):
+    """Os dublês entram no registro de clientes, que todos os módulos do orquestrador consultam."""
+    orchestrator.CLIENTS.use('s3', services['s3'])
+    orchestrator.CLIENTS.use('rekognition', services['rekognition'])
+    orchestrator.CLIENTS.use('transcribe', services['transcribe'])
+    orchestrator.CLIENTS.use('comprehend', services['comprehend'])
+    orchestrator.CLIENTS.use('bedrock-runtime', services['bedrock'])
+
+
+def record_status(on_status):
+    """
+    Chama on_status(file_id, status_data) a cada transição do update_status: o mesmo sinal enviado ao
+    gateway de progresso, sem a coalescência das gravações no S3.
+    """
+    import status_writer
+    publisher = status_writer.PROGRESS_PUBLISHER
+    publish = publisher.publish
+
+    def recording_publish(file_id, status_data):
+        on_status(file_id, status_data)
+        publish(file_id, status_data)
+
+    publisher.publish = recording_publish
+
+
+def _api_calls(services):
+    calls = {f"{name}.{op}": count for name, service in services.items() for op, count in sorted(service.calls.items())}
+    for name, service in services.items():
+        calls.update({f"{name}.{op}:throttled": count for op, count in sorted(getattr(service, 'rejected', {}).items())})
+    return calls
+
+
+def parse_quota(value):
+    """serviço:tps[:concorrência], ex.: rekognition:2 ou bedrock:0:1 (0 = sem limite)."""
+    name, tps, *concurrency = value.split(':')
+    return name, float(tps) or None, int(concurrency[0]) if concurrency and int(concurrency[0]) else None
+
+
+def run_clip(video_path, options, results_queue):
+    """Executa um vídeo num processo novo e devolve as métricas pela fila."""
+    orchestrator = load_orchestrator(options)
+
+    clip = os.path.basename(video_path)
+    file_key = f"uploads/{clip}"
+    duration = probe_duration_seconds(options['ffmpeg'], video_path)
+    risk = risk_for_clip(clip)
+
+    stub_dir = tempfile.mkdtemp(prefix='benchmark_stubs_')
+    services = build_services(options, stub_dir, lambda key: risk, risk)
+    s3 = services['s3']
+    with open(video_path, 'rb') as f:
+        s3.put_object(Bucket=BUCKET, Key=file_key, Body=f.read(), ContentType='video/mp4')
+    s3.calls.clear()
+    install_services(orchestrator, services)
+
+    # O tempo por etapa vem das transições de status, o mesmo sinal que o frontend enxerga
+    transitions = []
+    plan = {}
+
+    def on_status(file_id, status_data):
+        transitions.append((status_data['step'], time.time()))
+        plan.update((status_data['details'] or {}).get('plan', {}))
+
+    record_status(on_status)
+
+    event = {'Records': [{'s3': {'bucket': {'name': BUCKET}, 'object': {'key': file_key, 'size': os.path.getsize(video_path)}}}]}
+    sampler = TmpSampler()
+    sampler.start()
+    started_at = time.time()
+    response = orchestrator.lambda_handler(event, LocalContext(options['timeout_seconds']))
+    finished_at = time.time()
+    sampler.stop()
+    shutil.rmtree(stub_dir, ignore_errors=True)
+
+    stages = {}
+    for (step, at), (_, next_at) in zip(transitions, transitions[1:] + [(None, finished_at)]):
+        stages[step] = round(stages.get(step, 0) + next_at - at, 4)
+
+    results_queue.put({
+        'clip': clip,
+        'duration_seconds': round(duration, 2),
+        'status_code': response.get('statusCode'),
+        'wall_seconds': round(finished_at - started_at, 4),
+        'stages': stages,
+        'peak_rss_mb': round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+        'peak_ffmpeg_rss_mb': round(resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1024, 1),
+        'peak_tmp_mb': round(sampler.peak / (1024 * 1024), 2),
+        'api_calls': _api_calls(services),
+        'plan': plan,
+    })
+
+
+def _sample_clips(samples_dir):
+    return sorted(f for f in os.listdir(samples_dir) if f.lower().endswith(('.mp4', '.mov', '.avi', '.mkv')))
+
+
+def strip_audio(options):
+    """Cópias sem a faixa de áudio (stream copy) dos vídeos de exemplo, para medir o plano sem Transcribe."""
+    silent_dir = tempfile.mkdtemp(prefix='benchmark_silent_')
+    for clip in _sample_clips(options['samples_dir']):
+        subprocess.run([options['ffmpeg'], '-v', 'error', '-y', '-i', os.path.join(options['samples_dir'], clip), '-an', '-c', 'copy',
+                        os.path.join(silent_dir, clip)], check=True)
+    return silent_dir
+
+
+def run_batch_safely(options, results_queue):
+    try:
+        run_batch(options, results_queue)
+    except Exception as e:
+        results_queue.put({'error': f"{type(e).__name__}: {e}"})
+
+
+def run_batch(options, results_queue):
+    """Todos os vídeos num único evento com vários registros do S3 (modo lote), num processo só."""
+    orchestrator = load_orchestrator(options)
+    clips = _sample_clips(options['samples_dir'])
+
+    stub_dir = tempfile.mkdtemp(prefix='benchmark_stubs_')
+    # O prompt não identifica o vídeo: o Bedrock simulado devolve o mesmo score para todos
+    services = build_services(options, stub_dir, risk_for_clip, 65)
+    s3 = services['s3']
+    records = []
+    for clip in clips:
+        path = os.path.join(options['samples_dir'], clip)
+        with open(path, 'rb') as f:
+            s3.put_object(Bucket=BUCKET, Key=f"uploads/{clip}", Body=f.read(), ContentType='video/mp4')
+        records.append({'s3': {'bucket': {'name': BUCKET}, 'object': {'key': f"uploads/{clip}", 'size': os.path.getsize(path)}}})
+    s3.calls.clear()
+    install_services(orchestrator, services)
+
+    finished = {}
+
+    def on_status(file_id, status_data):
+        if status_data['step'] in ('COMPLETED', 'ERROR'):
+            finished[file_id] = time.time()
+
+    record_status(on_status)
+
+    started_at = time.time()
+    response = orchestrator.lambda_handler({'Records': records}, LocalContext(options['timeout_seconds']))
+    wall = time.time() - started_at
+    shutil.rmtree(stub_dir, ignore_errors=True)
+
+    results_queue.put({
+        'videos': len(clips),
+        'status_code': response.get('statusCode'),
+        'wall_seconds': round(wall, 4),
+        'videos_per_minute': round(len(clips) / wall * 60, 2),
+        'finished_at_seconds': {file_id: round(at - started_at, 4) for file_id, at in sorted(finished.items(), key=lambda item: item[1])},
+        'peak_rss_mb': round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+        'peak_ffmpeg_rss_mb': round(resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1024, 1),
+        'api_calls': _api_calls(services),
+    })
+
+
+def run_batch_benchmark(options):
+    ctx = multiprocessing.get_context('spawn')
+    queue = ctx.Queue()
+    process = ctx.Process(target=run_batch_safely, args=(options, queue))
+    process.start()
+    result = queue.get()
+    process.join()
+    return {
+        'options': {k: v for k, v in options.items() if k not in ('samples_dir', 'ffmpeg', 'trace_dir')},
+        'batch': result,
+    }
+
+
+def print_batch_report(report, baseline=None):
+    batch = report['batch']
+    if 'error' in batch:
+        print(f"lote FALHOU: {batch['error']}")
+        return
+    print(f"lote: {batch['videos']} vídeos em {batch['wall_seconds']}s ({batch['videos_per_minute']} vídeos/min), "
+          f"status {batch['status_code']}, {sum(batch['api_calls'].values())} chamadas de API")
+    if baseline and 'total_wall_seconds' in baseline:
+        # Baseline de uma execução normal: os mesmos vídeos um por invocação, em série
+        sequential = baseline['total_wall_seconds']
+        print(f"  um por invocação (baseline): {sequential}s ({round(len(baseline['clips']) / sequential * 60, 2)} vídeos/min), "
+              f"lote {_delta(batch['wall_seconds'], sequential)}")
+    throttled = {op: count for op, count in batch['api_calls'].items() if op.endswith(':throttled')}
+    if throttled:
+        print("  recusadas pela cota simulada: " + ', '.join(f"{op[:-len(':throttled')]}={count}" for op, count in throttled.items()))
+    print(f"  pico de RSS: {batch['peak_rss_mb']} MB (FFmpeg: {batch['peak_ffmpeg_rss_mb']} MB)")
+    print("  concluído em (s): " + ', '.join(f"{file_id}={secs}" for file_id, secs in batch['finished_at_seconds'].items()))
+
+
+def run_benchmark(options):
+    ctx = multiprocessing.get_context('spawn')
+    clips = _sample_clips(options['samples_dir'])
+    results = []
+    failures = []
+    for clip in clips:
+        queue = ctx.Queue()
+        process = ctx.Process(target=run_clip_safely, args=(os.path.join(options['samples_dir'], clip), options, queue))
+        process.start()
+        result = queue.get()
+        process.join()
+        (failures if 'error' in result else results).append(result)
+    return {
+        'options': {k: v for k, v in options.items() if k not in ('samples_dir', 'ffmpeg', 'trace_dir')},
+        'clips': results,
+        'failures': failures,
+        'total_wall_seconds': round(sum(r['wall_seconds'] for r in results), 4),
+        'total_api_calls': sum(sum(r['api_calls'].values()) for r in results),
+    }
+
+
+# Roda num interpretador novo, como o init de um ambiente frio da Lambda
+STARTUP_PROBE = '''
+import json, sys, time
+started = time.perf_counter()
+import aws_lambda_orchestrator as orchestrator
+imported = time.perf_counter()
+orchestrator.lambda_handler({'Records': [{'s3': {'bucket': {'name': 'b'}, 'object': {'key': 'processed/x.json'}}}]}, None)
+ignored = time.perf_counter()
+orchestrator.CLIENTS.get('s3')
+client = time.perf_counter()
+print(json.dumps({
+    'import_ms': (imported - started) * 1000,
+    'ignored_event_ms': (ignored - imported) * 1000,
+    'first_client_ms': (client - ignored) * 1000,
+    'modules': len(sys.modules),
+}))
+'''
+
+
+# Eventos que o filtro antes do despacho deve descartar, medidos num interpretador novo e sem dublês:
+# se algum caminho criasse um cliente boto3, CLIENTS deixaria de estar vazio
+FILTER_PROBE = '''
+import contextlib, json, os, sys, time
+import aws_lambda_orchestrator as orchestrator
+def record(key, size=1024, event_name='ObjectCreated:Put'):
+    return {'eventName': event_name, 's3': {'bucket': {'name': 'b'}, 'object': {'key': key, 'size': size}}}
+events = {
+    'status/': {'Records': [record('status/v1.json')]},
+    'reports/': {'Records': [record('reports/v1_report.json')]},
+    'frames/': {'Records': [record('frames/v1_1500.jpg')]},
+    'extensão': {'Records': [record('uploads/notas.txt')]},
+    'ObjectRemoved': {'Records': [record('uploads/v1.mp4', event_name='ObjectRemoved:Delete')]},
+    'tamanho zero': {'Records': [record('uploads/v1.mp4', size=0)]},
+    's3:TestEvent (SQS)': {'Records': [{'messageId': 'm1', 'body': json.dumps({'Event': 's3:TestEvent'})}]},
+    'lote SQS de 10': {'Records': [{'messageId': f'm{i}', 'body': json.dumps({'Records': [record(f'frames/v{i}.jpg')]})} for i in range(10)]},
+}
+runs = int(sys.argv[1])
+result = {}
+with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+    for name, event in events.items():
+        orchestrator.lambda_handler(event, None)
+        started = time.perf_counter()
+        for _ in range(runs):
+            response = orchestrator.lambda_handler(event, None)
+        result[name] = {'us_per_event': (time.perf_counter() - started) / runs * 1e6, 'body': response['body']}
+print(json.dumps({'events': result, 'clients': sorted(orchestrator.CLIENTS._clients), 'ignored': dict(orchestrator.IGNORED_EVENTS)}))
+'''
+
+
+def run_filter_benchmark(runs=1000):
+    env = dict(os.environ, AWS_DEFAULT_REGION=os.environ.get('AWS_DEFAULT_REGION', 'us-east-1'))
+    output = subprocess.run([sys.executable, '-c', FILTER_PROBE, str(runs)], cwd=HERE, env=env,
+                            capture_output=True, text=True, check=True).stdout
+    report = json.loads(output.strip().splitlines()[-1])
+    report['runs'] = runs
+    return report
+
+
+def print_filter_report(report):
+    print(f"filtro antes do despacho ({report['runs']} invocações por tipo de evento):")
+    for name, result in report['events'].items():
+        print(f"  {name:<22} {result['us_per_event']:>9.1f} µs/evento  -> {result['body']}")
+    print(f"  clientes AWS criados: {', '.join(report['clients']) or 'nenhum'}")
+    print(f"  descartes por motivo: {report['ignored']}")
+    return all(result['body'] == 'Ignored' for result in report['events'].values()) and not report['clients']
+
+
+def _median(values):
+    ordered = sorted(values)
+    middle = len(ordered) // 2
+    return ordered[middle] if len(ordered) % 2 else (ordered[middle - 1] + ordered[middle]) / 2
+
+
+def run_startup_benchmark(runs):
+    env = dict(os.environ, AWS_DEFAULT_REGION=os.environ.get('AWS_DEFAULT_REGION', 'us-east-1'))
+    samples = []
+    for _ in range(runs):
+        output = subprocess.run([sys.executable, '-c', STARTUP_PROBE], cwd=HERE, env=env,
+                                capture_output=True, text=True, check=True).stdout
+        samples.append(json.loads(output.strip().splitlines()[-1]))
+    return {
+        'runs': runs,
+        'startup': {key: round(_median([s[key] for s in samples]), 2) for key in samples[0]},
+        'samples': samples,
+    }
+
+
+def print_startup_report(report, baseline=None, budget_ms=None):
+    startup = report['startup']
+    base = (baseline or {}).get('startup', {})
+    print(f"cold start (mediana de {report['runs']} interpretadores novos):")
+    for key, label in (('import_ms', 'import do módulo'), ('ignored_event_ms', 'evento ignorado'), ('first_client_ms', 'primeiro cliente (S3)')):
+        print(f"  {label:<22} {startup[key]:>9.2f} ms {_delta(startup[key], base.get(key)):>8}")
+    print(f"  módulos carregados     {startup['modules']:>9}")
+    if budget_ms is None:
+        return True
+    within = startup['import_ms'] <= budget_ms
+    print(f"  orçamento de import: {budget_ms} ms -> {'OK' if within else 'ESTOURADO'}")
+    return within
+
+
+def _delta(current, baseline):
+    if not baseline:
+        return ''
+    return f"{(current - baseline) / baseline * 100:+.1f}%"
+
+
+def print_report(report, baseline=None):
+    baseline_clips = {c['clip']: c for c in (baseline or {}).get('clips', [])}
+    header = f"{'vídeo':<30} {'dur(s)':>7} {'wall(s)':>9} {'Δ':>8} {'rss(MB)':>8} {'ffmpeg(MB)':>10} {'tmp(MB)':>8} {'APIs':>6} {'Δ':>8}"
+    print(header)
+    print('-' * len(header))
+    for clip in report['clips']:
+        base = baseline_clips.get(clip['clip'], {})
+        calls = sum(clip['api_calls'].values())
+        base_calls = sum(base.get('api_calls', {}).values()) if base else None
+        print(f"{clip['clip']:<30} {clip['duration_seconds']:>7} {clip['wall_seconds']:>9} {_delta(clip['wall_seconds'], base.get('wall_seconds')):>8} "
+              f"{clip['peak_rss_mb']:>8} {clip['peak_ffmpeg_rss_mb']:>10} {clip['peak_tmp_mb']:>8} {calls:>6} {_delta(calls, base_calls):>8}")
+    for failure in report.get('failures', []):
+        print(f"{failure['clip']:<30} FALHOU: {failure['error']}")
+    print('-' * len(header))
+    print(f"total: {report['total_wall_seconds']}s, {report['total_api_calls']} chamadas de API", end='')
+    if baseline:
+        print(f" (baseline: {baseline['total_wall_seconds']}s, {baseline['total_api_calls']} chamadas)", end='')
+    print()
+
+    print("\ntempo por etapa (s):")
+    for clip in report['clips']:
+        base_stages = baseline_clips.get(clip['clip'], {}).get('stages', {})
+        parts = [f"{step}={secs}" + (f"({_delta(secs, base_stages[step])})" if base_stages.get(step) else '') for step, secs in clip['stages'].items()]
+        print(f"  {clip['clip']}: " + ', '.join(parts))
+
+    print("\nplano de processamento (pré-voo):")
+    for clip in report['clips']:
+        print(f"  {clip['clip']}: " + ', '.join(f"{key}={value}" for key, value in clip.get('plan', {}).items()))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark offline do orquestrador com serviços AWS simulados.")
+    parser.add_argument('--samples-dir', default=DEFAULT_SAMPLES_DIR)
+    parser.add_argument('--mode', default='concurrent', choices=['concurrent', 'sequential'])
+    parser.add_argument('--video-job-seconds', type=float, default=1.0, help="Duração simulada do job do Rekognition")
+    parser.add_argument('--audio-job-seconds', type=float, default=1.5, help="Duração simulada do job do Transcribe")
+    parser.add_argument('--job-seconds-per-media-minute', type=float, default=0.0, help="Acréscimo na duração dos jobs por minuto de mídia (jobs reais escalam com a duração)")
+    parser.add_argument('--chunk-seconds', type=float, default=0.0, help="CHUNK_SECONDS do orquestrador (0 = sem divisão em trechos)")
+    parser.add_argument('--chunk-min-duration-seconds', type=float, default=0.0, help="CHUNK_MIN_DURATION_SECONDS do orquestrador")
+    parser.add_argument('--api-latency-ms', type=float, default=20.0, help="Latência de cada chamada de API simulada")
+    parser.add_argument('--bedrock-latency-ms', type=float, default=500.0, help="Latência do invoke_model simulado")
+    parser.add_argument('--no-bedrock-streaming', dest='bedrock_streaming', action='store_false', help="Usa invoke_model bloqueante em vez do streaming")
+    parser.add_argument('--batch', action='store_true', help="Envia todos os vídeos num único evento (modo lote) e mede a vazão")
+    parser.add_argument('--batch-workers', type=int, default=4, help="BATCH_WORKERS do orquestrador")
+    parser.add_argument('--quota', action='append', type=parse_quota, default=[], metavar='SERVIÇO:TPS[:CONCORRÊNCIA]',
+                        help="Cota simulada de um serviço (rekognition, transcribe, comprehend, bedrock); acima dela o dublê devolve ThrottlingException")
+    parser.add_argument('--timeout-seconds', type=float, default=900.0, help="Timeout simulado da Lambda")
+    parser.add_argument('--ffmpeg', default=os.environ.get('FFMPEG_PATH') or shutil.which('ffmpeg') or '/opt/bin/ffmpeg')
+    parser.add_argument('--output', help="Grava o resultado em JSON (para usar como baseline depois)")
+    parser.add_argument('--baseline', help="JSON de uma execução anterior para comparação")
+    parser.add_argument('--trace-dir', help="Exporta a timeline de spans de cada vídeo (formato Chrome Trace) neste diretório")
+    parser.add_argument('--startup', action='store_true', help="Mede só o cold start: import do módulo, evento ignorado e primeiro cliente")
+    parser.add_argument('--runs', type=int, default=10, help="Interpretadores novos medidos no modo --startup")
+    parser.add_argument('--import-budget-ms', type=float, help="Falha (exit 1) se a mediana do import passar deste valor")
+    parser.add_argument('--strip-audio', action='store_true', help="Roda sobre cópias dos vídeos sem a faixa de áudio (o plano dispensa o Transcribe)")
+    parser.add_argument('--filter', action='store_true', help="Mede o custo dos eventos descartados pelo filtro antes do despacho")
+    args = parser.parse_args(argv)
+
+    if args.filter:
+        report = run_filter_benchmark()
+        if not print_filter_report(report):
+            sys.exit(1)
+        return
+
+    if args.startup:
+        report = run_startup_benchmark(args.runs)
+        baseline = None
+        if args.baseline:
+            with open(args.baseline, encoding='utf-8') as f:
+                baseline = json.load(f)
+        within = print_startup_report(report, baseline, args.import_budget_ms)
+        if args.output:
+            with open(args.output, 'w', encoding='utf-8') as f:
+                json.dump(report, f, indent=4, ensure_ascii=False)
+        if not within:
+            sys.exit(1)
+        return
+
+    options = {
+        'samples_dir': args.samples_dir,
+        'mode': args.mode,
+        'video_job_seconds': args.video_job_seconds,
+        'audio_job_seconds': args.audio_job_seconds,
+        'job_seconds_per_media_minute': args.job_seconds_per_media_minute,
+        'chunk_seconds': args.chunk_seconds,
+        'chunk_min_duration_seconds': args.chunk_min_duration_seconds,
+        'api_latency_ms': args.api_latency_ms,
+        'bedrock_latency_ms': args.bedrock_latency_ms,
+        'bedrock_streaming': args.bedrock_streaming,
+        'batch_workers': args.batch_workers,
+        'quotas': args.quota,
+        'timeout_seconds': args.timeout_seconds,
+        'ffmpeg': args.ffmpeg,
+        'trace_dir': os.path.abspath(args.trace_dir) if args.trace_dir else None,
+        'strip_audio': args.strip_audio,
+    }
+    if args.strip_audio:
+        options['samples_dir'] = strip_audio(options)
+    report = run_batch_benchmark(options) if args.batch else run_benchmark(options)
+    if args.strip_audio:
+        shutil.rmtree(options['samples_dir'], ignore_errors=True)
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            baseline = json.load(f)
+    if args.batch:
+        print_batch_report(report, baseline)
+    else:
+        print_report(report, baseline)
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=4, ensure_ascii=False)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,197 @@
+"""
+Estado do pipeline no S3: checkpoint por file_id (state/) para retomar entre invocações e cache de resultados
+por conteúdo (cache/).
+"""
+import json
+import logging
+import os
+import time
+
+from botocore.exceptions import ClientError
+
+from aws_clients import s3_client
+from tracing import span
+
+logger = logging.getLogger(__name__)
+
+# Cache de resultados por conteúdo (ETag do objeto): reenvios do mesmo vídeo reaproveitam cada etapa
+RESULT_CACHE_ENABLED = os.environ.get('RESULT_CACHE_ENABLED', 'true').lower() == 'true'
+RESULT_CACHE_BUCKET = os.environ.get('RESULT_CACHE_BUCKET')
+
+def put_json(bucket, key, data, **extra):
+    body = json.dumps(data, ensure_ascii=False)
+    with span("s3.put_object", prefix=key.split('/')[0], bytes=len(body.encode('utf-8'))):
+        s3_client.put_object(Bucket=bucket, Key=key, Body=body, ContentType='application/json', **extra)
+
+def get_json(bucket, key):
+    """Lê um JSON do S3, devolvendo None se o objeto não existir."""
+    with span("s3.get_object", prefix=key.split('/')[0]) as attrs:
+        try:
+            body = s3_client.get_object(Bucket=bucket, Key=key)['Body'].read()
+        except ClientError as e:
+            if e.response['Error']['Code'] in ('NoSuchKey', '404'):
+                attrs['found'] = False
+                return None
+            raise
+        attrs['bytes'] = len(body)
+        return json.loads(body)
+
+def run_prefix(file_id, run_id):
+    return f"state/{file_id}/runs/{run_id}"
+
+def delete_run_markers(bucket, file_id, event_run):
+    """Remove os marcadores .done e o resume.lock de uma execução que deixou de valer."""
+    if not event_run:
+        return
+    prefix = run_prefix(file_id, event_run['id'])
+    try:
+        markers = ('video.done', 'audio.done', 'failed.done', 'resume.lock')
+        s3_client.delete_objects(Bucket=bucket, Delete={'Objects': [{'Key': f"{prefix}/{name}"} for name in markers], 'Quiet': True})
+    except Exception as e:
+        logger.error(f"Erro ao remover marcadores da execução anterior: {str(e)}")
+
+def file_id_for(file_key):
+    return file_key.split('/')[-1].split('.')[0]
+
+def get_content_key(bucket, file_key, record=None):
+    """ETag do objeto (vem no evento do S3; senão, um HEAD barato)."""
+    etag = (record or {}).get('s3', {}).get('object', {}).get('eTag')
+    if not etag:
+        etag = s3_client.head_object(Bucket=bucket, Key=file_key)['ETag']
+    return etag.strip('"')
+
+class ResultCache:
+    """
+    Cache das saídas de cada etapa (nomes do update_status) em cache/{content_key}/{stage}.json.
+    A chave é o ETag do upload, então o mesmo conteúdo reenviado com outro nome também é reaproveitado.
+    Sem content_key o cache fica desativado e todas as leituras retornam None.
+    """
+
+    def __init__(self, bucket, content_key):
+        self.bucket = RESULT_CACHE_BUCKET or bucket
+        self.content_key = content_key if RESULT_CACHE_ENABLED else None
+
+    def _key(self, stage):
+        return f"cache/{self.content_key}/{stage}.json"
+
+    def get(self, stage):
+        if not self.content_key:
+            return None
+        try:
+            value = get_json(self.bucket, self._key(stage))
+        except Exception as e:
+            logger.error(f"Erro ao ler cache '{stage}': {str(e)}")
+            return None
+        if value is not None:
+            logger.info(f"CACHE_HIT {self.content_key}/{stage}")
+        return value
+
+    def put(self, stage, value):
+        if not self.content_key:
+            return
+        try:
+            put_json(self.bucket, self._key(stage), value)
+        except Exception as e:
+            logger.error(f"Erro ao gravar cache '{stage}': {str(e)}")
+
+    def stage(self, stage, compute, span_stage=None, **attributes):
+        """Devolve a saída em cache da etapa ou a calcula e grava (mesma assinatura de PipelineCheckpoint.stage)."""
+        value = self.get(stage)
+        if value is None:
+            value = compute()
+            self.put(stage, value)
+        return value
+
+NO_CACHE = ResultCache(None, None)
+
+class PipelineCheckpoint:
+    """
+    Checkpoint de um file_id para retomar o pipeline entre invocações da Lambda.
+    state/{file_id}.json guarda o manifesto (vídeo, ETag e IDs dos jobs) e state/{file_id}/{STEP}.json
+    a saída de cada etapa concluída, identificada pelo mesmo nome de etapa do update_status.
+    As saídas também alimentam o ResultCache, compartilhado entre uploads com o mesmo conteúdo.
+    """
+
+    def __init__(self, bucket, file_id, manifest, cache=NO_CACHE):
+        self.bucket = bucket
+        self.file_id = file_id
+        self.manifest = manifest
+        self.cache = cache
+
+    @classmethod
+    def load(cls, bucket, file_id):
+        manifest = get_json(bucket, f"state/{file_id}.json")
+        if manifest is None:
+            return None
+        return cls(bucket, file_id, manifest, ResultCache(bucket, manifest.get('content_key')))
+
+    @classmethod
+    def begin(cls, bucket, file_id, file_key, content_key):
+        """Reaproveita o checkpoint do mesmo conteúdo ou inicia um novo (as saídas antigas deixam de valer)."""
+        checkpoint = cls.load(bucket, file_id)
+        if checkpoint is not None and checkpoint.manifest.get('content_key') == content_key:
+            logger.info(f"CHECKPOINT retomado para {file_id}")
+            return checkpoint
+        if checkpoint is not None:
+            # Mesmo nome, outro conteúdo: marcadores do modo 'event' da execução anterior não valem mais
+            delete_run_markers(bucket, file_id, checkpoint.manifest.get('event_run'))
+        checkpoint = cls(bucket, file_id, {
+            "bucket": bucket,
+            "file_key": file_key,
+            "file_id": file_id,
+            "content_key": content_key,
+            "rek_job_id": None,
+            "trans_job_name": None,
+            "started_at": time.time()
+        }, ResultCache(bucket, content_key))
+        checkpoint.save()
+        return checkpoint
+
+    def save(self):
+        put_json(self.bucket, f"state/{self.file_id}.json", self.manifest)
+
+    def set_job(self, field, job_id):
+        """Grava o ID do job assim que ele é iniciado, para não iniciá-lo de novo numa retomada."""
+        self.manifest[field] = job_id
+        self.save()
+
+    def clear_job(self, job_id):
+        """Esquece um job que falhou na AWS (a próxima execução inicia outro); os demais seguem valendo."""
+        for record in [self.manifest] + (self.manifest.get('chunks') or []):
+            for field in ('rek_job_id', 'trans_job_name'):
+                if record.get(field) == job_id:
+                    record[field] = None
+        self.save()
+
+    def record_failure(self):
+        """Conta as falhas transitórias seguidas deste vídeo e devolve o total."""
+        self.manifest['failures'] = self.manifest.get('failures', 0) + 1
+        self.save()
+        return self.manifest['failures']
+
+    def get(self, step):
+        record = get_json(self.bucket, f"state/{self.file_id}/{step}.json")
+        if record is not None and record.get('content_key') == self.manifest.get('content_key'):
+            return record['output']
+        return self.cache.get(step)
+
+    def put(self, step, value):
+        put_json(self.bucket, f"state/{self.file_id}/{step}.json", {
+            "content_key": self.manifest.get('content_key'),
+            "completed_at": time.time(),
+            "output": value
+        })
+        self.cache.put(step, value)
+
+    def stage(self, step, compute, span_stage=None, **attributes):
+        """
+        Devolve a saída já salva da etapa ou a calcula e grava. span_stage agrupa etapas de nome variável
+        (os trechos) numa única dimensão Stage do EMF; o que as distingue vai nos atributos do span.
+        """
+        with span(f"stage.{span_stage or step}", **attributes) as attrs:
+            value = self.get(step)
+            attrs['cached'] = value is not None
+            if value is None:
+                value = compute()
+                self.put(step, value)
+            return value
@@ -0,0 +1,198 @@
+"""
+Vídeos longos: divididos em trechos analisados em paralelo (map-reduce) e unidos na linha do tempo original.
+"""
+import logging
+import os
+import shutil
+import tempfile
+import threading
+import time
+from collections import Counter
+from concurrent.futures import FIRST_EXCEPTION, ThreadPoolExecutor, wait
+
+from aws_clients import s3_client
+from checkpoint import NO_CACHE
+from frames import FFMPEG_PATH, select_critical_frames
+from jobs import PipelineCancelled, fetch_transcription, iter_face_detections, start_transcription, start_video_analysis, wait_video_analysis
+from sentiment import analyze_text
+from status_writer import update_status
+from timeline import clock
+from tracing import current_plan, span, submit_with_context
+
+logger = logging.getLogger(__name__)
+
+# Vídeos longos: divididos em trechos de ~CHUNK_SECONDS (cortes em keyframes) analisados em paralelo (0 = desativado)
+CHUNK_SECONDS = float(os.environ.get('CHUNK_SECONDS', '0'))
+# Só vídeos a partir desta duração são divididos; abaixo disso um job único é mais barato
+CHUNK_MIN_DURATION_SECONDS = float(os.environ.get('CHUNK_MIN_DURATION_SECONDS', '900'))
+CHUNK_WORKERS = int(os.environ.get('CHUNK_WORKERS', '4'))
+
+def _read_segment_list(path):
+    if not os.path.exists(path):
+        return []
+    with open(path, encoding='utf-8') as f:
+        return [line.strip().split(',') for line in f if line.strip()]
+
+def upload_chunk(bucket, local_path, key):
+    with span("s3.upload_chunk", bytes=os.path.getsize(local_path)):
+        s3_client.upload_file(local_path, bucket, key)
+    # Cada trecho sai do /tmp assim que chega ao S3: o disco guarda só os trechos em trânsito
+    os.remove(local_path)
+
+def split_video(bucket, file_key, file_id, chunk_seconds=CHUNK_SECONDS):
+    """
+    Divide o vídeo em trechos de ~chunk_seconds com cópia de stream (sem recodificar). O segment muxer só
+    corta em keyframes, então cada trecho começa decodificável e o offset real vem da lista de segmentos.
+    Cada trecho é enviado para chunks/{file_id}/ enquanto o FFmpeg ainda escreve os seguintes.
+    """
+    work_dir = tempfile.mkdtemp(prefix=f"chunks_{file_id}_", dir="/tmp")
+    extension = os.path.splitext(file_key)[1]
+    segment_list = os.path.join(work_dir, "segments.csv")
+    video_url = s3_client.generate_presigned_url('get_object', Params={'Bucket': bucket, 'Key': file_key}, ExpiresIn=3600)
+    command = [
+        FFMPEG_PATH, "-y", "-loglevel", "error", "-i", video_url,
+        "-map", "0:v:0", "-map", "0:a:0?", "-c", "copy",
+        "-f", "segment", "-segment_time", str(chunk_seconds), "-reset_timestamps", "1",
+        "-segment_list", segment_list, "-segment_list_type", "csv",
+        os.path.join(work_dir, f"part_%03d{extension}")
+    ]
+    chunks = []
+    uploads = []
+    try:
+        with span("ffmpeg.split_video") as attrs, \
+                open(os.path.join(work_dir, "ffmpeg.log"), "wb") as ffmpeg_log, \
+                ThreadPoolExecutor(max_workers=CHUNK_WORKERS) as executor:
+            import subprocess
+            process = subprocess.Popen(command, stdout=subprocess.DEVNULL, stderr=ffmpeg_log)
+            while True:
+                finished = process.poll() is not None
+                # Uma linha na lista significa que o trecho foi fechado pelo FFmpeg
+                for name, start, end in _read_segment_list(segment_list)[len(chunks):]:
+                    index = len(chunks)
+                    chunk = {
+                        "index": index,
+                        "key": f"chunks/{file_id}/part_{index:03d}{extension}",
+                        "offset_ms": int(round(float(start) * 1000)),
+                        "end_ms": int(round(float(end) * 1000)),
+                        "rek_job_id": None,
+                        "trans_job_name": None
+                    }
+                    chunks.append(chunk)
+                    uploads.append(submit_with_context(executor, upload_chunk, bucket, os.path.join(work_dir, name), chunk["key"]))
+                if finished:
+                    break
+                time.sleep(0.2)
+            attrs.update(returncode=process.returncode, chunks=len(chunks))
+            for future in uploads:
+                future.result()
+
+        if process.returncode != 0 or not chunks:
+            with open(os.path.join(work_dir, "ffmpeg.log"), "rb") as f:
+                raise Exception(f"FFmpeg falhou ao dividir o vídeo: {f.read().decode('utf-8', 'ignore')[-500:]}")
+        return chunks
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+def chunk_step(chunk):
+    # A faixa de tempo identifica o trecho no checkpoint e no cache (independe de CHUNK_SECONDS mudar)
+    return f"CHUNK_{chunk['offset_ms']}-{chunk['end_ms']}"
+
+def _chunk_branch(bucket_name, chunk, cancel_event, context, checkpoint, save_lock):
+    audio = current_plan().get('audio', True)
+
+    def analyze():
+        if not chunk['rek_job_id'] or (audio and not chunk['trans_job_name']):
+            if not chunk['rek_job_id']:
+                chunk['rek_job_id'] = start_video_analysis(bucket_name, chunk['key'])
+            if audio and not chunk['trans_job_name']:
+                chunk['trans_job_name'] = start_transcription(bucket_name, chunk['key'])
+            with save_lock:
+                checkpoint.save()
+
+        first_page = wait_video_analysis(chunk['rek_job_id'], cancel_event, context)
+        faces = []
+        for face in iter_face_detections(chunk['rek_job_id'], first_page=first_page):
+            # Timestamps do Rekognition são relativos ao trecho: corrige para a linha do tempo do vídeo inteiro
+            face['Timestamp'] += chunk['offset_ms']
+            faces.append(face)
+        transcript, words = fetch_transcription(chunk['trans_job_name'], cancel_event, context) if audio else ("", {})
+        return {"faces": faces, "transcript": transcript, "words": words}
+
+    return checkpoint.stage(chunk_step(chunk), analyze, "CHUNK", offset_ms=chunk['offset_ms'], end_ms=chunk['end_ms'])
+
+def run_chunked_analysis(bucket_name, file_id, chunks, context=None, checkpoint=NO_CACHE):
+    """
+    Map-reduce para vídeos longos: cada trecho tem seus próprios jobs do Rekognition e do Transcribe,
+    com até CHUNK_WORKERS trechos em andamento ao mesmo tempo. A latência acompanha o tamanho do trecho,
+    não a duração total. No reduce, as faces são unidas na linha do tempo original e as transcrições costuradas.
+    """
+    update_status(bucket_name, file_id, "VIDEO_WAIT", f"Analisando {len(chunks)} trechos do vídeo em paralelo...", {"chunks": len(chunks)})
+    cancel_event = threading.Event()
+    save_lock = threading.Lock()
+    executor = ThreadPoolExecutor(max_workers=CHUNK_WORKERS)
+    try:
+        futures = [submit_with_context(executor, _chunk_branch, bucket_name, chunk, cancel_event, context, checkpoint, save_lock) for chunk in chunks]
+        done, _ = wait(futures, return_when=FIRST_EXCEPTION)
+        errors = [f.exception() for f in done if f.exception() is not None]
+        if errors:
+            cancel_event.set()
+            errors.sort(key=lambda e: isinstance(e, PipelineCancelled))
+            raise errors[0]
+        results = [f.result() for f in futures]
+    finally:
+        # Trechos ainda na fila não chegam a iniciar jobs se outro trecho falhou
+        executor.shutdown(wait=True, cancel_futures=True)
+
+    # Os trechos não se sobrepõem e estão em ordem: concatenar mantém a linha do tempo ordenada
+    video_results = [face for result in results for face in result['faces']]
+    checkpoint.put('VIDEO_DONE', video_results)
+    update_status(bucket_name, file_id, "VIDEO_DONE", "Análise de frames e emoções concluída.", {"faces": len(video_results), "chunks": len(chunks)})
+
+    transcript, words = stitch_transcripts(chunks, results)
+    checkpoint.put('AUDIO_WORDS', words)
+    checkpoint.put('AUDIO_DONE', transcript)
+    update_status(bucket_name, file_id, "AUDIO_DONE", "Transcrição concluída.", {"transcript_preview": transcript[:100] + "..."})
+    delete_chunks(bucket_name, chunks)
+
+    update_status(bucket_name, file_id, "TEXT_ANALYSIS", "Analisando sentimento e linguagem no texto...")
+    text_analysis = checkpoint.stage('TEXT_ANALYSIS', lambda: analyze_text(transcript))
+    return video_results, transcript, text_analysis
+
+def stitch_transcripts(chunks, results):
+    """Costura as transcrições dos trechos em ordem, levando as palavras para o tempo e a posição no texto final."""
+    parts = []
+    words = {"start_ms": [], "end_ms": [], "char": [], "char_end": []}
+    position = 0
+    for chunk, result in zip(chunks, results):
+        if not result['transcript']:
+            continue
+        if parts:
+            position += 1
+        chunk_words = result.get('words') or {}
+        for column, shift in (("start_ms", chunk['offset_ms']), ("end_ms", chunk['offset_ms']), ("char", position), ("char_end", position)):
+            words[column] += [value + shift for value in chunk_words.get(column, [])]
+        parts.append(result['transcript'])
+        position += len(result['transcript'])
+    return " ".join(parts), words
+
+def delete_chunks(bucket, chunks):
+    """Os trechos só servem aos jobs; depois do reduce são removidos (falhas ficam para a lifecycle rule)."""
+    try:
+        s3_client.delete_objects(Bucket=bucket, Delete={'Objects': [{'Key': chunk['key']} for chunk in chunks], 'Quiet': True})
+    except Exception as e:
+        logger.error(f"Erro ao remover trechos: {str(e)}")
+
+def summarize_chunks(timeline, chunks):
+    """Resumo de cada trecho (faixa de tempo, emoções dominantes e momentos críticos) para o prompt final."""
+    if not chunks:
+        return None
+    summaries = []
+    for chunk in chunks:
+        faces = timeline.faces_between(chunk['offset_ms'], chunk['end_ms'])
+        summaries.append({
+            "trecho": f"{clock(chunk['offset_ms'])}-{clock(chunk['end_ms'])}",
+            "faces": len(faces),
+            "emocoes": dict(Counter(f['Emotion'] for f in faces).most_common(3)),
+            "momentos_criticos_s": [round(f['Timestamp'] / 1000, 1) for f in select_critical_frames(faces, 3)]
+        })
+    return summaries
@@ -0,0 +1,209 @@
+"""
+Frames críticos: seleção pelas emoções e pelo score de risco, extração com o FFmpeg e upload para frames/.
+"""
+import logging
+import os
+import shutil
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+
+from aws_clients import FRAME_UPLOAD_WORKERS, s3_client
+from tracing import current_plan, span, submit_with_context
+
+logger = logging.getLogger(__name__)
+
+# Extração de frames: binário da layer, largura de saída (0 = original) e qualidade JPEG do FFmpeg (2 = melhor, 31 = pior)
+FFMPEG_PATH = os.environ.get('FFMPEG_PATH', '/opt/bin/ffmpeg')
+FRAME_WIDTH = int(os.environ.get('FRAME_WIDTH', '0'))
+FRAME_JPEG_QUALITY = int(os.environ.get('FRAME_JPEG_QUALITY', '2'))
+FRAME_BATCH_SIZE = int(os.environ.get('FRAME_BATCH_SIZE', '1'))
+# Processos FFmpeg simultâneos; cada frame entra no pool de uploads assim que o processo que o gerou termina
+FRAME_EXTRACT_WORKERS = int(os.environ.get('FRAME_EXTRACT_WORKERS', '4'))
+# 'url': o FFmpeg lê o vídeo direto do S3 por URL assinada (range requests); 'download': baixa o arquivo para /tmp
+FRAME_INPUT_MODE = os.environ.get('FRAME_INPUT_MODE', 'url')
+
+def select_critical_frames(video_results, count=6):
+    """Seleciona os frames mais relevantes baseados em emoções de risco."""
+    critical_emotions = ['FEAR', 'SADNESS', 'ANGRY', 'CONFUSED']
+    video_results = list(video_results)
+    # Filtrar apenas emoções críticas
+    filtered = [r for r in video_results if r['Emotion'] in critical_emotions]
+    # Se não houver críticas, pega as de maior confiança geral
+    if not filtered: filtered = video_results
+    
+    # Ordenar por confiança e pegar os top N únicos por segundo aproximado
+    sorted_res = sorted(filtered, key=lambda x: x['Confidence'], reverse=True)
+    seen_seconds = set()
+    selected = []
+    for r in sorted_res:
+        sec = round(r['Timestamp'] / 1000)
+        if sec not in seen_seconds:
+            selected.append(r)
+            seen_seconds.add(sec)
+        if len(selected) >= count: break
+    
+    return selected
+
+def build_frame_extraction_command(video_input, requests, width=None, quality=None):
+    """
+    Monta o comando FFmpeg de um lote de frames.
+    Cada timestamp vira uma entrada própria com seek rápido (-ss antes de -i) mapeada para a própria saída:
+    só o processo é compartilhado. Cada entrada ainda abre o vídeo (uma conexão HTTP por timestamp),
+    lê o container e inicializa o próprio decoder, mas decodifica apenas o GOP em torno do timestamp.
+    video_input: caminho local ou URL HTTP(S); requests: lista de (timestamp_sec, output_image).
+    """
+    width = current_plan().get('frame_width', FRAME_WIDTH) if width is None else width
+    quality = FRAME_JPEG_QUALITY if quality is None else quality
+
+    command = [FFMPEG_PATH, "-y", "-loglevel", "error"]
+    for timestamp_sec, _ in requests:
+        command += ["-ss", str(timestamp_sec), "-i", video_input]
+    for index, (_, output_image) in enumerate(requests):
+        command += ["-map", f"{index}:v:0", "-frames:v", "1", "-q:v", str(quality)]
+        if width:
+            command += ["-vf", f"scale={width}:-2"]
+        command.append(output_image)
+    return command
+
+def extract_frames(video_input, batch, width=None, quality=None):
+    """
+    Extrai um lote de timestamps num processo FFmpeg e devolve as saídas que ele gerou.
+    batch: lista de (timestamp_sec, output_image), como em build_frame_extraction_command.
+    """
+    import subprocess
+    # Remove sobras de invocações anteriores para que a checagem de existência seja confiável
+    for _, output_image in batch:
+        if os.path.exists(output_image):
+            os.remove(output_image)
+    with span("ffmpeg.extract_frames", frames=len(batch)) as attrs:
+        result = subprocess.run(build_frame_extraction_command(video_input, batch, width, quality), stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        attrs['returncode'] = result.returncode
+    if result.returncode != 0:
+        logger.error(f"FFmpeg falhou no lote de frames: {result.stderr.decode('utf-8', 'ignore')[-500:]}")
+    return {output_image for _, output_image in batch if os.path.exists(output_image)}
+
+@lru_cache(maxsize=None)
+def frame_transfer_config():
+    from boto3.s3.transfer import TransferConfig
+    # Frames são pequenos: sem multipart e sem threads internas, o paralelismo fica no pool de uploads
+    return TransferConfig(multipart_threshold=64 * 1024 * 1024, use_threads=False)
+
+def upload_frame(bucket, output_image, s3_frame_key):
+    with span("s3.upload_frame", bytes=os.path.getsize(output_image)):
+        s3_client.upload_file(
+            output_image,
+            bucket,
+            s3_frame_key,
+            ExtraArgs={'ContentType': 'image/jpeg'},
+            Config=frame_transfer_config()
+        )
+
+def extract_and_upload_frames(bucket, file_key, file_id, critical_frames):
+    """
+    Extrai frames usando FFmpeg e salva no S3.
+    Os lotes de FRAME_BATCH_SIZE timestamps rodam em até FRAME_EXTRACT_WORKERS processos FFmpeg ao mesmo tempo,
+    e cada frame sobe pelo pool de uploads assim que o processo do seu lote termina: a etapa leva o tempo do
+    lote mais lento mais um upload, não a soma de todos.
+    """
+    with span("frames.extract_and_upload", requested=len(critical_frames)) as attrs:
+        enriched_frames = _extract_and_upload_frames(bucket, file_key, file_id, critical_frames)
+        attrs['extracted'] = len(enriched_frames)
+        return enriched_frames
+
+def _extract_and_upload_frames(bucket, file_key, file_id, critical_frames):
+    # Diretório exclusivo por invocação: containers aquecidos não compartilham arquivos
+    work_dir = tempfile.mkdtemp(prefix=f"frames_{file_id}_", dir="/tmp")
+    try:
+        if FRAME_INPUT_MODE == 'url':
+            # Com a URL assinada o FFmpeg busca só o moov e os GOPs ao redor de cada timestamp
+            video_input = s3_client.generate_presigned_url('get_object', Params={'Bucket': bucket, 'Key': file_key}, ExpiresIn=900)
+            enriched_frames = _extract_and_upload(bucket, file_id, critical_frames, video_input, work_dir)
+            if enriched_frames or not critical_frames:
+                return enriched_frames
+            logger.warning("Nenhum frame extraído via URL; baixando o vídeo para /tmp.")
+
+        local_video = os.path.join(work_dir, "video" + os.path.splitext(file_key)[1])
+        with span("s3.download_video"):
+            s3_client.download_file(bucket, file_key, local_video)
+        return _extract_and_upload(bucket, file_id, critical_frames, local_video, work_dir)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+def _extract_and_upload(bucket, file_id, critical_frames, video_input, work_dir):
+    requests = [(frame["Timestamp"] / 1000, os.path.join(work_dir, f"frame_{int(frame['Timestamp'])}.jpg")) for frame in critical_frames]
+    uploads = {}
+
+    def extract_batch(start, upload_executor):
+        batch = requests[start:start + FRAME_BATCH_SIZE]
+        extracted = extract_frames(video_input, batch)
+        for index, (_, output_image) in enumerate(batch, start):
+            if output_image not in extracted:
+                logger.warning(f"Frame não gerado: {output_image}")
+                continue
+            s3_frame_key = f"frames/{file_id}_{int(critical_frames[index]['Timestamp'])}.jpg"
+            uploads[index] = (s3_frame_key, submit_with_context(upload_executor, upload_frame, bucket, output_image, s3_frame_key))
+
+    starts = range(0, len(requests), FRAME_BATCH_SIZE)
+    with ThreadPoolExecutor(max_workers=FRAME_UPLOAD_WORKERS) as upload_executor:
+        with ThreadPoolExecutor(max_workers=max(1, min(FRAME_EXTRACT_WORKERS, len(starts)))) as extract_executor:
+            batches = [submit_with_context(extract_executor, extract_batch, start, upload_executor) for start in starts]
+            for future in batches:
+                future.result()
+
+    enriched_frames = []
+    for index, frame in enumerate(critical_frames):
+        if index not in uploads:
+            continue
+        s3_frame_key, future = uploads[index]
+        future.result()
+        frame["FrameKey"] = s3_frame_key
+        enriched_frames.append(frame)
+
+    return presign_frames(bucket, enriched_frames)
+
+def presign_frames(bucket, frames):
+    """URLs assinadas (1 hora) para os frames; a assinatura é calculada localmente, sem chamada de rede."""
+    for frame in frames:
+        frame["FrameImage"] = s3_client.generate_presigned_url(
+            'get_object',
+            Params={'Bucket': bucket, 'Key': frame["FrameKey"]},
+            ExpiresIn=3600
+        )
+    return frames
+
+def select_frames_by_risk(video_results, risk_score, count=6, timeline=None):
+    # Aceita também o gerador de iter_face_detections; os registros compactos são pequenos
+    video_results = timeline.faces if timeline is not None else list(video_results)
+    if not video_results:
+        return []
+
+    high_risk_emotions = ['FEAR', 'SADNESS', 'ANGRY', 'CONFUSED', 'SURPRISED']
+    low_risk_emotions = ['CALM', 'HAPPY']
+
+    if risk_score >= 70:
+        candidates = [r for r in video_results if r['Emotion'] in high_risk_emotions]
+        if timeline is not None and timeline.segments:
+            # Rosto e fala indicando risco ao mesmo tempo vêm primeiro (ordenação estável mantém o resto)
+            candidates.sort(key=lambda r: (timeline.segment_at(r['Timestamp']) or {}).get('Sentiment') != 'NEGATIVE')
+        if not candidates:
+            candidates = sorted(video_results, key=lambda x: x['Confidence'])
+    elif risk_score <= 30:
+        candidates = [r for r in video_results if r['Emotion'] in low_risk_emotions]
+        candidates = sorted(candidates, key=lambda x: x['Confidence'], reverse=True)
+    else:
+        # risco médio → mistura equilibrada
+        candidates = video_results
+
+    seen_seconds = set()
+    selected = []
+
+    for r in candidates:
+        sec = round(r['Timestamp'] / 1000)
+        if sec not in seen_seconds:
+            selected.append(r)
+            seen_seconds.add(sec)
+        if len(selected) >= count:
+            break
+
+    return selected
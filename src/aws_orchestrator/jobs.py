@@ -0,0 +1,212 @@
+"""
+Jobs assíncronos do Rekognition (detecção de faces) e do Transcribe, com o polling compartilhado entre eles.
+"""
+import json
+import logging
+import os
+import random
+import time
+import uuid
+
+from aws_clients import rekognition_client, transcribe_client
+from checkpoint import NO_CACHE
+from limiter import LIMITERS
+from timeline import EMOTION_TYPES
+from tracing import current_plan, span
+
+logger = logging.getLogger(__name__)
+
+# Polling adaptativo: começa rápido e recua exponencialmente com jitter até o teto
+POLL_INITIAL_SECONDS = float(os.environ.get('POLL_INITIAL_SECONDS', '1'))
+POLL_MAX_SECONDS = float(os.environ.get('POLL_MAX_SECONDS', '20'))
+POLL_MULTIPLIER = float(os.environ.get('POLL_MULTIPLIER', '2'))
+# Margem reservada antes do timeout da Lambda para salvar o progresso e encerrar
+POLL_DEADLINE_MARGIN_MS = int(os.environ.get('POLL_DEADLINE_MARGIN_MS', '60000'))
+
+# Tamanho de página do get_face_detection (o Rekognition aceita no máximo 1000)
+FACE_DETECTION_MAX_RESULTS = min(int(os.environ.get('FACE_DETECTION_MAX_RESULTS', '1000')), 1000)
+
+class PipelineCancelled(Exception):
+    """Sinaliza que uma etapa paralela foi interrompida porque outra falhou."""
+
+class PollDeadlineExceeded(Exception):
+    """Sinaliza que a Lambda está perto do timeout e o polling parou para salvar o progresso."""
+
+class JobFailedError(Exception):
+    """Sinaliza que um job do Rekognition ou do Transcribe terminou com FAILED na própria AWS."""
+
+    def __init__(self, job_id, message):
+        super().__init__(message)
+        self.job_id = job_id
+
+def _sleep(seconds, cancel_event=None):
+    """Aguarda entre consultas, interrompendo cedo se o pipeline for cancelado."""
+    if cancel_event is None:
+        time.sleep(seconds)
+    elif cancel_event.wait(seconds):
+        raise PipelineCancelled("Etapa cancelada por falha em outra etapa paralela.")
+
+class JobPoller:
+    """
+    Poller compartilhado pelos jobs assíncronos (Rekognition, Transcribe).
+    Usa backoff exponencial com jitter e respeita context.get_remaining_time_in_millis().
+    """
+
+    def __init__(self, job_label, context=None, cancel_event=None):
+        self.job_label = job_label
+        self.context = context
+        self.cancel_event = cancel_event
+        self.interval = current_plan().get('poll_initial_seconds', POLL_INITIAL_SECONDS)
+        self.poll_count = 0
+        self.wait_seconds = 0.0
+        self.started_at = time.time()
+
+    def _remaining_seconds(self):
+        if self.context is None:
+            return None
+        return (self.context.get_remaining_time_in_millis() - POLL_DEADLINE_MARGIN_MS) / 1000
+
+    def run(self, check):
+        """Chama check() até que devolva algo diferente de None."""
+        with span(f"{self.job_label.split(':')[0]}.wait", job=self.job_label) as wait_attrs:
+            try:
+                return self._run(check)
+            finally:
+                wait_attrs.update(attempts=self.poll_count, wait_seconds=round(self.wait_seconds, 3))
+
+    def _run(self, check):
+        while True:
+            self.poll_count += 1
+            with span(f"{self.job_label.split(':')[0]}.poll", attempt=self.poll_count):
+                result = check()
+            if result is not None:
+                logger.info(f"POLL_METRICS {json.dumps(self.metrics())}")
+                return result
+
+            # Jitter "igual": metade fixa + metade aleatória evita consultas sincronizadas entre uploads
+            delay = self.interval / 2 + random.uniform(0, self.interval / 2)
+            remaining = self._remaining_seconds()
+            if remaining is not None and remaining <= delay:
+                logger.warning(f"POLL_DEADLINE {json.dumps(self.metrics())}")
+                raise PollDeadlineExceeded(f"Tempo da Lambda esgotando durante a espera de {self.job_label}.")
+
+            _sleep(delay, self.cancel_event)
+            self.wait_seconds += delay
+            self.interval = min(self.interval * POLL_MULTIPLIER, POLL_MAX_SECONDS)
+
+    def metrics(self):
+        return {
+            "job": self.job_label,
+            "polls": self.poll_count,
+            "wait_seconds": round(self.wait_seconds, 3),
+            "elapsed_seconds": round(time.time() - self.started_at, 3)
+        }
+
+def start_video_analysis(bucket, key, notification_channel=None):
+    params = {'Video': {'S3Object': {'Bucket': bucket, 'Name': key}}, 'FaceAttributes': 'ALL'}
+    if notification_channel:
+        params['NotificationChannel'] = notification_channel
+    with span("rekognition.start_face_detection"):
+        return LIMITERS['rekognition'].call(rekognition_client.start_face_detection, **params)['JobId']
+
+def wait_video_analysis(job_id, cancel_event=None, context=None, max_results=FACE_DETECTION_MAX_RESULTS):
+    """Aguarda o job do Rekognition terminar e devolve a primeira página de resultados."""
+    def check():
+        res = LIMITERS['rekognition'].call(rekognition_client.get_face_detection, JobId=job_id, MaxResults=max_results)
+        if res['JobStatus'] == 'SUCCEEDED':
+            return res
+        if res['JobStatus'] == 'FAILED': raise JobFailedError(job_id, f"Rekognition Failed: {res.get('StatusMessage', 'Unknown')}")
+        return None
+    return JobPoller(f"rekognition:{job_id}", context, cancel_event).run(check)
+
+def compact_face(face_detection):
+    """Reduz uma detecção do Rekognition ao registro usado pelo pipeline (ou None se não houver emoções)."""
+    emotions = face_detection['Face'].get('Emotions')
+    if not emotions:
+        return None
+    top_emotion = max(emotions, key=lambda x: x['Confidence'])
+    confidences = {emotion['Type']: emotion['Confidence'] for emotion in emotions}
+    return {
+        "Timestamp": face_detection['Timestamp'],
+        "Emotion": top_emotion['Type'],
+        "Confidence": top_emotion['Confidence'],
+        # Vetor completo na ordem de EMOTION_TYPES: a emoção dominante sozinha descarta o resto do sinal
+        "Emotions": [round(confidences.get(emotion, 0.0), 2) for emotion in EMOTION_TYPES]
+    }
+
+def iter_face_detections(job_id, max_results=FACE_DETECTION_MAX_RESULTS, first_page=None):
+    """
+    Percorre todas as páginas do get_face_detection seguindo o NextToken e gera
+    registros compactos conforme chegam. Só uma página bruta fica em memória por vez.
+    """
+    res = first_page or LIMITERS['rekognition'].call(rekognition_client.get_face_detection, JobId=job_id, MaxResults=max_results)
+    page = 1
+    while True:
+        for face_detection in res['Faces']:
+            record = compact_face(face_detection)
+            if record is not None:
+                yield record
+        next_token = res.get('NextToken')
+        if not next_token:
+            return
+        page += 1
+        with span("rekognition.get_face_detection_page", page=page) as attrs:
+            res = LIMITERS['rekognition'].call(rekognition_client.get_face_detection, JobId=job_id, MaxResults=max_results, NextToken=next_token)
+            attrs['faces'] = len(res['Faces'])
+
+def get_video_analysis_results(job_id, cancel_event=None, context=None):
+    first_page = wait_video_analysis(job_id, cancel_event, context)
+    return list(iter_face_detections(job_id, first_page=first_page))
+
+def start_transcription(bucket, key):
+    clean_name = "".join([c for c in key.split('/')[-1] if c.isalnum()])[:10]
+    # Sufixo aleatório: trechos do mesmo vídeo iniciam jobs no mesmo segundo
+    job_name = f"trans_{int(time.time())}_{clean_name}_{uuid.uuid4().hex[:8]}"
+    with span("transcribe.start_transcription_job"):
+        LIMITERS['transcribe'].call(transcribe_client.start_transcription_job, TranscriptionJobName=job_name, Media={'MediaFileUri': f"s3://{bucket}/{key}"}, LanguageCode='pt-BR')
+    return job_name
+
+def fetch_transcription(job_name, cancel_event=None, context=None):
+    """Aguarda o job do Transcribe e devolve (texto, tempos das palavras)."""
+    def check():
+        res = LIMITERS['transcribe'].call(transcribe_client.get_transcription_job, TranscriptionJobName=job_name)
+        status = res['TranscriptionJob']['TranscriptionJobStatus']
+        if status == 'COMPLETED':
+            return res['TranscriptionJob']['Transcript']['TranscriptFileUri']
+        if status == 'FAILED': raise JobFailedError(job_name, f"Transcribe Failed: {res['TranscriptionJob'].get('FailureReason', 'Unknown')}")
+        return None
+
+    transcript_uri = JobPoller(f"transcribe:{job_name}", context, cancel_event).run(check)
+    import urllib.request
+    with span("transcribe.fetch_transcript"):
+        with urllib.request.urlopen(transcript_uri) as response:
+            transcript_json = json.load(response)
+    return transcript_json['results']['transcripts'][0]['transcript'], transcript_words(transcript_json)
+
+def get_transcription_results(job_name, cancel_event=None, context=None, checkpoint=NO_CACHE):
+    """Texto da transcrição; os tempos das palavras ficam no checkpoint em AUDIO_WORDS, para a linha do tempo."""
+    transcript, words = fetch_transcription(job_name, cancel_event, context)
+    checkpoint.put('AUDIO_WORDS', words)
+    return transcript
+
+def transcript_words(transcript_json):
+    """
+    Início/fim (ms) e posição no texto de cada palavra, a partir dos items do Transcribe.
+    Colunas paralelas em vez de uma lista de objetos: o JSON fica pequeno e a linha do tempo usa bisect direto.
+    """
+    text = transcript_json['results']['transcripts'][0]['transcript']
+    words = {"start_ms": [], "end_ms": [], "char": [], "char_end": []}
+    position = 0
+    for item in transcript_json['results'].get('items', []):
+        if item.get('type') != 'pronunciation':
+            continue
+        content = item['alternatives'][0]['content']
+        found = text.find(content, position)
+        if found < 0:
+            continue
+        words["start_ms"].append(int(float(item['start_time']) * 1000))
+        words["end_ms"].append(int(float(item['end_time']) * 1000))
+        words["char"].append(found)
+        words["char_end"].append(found + len(content))
+        position = found + len(content)
+    return words
@@ -0,0 +1,120 @@
+"""
+Controle de admissão das chamadas aos serviços da AWS (token bucket, concorrência e novas tentativas com backoff).
+"""
+import logging
+import os
+import random
+import threading
+import time
+from collections import Counter
+
+from botocore.exceptions import ClientError, ConnectionError as BotoConnectionError, HTTPClientError
+
+from tracing import emit_metrics
+
+logger = logging.getLogger(__name__)
+
+# Controle de admissão por serviço: chamadas por segundo e simultâneas (por container; as cotas da AWS são
+# por conta e região, então o throttling que ainda chegar é absorvido com novas tentativas e backoff)
+def _service_limits(service, tps, concurrency):
+    prefix = service.upper().replace('-', '_')
+    return float(os.environ.get(f'{prefix}_TPS', tps)), int(os.environ.get(f'{prefix}_CONCURRENCY', concurrency))
+
+SERVICE_LIMITS = {
+    'rekognition': _service_limits('rekognition', '5', '10'),
+    'transcribe': _service_limits('transcribe', '10', '10'),
+    'comprehend': _service_limits('comprehend', '10', '8'),
+    'bedrock': _service_limits('bedrock', '10', '4'),
+}
+
+# Clientes boto3 cujas chamadas passam por LIMITERS (o Bedrock é chamado pelo cliente bedrock-runtime)
+LIMITED_SERVICES = ('rekognition', 'transcribe', 'comprehend', 'bedrock-runtime')
+THROTTLE_MAX_ATTEMPTS = int(os.environ.get('THROTTLE_MAX_ATTEMPTS', '6'))
+THROTTLE_BASE_SECONDS = float(os.environ.get('THROTTLE_BASE_SECONDS', '0.5'))
+THROTTLE_MAX_SECONDS = float(os.environ.get('THROTTLE_MAX_SECONDS', '20'))
+
+# Códigos de throttling/cota dos serviços limitados (o stream do Bedrock usa os nomes em minúsculas)
+THROTTLE_ERROR_CODES = {
+    'ThrottlingException', 'throttlingException', 'LimitExceededException', 'TooManyRequestsException',
+    'ProvisionedThroughputExceededException', 'RequestLimitExceeded', 'Throttling',
+    'ServiceUnavailableException', 'serviceUnavailableException',
+}
+
+def retryable_error_code(error):
+    """Código do erro quando ele vale nova tentativa (throttling, 5xx ou falha de conexão); senão None."""
+    if isinstance(error, ClientError):
+        code = error.response.get('Error', {}).get('Code')
+        status = error.response.get('ResponseMetadata', {}).get('HTTPStatusCode') or 0
+        if code in THROTTLE_ERROR_CODES or status >= 500:
+            return code or str(status)
+        return None
+    return type(error).__name__
+
+class ServiceLimiter:
+    """
+    Controle de admissão de um serviço da AWS: token bucket (chamadas por segundo, com fila por reserva),
+    semáforo (chamadas simultâneas) e novas tentativas com backoff quando o serviço responde com throttling,
+    em vez de deixar o vídeo cair no ERROR. Um throttle esvazia o balde para que as outras threads também recuem.
+    """
+
+    def __init__(self, name, tps, concurrency, max_attempts=THROTTLE_MAX_ATTEMPTS):
+        self.name = name
+        self.tps = tps
+        # Sem rajadas: as chamadas saem espaçadas em 1/tps, o que também respeita cotas medidas em janela de 1s
+        self.burst = 1.0
+        self.max_attempts = max(1, max_attempts)
+        self.stats = Counter()
+        self._tokens = self.burst
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(concurrency) if concurrency > 0 else None
+
+    def _reserve(self):
+        """Reserva uma ficha e devolve quanto esperar por ela (saldo negativo = posição na fila)."""
+        if self.tps <= 0:
+            return 0.0
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.tps)
+            self._updated = now
+            self._tokens -= 1
+            return -self._tokens / self.tps if self._tokens < 0 else 0.0
+
+    def _throttled(self):
+        with self._lock:
+            self._tokens = min(self._tokens, 0.0)
+            self.stats['throttled'] += 1
+
+    def call(self, fn, *args, **kwargs):
+        for attempt in range(1, self.max_attempts + 1):
+            queued_at = time.time()
+            time.sleep(self._reserve())
+            if self._slots:
+                self._slots.acquire()
+            try:
+                queued_ms = round((time.time() - queued_at) * 1000, 1)
+                self.stats['calls'] += 1
+                if queued_ms >= 1:
+                    emit_metrics(f"limiter.{self.name}", QueueWait=queued_ms)
+                return fn(*args, **kwargs)
+            except (ClientError, BotoConnectionError, HTTPClientError) as e:
+                code = retryable_error_code(e)
+                if code is None or attempt == self.max_attempts:
+                    raise
+                throttled = code in THROTTLE_ERROR_CODES
+                if throttled:
+                    self._throttled()
+            finally:
+                if self._slots:
+                    self._slots.release()
+
+            delay = min(THROTTLE_MAX_SECONDS, THROTTLE_BASE_SECONDS * 2 ** (attempt - 1))
+            delay = delay / 2 + random.uniform(0, delay / 2)
+            logger.warning(f"{'THROTTLE' if throttled else 'FALHA TRANSITÓRIA'} {self.name}: {code}, nova tentativa {attempt + 1}/{self.max_attempts} em {delay:.2f}s")
+            if throttled:
+                emit_metrics(f"limiter.{self.name}", unit="Count", Throttles=1)
+            else:
+                emit_metrics(f"limiter.{self.name}", unit="Count", TransientErrors=1)
+            time.sleep(delay)
+
+LIMITERS = {service: ServiceLimiter(service, tps, concurrency) for service, (tps, concurrency) in SERVICE_LIMITS.items()}
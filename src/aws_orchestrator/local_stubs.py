@@ -0,0 +1,396 @@
+"""
+Dublês locais dos serviços AWS usados pelo orquestrador.
+Permitem exercitar o modo orientado a eventos (ORCHESTRATION_MODE=event) e rodar o
+benchmark (benchmark.py) sem conta AWS, com latência e duração de job configuráveis.
+"""
+import hashlib
+import json
+import os
+import random
+import threading
+import time
+import uuid
+from collections import Counter, deque
+
+from botocore.exceptions import ClientError
+
+
+EMOTION_TYPES = ['HAPPY', 'SAD', 'ANGRY', 'CONFUSED', 'DISGUSTED', 'SURPRISED', 'CALM', 'FEAR']
+
+
+def _client_error(code, operation):
+    return ClientError({'Error': {'Code': code, 'Message': code}}, operation)
+
+
+class _Body:
+    def __init__(self, data):
+        self._data = data
+
+    def read(self):
+        return self._data
+
+
+class _LocalService:
+    """Base dos dublês: conta as chamadas por operação e simula a latência de rede."""
+
+    def __init__(self, latency=0.0):
+        self.latency = latency
+        self.calls = Counter()
+        self._lock = threading.Lock()
+
+    def _call(self, operation):
+        with self._lock:
+            self.calls[operation] += 1
+        if self.latency:
+            time.sleep(self.latency)
+
+
+class LocalS3(_LocalService):
+    """
+    Subconjunto do cliente S3 em memória, incluindo escrita condicional (IfNoneMatch='*').
+    Com materialize_dir, as URLs assinadas apontam para cópias locais dos objetos, que o FFmpeg consegue abrir.
+    """
+
+    def __init__(self, latency=0.0, materialize_dir=None):
+        super().__init__(latency)
+        self.objects = {}
+        self.materialize_dir = materialize_dir
+
+    def _store(self, Bucket, Key, body, ContentType=None):
+        etag = f'"{hashlib.md5(body).hexdigest()}"'
+        self.objects[(Bucket, Key)] = {'Body': body, 'ContentType': ContentType, 'ETag': etag}
+        return etag
+
+    def put_object(self, Bucket, Key, Body, ContentType=None, IfNoneMatch=None, **kwargs):
+        self._call('put_object')
+        if IfNoneMatch == '*' and (Bucket, Key) in self.objects:
+            raise _client_error('PreconditionFailed', 'PutObject')
+        body = Body.encode('utf-8') if isinstance(Body, str) else Body
+        return {'ETag': self._store(Bucket, Key, body, ContentType)}
+
+    def get_object(self, Bucket, Key, **kwargs):
+        self._call('get_object')
+        if (Bucket, Key) not in self.objects:
+            raise _client_error('NoSuchKey', 'GetObject')
+        obj = self.objects[(Bucket, Key)]
+        return {'Body': _Body(obj['Body']), 'ETag': obj['ETag'], 'ContentLength': len(obj['Body'])}
+
+    def head_object(self, Bucket, Key, **kwargs):
+        self._call('head_object')
+        if (Bucket, Key) not in self.objects:
+            raise _client_error('404', 'HeadObject')
+        obj = self.objects[(Bucket, Key)]
+        return {'ETag': obj['ETag'], 'ContentLength': len(obj['Body']), 'ContentType': obj['ContentType']}
+
+    def download_file(self, Bucket, Key, Filename, **kwargs):
+        self._call('download_file')
+        if (Bucket, Key) not in self.objects:
+            raise _client_error('404', 'HeadObject')
+        with open(Filename, 'wb') as f:
+            f.write(self.objects[(Bucket, Key)]['Body'])
+
+    def upload_file(self, Filename, Bucket, Key, ExtraArgs=None, Config=None, **kwargs):
+        self._call('upload_file')
+        with open(Filename, 'rb') as f:
+            self._store(Bucket, Key, f.read(), (ExtraArgs or {}).get('ContentType'))
+
+    def delete_objects(self, Bucket, Delete, **kwargs):
+        self._call('delete_objects')
+        for obj in Delete['Objects']:
+            self.objects.pop((Bucket, obj['Key']), None)
+            if self.materialize_dir:
+                path = os.path.join(self.materialize_dir, Bucket, obj['Key'])
+                if os.path.exists(path):
+                    os.remove(path)
+        return {}
+
+    def generate_presigned_url(self, ClientMethod, Params=None, ExpiresIn=3600, **kwargs):
+        # Assinatura é local no boto3 também: não conta como chamada de API
+        bucket, key = Params['Bucket'], Params['Key']
+        if self.materialize_dir is None or (bucket, key) not in self.objects:
+            return f"https://{bucket}.s3.local/{key}?X-Amz-Expires={ExpiresIn}"
+        path = os.path.join(self.materialize_dir, bucket, key)
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, 'wb') as f:
+                f.write(self.objects[(bucket, key)]['Body'])
+        return path
+
+
+def synthetic_face_detections(duration_ms, interval_ms=200, seed=0, risk_bias=0.5):
+    """
+    Detecções no formato do get_face_detection do Rekognition: uma face a cada interval_ms,
+    com as 8 emoções. risk_bias (0-1) aumenta o peso de FEAR/SAD/ANGRY/CONFUSED.
+    """
+    rng = random.Random(seed)
+    risk = {'FEAR', 'SAD', 'ANGRY', 'CONFUSED'}
+    for timestamp in range(0, int(duration_ms), interval_ms):
+        weights = [rng.random() * (1 + 3 * risk_bias if t in risk else 1 + 3 * (1 - risk_bias)) for t in EMOTION_TYPES]
+        total = sum(weights)
+        yield {
+            'Timestamp': timestamp,
+            'Face': {
+                'BoundingBox': {'Width': 0.3, 'Height': 0.4, 'Left': 0.35, 'Top': 0.2},
+                'Pose': {'Roll': rng.uniform(-5, 5), 'Yaw': rng.uniform(-10, 10), 'Pitch': rng.uniform(-5, 5)},
+                'Confidence': 99.9,
+                'Emotions': [{'Type': t, 'Confidence': 100 * w / total} for t, w in zip(EMOTION_TYPES, weights)]
+            }
+        }
+
+
+def _job_seconds(job_seconds, *media):
+    # Número fixo ou função do objeto analisado (para simular jobs que duram proporcionalmente ao vídeo)
+    return job_seconds(*media) if callable(job_seconds) else job_seconds
+
+
+class LocalRekognition(_LocalService):
+    """Job de detecção de faces que fica IN_PROGRESS por job_seconds e depois pagina as detecções."""
+
+    def __init__(self, faces_for, job_seconds=0.0, latency=0.0):
+        super().__init__(latency)
+        self.faces_for = faces_for
+        self.job_seconds = job_seconds
+        self.jobs = {}
+
+    def start_face_detection(self, Video, FaceAttributes='DEFAULT', NotificationChannel=None, **kwargs):
+        self._call('start_face_detection')
+        job_id = uuid.uuid4().hex
+        s3_object = Video['S3Object']
+        self.jobs[job_id] = {'started_at': time.time(), 'bucket': s3_object['Bucket'], 'key': s3_object['Name'], 'faces': None,
+                             'job_seconds': _job_seconds(self.job_seconds, s3_object['Bucket'], s3_object['Name'])}
+        return {'JobId': job_id}
+
+    def get_face_detection(self, JobId, MaxResults=1000, NextToken=None, **kwargs):
+        self._call('get_face_detection')
+        job = self.jobs[JobId]
+        if time.time() - job['started_at'] < job['job_seconds']:
+            return {'JobStatus': 'IN_PROGRESS'}
+        if job['faces'] is None:
+            job['faces'] = list(self.faces_for(job['bucket'], job['key']))
+        start = int(NextToken or 0)
+        res = {'JobStatus': 'SUCCEEDED', 'Faces': job['faces'][start:start + MaxResults]}
+        if start + MaxResults < len(job['faces']):
+            res['NextToken'] = str(start + MaxResults)
+        return res
+
+
+def synthetic_transcript(duration_seconds, words_per_second=2.5, seed=0):
+    """Resultado do Transcribe (transcript + items com start/end) para uma fala da duração dada."""
+    rng = random.Random(seed)
+    vocabulary = ("eu tenho medo quando ele chega em casa porque grita comigo e "
+                  "às vezes me empurra não sei mais o que fazer minha família não sabe "
+                  "estou cansada e sozinha mas hoje decidi contar").split()
+    items = []
+    words = []
+    t = 0.0
+    while t < duration_seconds:
+        word = rng.choice(vocabulary)
+        length = 1 / words_per_second
+        items.append({'type': 'pronunciation', 'start_time': f"{t:.3f}", 'end_time': f"{t + length * 0.8:.3f}",
+                      'alternatives': [{'content': word, 'confidence': '0.98'}]})
+        words.append(word)
+        t += length
+        if len(words) % 12 == 0:
+            items.append({'type': 'punctuation', 'alternatives': [{'content': '.', 'confidence': '0.0'}]})
+            words[-1] += '.'
+    return {'results': {'transcripts': [{'transcript': ' '.join(words)}], 'items': items}}
+
+
+class LocalTranscribe(_LocalService):
+    """Job de transcrição que conclui após job_seconds; o JSON do resultado é servido por URI file://."""
+
+    def __init__(self, transcript_for, work_dir, job_seconds=0.0, latency=0.0):
+        super().__init__(latency)
+        self.transcript_for = transcript_for
+        self.work_dir = work_dir
+        self.job_seconds = job_seconds
+        self.jobs = {}
+
+    def start_transcription_job(self, TranscriptionJobName, Media, LanguageCode=None, **kwargs):
+        self._call('start_transcription_job')
+        self.jobs[TranscriptionJobName] = {'started_at': time.time(), 'uri': Media['MediaFileUri'], 'path': None,
+                                           'job_seconds': _job_seconds(self.job_seconds, Media['MediaFileUri'])}
+        return {'TranscriptionJob': {'TranscriptionJobName': TranscriptionJobName, 'TranscriptionJobStatus': 'IN_PROGRESS'}}
+
+    def get_transcription_job(self, TranscriptionJobName, **kwargs):
+        self._call('get_transcription_job')
+        job = self.jobs[TranscriptionJobName]
+        if time.time() - job['started_at'] < job['job_seconds']:
+            return {'TranscriptionJob': {'TranscriptionJobName': TranscriptionJobName, 'TranscriptionJobStatus': 'IN_PROGRESS'}}
+        if job['path'] is None:
+            job['path'] = os.path.join(self.work_dir, f"{TranscriptionJobName}.json")
+            with open(job['path'], 'w', encoding='utf-8') as f:
+                json.dump(self.transcript_for(job['uri']), f, ensure_ascii=False)
+        return {'TranscriptionJob': {
+            'TranscriptionJobName': TranscriptionJobName,
+            'TranscriptionJobStatus': 'COMPLETED',
+            'Transcript': {'TranscriptFileUri': 'file://' + os.path.abspath(job['path'])}
+        }}
+
+
+def _sentiment_result(text):
+    negative = sum(text.count(w) for w in ('medo', 'grita', 'empurra', 'sozinha', 'cansada'))
+    score = min(0.95, 0.2 + 0.05 * negative)
+    return {'Sentiment': 'NEGATIVE' if score > 0.5 else 'NEUTRAL',
+            'SentimentScore': {'Positive': 0.02, 'Negative': score, 'Neutral': 0.96 - score, 'Mixed': 0.02}}
+
+
+class LocalComprehend(_LocalService):
+    """detect_sentiment e batch_detect_sentiment com os mesmos limites do serviço real (5000 bytes, 25 documentos)."""
+
+    def detect_sentiment(self, Text, LanguageCode):
+        self._call('detect_sentiment')
+        if len(Text.encode('utf-8')) > 5000:
+            raise _client_error('TextSizeLimitExceededException', 'DetectSentiment')
+        return _sentiment_result(Text)
+
+    def batch_detect_sentiment(self, TextList, LanguageCode):
+        self._call('batch_detect_sentiment')
+        if len(TextList) > 25:
+            raise _client_error('BatchSizeLimitExceededException', 'BatchDetectSentiment')
+        results, errors = [], []
+        for index, text in enumerate(TextList):
+            if len(text.encode('utf-8')) > 5000:
+                errors.append({'Index': index, 'ErrorCode': 'TextSizeLimitExceededException', 'ErrorMessage': 'Document too large'})
+            else:
+                result = _sentiment_result(text)
+                results.append({'Index': index, 'Sentiment': result['Sentiment'], 'SentimentScore': result['SentimentScore']})
+        return {'ResultList': results, 'ErrorList': errors}
+
+
+class LocalBedrock(_LocalService):
+    """
+    invoke_model no formato do Claude com o relatório de report_for(prompt). Se o pedido traz tools e
+    report_for devolve um dict, a resposta é um tool_use com esse dict como entrada; senão, texto.
+    No streaming, a mesma latência é dividida entre o primeiro token (first_token_fraction) e os deltas seguintes.
+    """
+
+    def __init__(self, report_for, latency=0.0, first_token_fraction=0.2, delta_chars=12):
+        super().__init__(latency)
+        self.report_for = report_for
+        self.first_token_fraction = first_token_fraction
+        self.delta_chars = delta_chars
+
+    def _content_block(self, body):
+        request = json.loads(body)
+        result = self.report_for(request['messages'][0]['content'][0]['text'])
+        if request.get('tools') and isinstance(result, dict):
+            return {'type': 'tool_use', 'id': f"toolu_{uuid.uuid4().hex[:12]}", 'name': request['tools'][0]['name'], 'input': result}
+        return {'type': 'text', 'text': result if isinstance(result, str) else json.dumps(result, ensure_ascii=False)}
+
+    def invoke_model(self, body, modelId, accept=None, contentType=None, **kwargs):
+        self._call('invoke_model')
+        block = self._content_block(body)
+        stop_reason = 'tool_use' if block['type'] == 'tool_use' else 'end_turn'
+        return {'body': _Body(json.dumps({'content': [block], 'stop_reason': stop_reason}).encode('utf-8'))}
+
+    def invoke_model_with_response_stream(self, body, modelId, accept=None, contentType=None, **kwargs):
+        with self._lock:
+            self.calls['invoke_model_with_response_stream'] += 1
+        block = self._content_block(body)
+        if block['type'] == 'tool_use':
+            text, delta_type, delta_key = json.dumps(block['input'], ensure_ascii=False), 'input_json_delta', 'partial_json'
+            start = dict(block, input={})
+        else:
+            text, delta_type, delta_key = block['text'], 'text_delta', 'text'
+            start = {'type': 'text', 'text': ''}
+        pieces = [text[i:i + self.delta_chars] for i in range(0, len(text), self.delta_chars)] or ['']
+        first_token = self.latency * self.first_token_fraction
+        per_delta = (self.latency - first_token) / len(pieces)
+
+        def event(payload):
+            return {'chunk': {'bytes': json.dumps(payload).encode('utf-8')}}
+
+        def events():
+            yield event({'type': 'message_start', 'message': {'role': 'assistant', 'content': []}})
+            time.sleep(first_token)
+            yield event({'type': 'content_block_start', 'index': 0, 'content_block': start})
+            for piece in pieces:
+                yield event({'type': 'content_block_delta', 'index': 0, 'delta': {'type': delta_type, delta_key: piece}})
+                time.sleep(per_delta)
+            yield event({'type': 'content_block_stop', 'index': 0})
+            yield event({'type': 'message_stop'})
+
+        return {'body': events()}
+
+
+class QuotaEnforcer:
+    """
+    Envolve um dublê e impõe uma cota como a da AWS: acima de tps chamadas no último segundo ou de
+    concurrency chamadas simultâneas, a operação falha com error_code sem executar. As recusas ficam em rejected.
+    """
+
+    def __init__(self, service, tps=None, concurrency=None, error_code='ThrottlingException'):
+        self.service = service
+        self.tps = tps
+        self.concurrency = concurrency
+        self.error_code = error_code
+        self.rejected = Counter()
+        self._recent = deque()
+        self._active = 0
+        self._lock = threading.Lock()
+
+    def __getattr__(self, name):
+        attr = getattr(self.service, name)
+        if name.startswith('_') or not callable(attr):
+            return attr
+
+        def guarded(*args, **kwargs):
+            with self._lock:
+                now = time.monotonic()
+                while self._recent and now - self._recent[0] >= 1:
+                    self._recent.popleft()
+                if (self.tps and len(self._recent) >= self.tps) or (self.concurrency and self._active >= self.concurrency):
+                    self.rejected[name] += 1
+                    raise _client_error(self.error_code, name)
+                self._recent.append(now)
+                self._active += 1
+            try:
+                return attr(*args, **kwargs)
+            finally:
+                with self._lock:
+                    self._active -= 1
+        return guarded
+
+
+class LocalQueue:
+    """
+    Fila SQS local. Recebe as notificações que o Rekognition (SNS) e o
+    Transcribe (EventBridge) publicariam e as entrega ao handler como evento SQS.
+    """
+
+    def __init__(self):
+        self._messages = deque()
+
+    def send_message(self, body):
+        self._messages.append(body if isinstance(body, str) else json.dumps(body))
+
+    def publish_rekognition_completion(self, job_id, status='SUCCEEDED'):
+        # Mesmo envelope que o SNS entrega a uma fila SQS sem raw delivery
+        message = {'JobId': job_id, 'Status': status, 'API': 'StartFaceDetection', 'Timestamp': int(time.time() * 1000)}
+        self.send_message({'Type': 'Notification', 'Message': json.dumps(message)})
+
+    def publish_transcribe_completion(self, job_name, status='COMPLETED'):
+        self.send_message({
+            'version': '0',
+            'source': 'aws.transcribe',
+            'detail-type': 'Transcribe Job State Change',
+            'detail': {'TranscriptionJobName': job_name, 'TranscriptionJobStatus': status}
+        })
+
+    def __len__(self):
+        return len(self._messages)
+
+    def receive_event(self, max_messages=10):
+        """Retira até max_messages mensagens no formato de evento SQS da Lambda."""
+        records = []
+        while self._messages and len(records) < max_messages:
+            records.append({'eventSource': 'aws:sqs', 'messageId': str(uuid.uuid4()), 'body': self._messages.popleft()})
+        return {'Records': records}
+
+    def drain(self, handler, context=None, max_messages=10):
+        """Entrega todas as mensagens pendentes ao handler e devolve as respostas."""
+        responses = []
+        while self._messages:
+            responses.append(handler(self.receive_event(max_messages), context))
+        return responses
@@ -0,0 +1,224 @@
+"""
+Gateway de progresso por Server-Sent Events.
+
+O orquestrador publica cada transição de status (o mesmo JSON gravado em status/{file_id}.json) com
+POST /publish/{file_id}; o frontend assina GET /events/{file_id} com EventSource e recebe as etapas na hora,
+sem consultar o S3. Serve tanto como stand-in local quanto como o gateway implantado (container/EC2 atrás de um ALB).
+
+Uso:
+    python progress_gateway.py --port 8080
+    PROGRESS_PUSH_URL=http://localhost:8080 python benchmark.py
+"""
+import argparse
+import json
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import unquote
+
+TERMINAL_STEPS = ("COMPLETED", "ERROR")
+
+
+class ProgressChannel:
+    """
+    Histórico das transições de um file_id; assinantes atrasados ou reconectando recebem o que perderam.
+    Os ids continuam crescendo quando um reenvio recomeça o histórico, então quem já recebeu ids antigos
+    passa direto para os eventos novos.
+    """
+
+    def __init__(self):
+        self.events = []
+        self.first_id = 1
+        self.finished_at = None
+        self.last_activity = time.time()
+        self.cond = threading.Condition()
+
+    @property
+    def last_id(self):
+        return self.first_id + len(self.events) - 1
+
+    def publish(self, payload):
+        with self.cond:
+            # Reenvio do mesmo arquivo depois de finalizado: começa um histórico novo
+            if self.finished_at and payload.get("step") == "INIT":
+                self.events, self.first_id, self.finished_at = [], self.last_id + 1, None
+            self.events.append(payload)
+            self.last_activity = time.time()
+            if payload.get("step") in TERMINAL_STEPS:
+                self.finished_at = time.time()
+            self.cond.notify_all()
+
+    def wait_after(self, event_id, timeout):
+        """Eventos com id > event_id; bloqueia até chegar algum ou o timeout vencer."""
+        with self.cond:
+            # Id que este canal nunca emitiu (o canal foi recriado): o histórico inteiro é reenviado
+            if event_id > self.last_id:
+                event_id = 0
+            if self.last_id <= event_id:
+                self.cond.wait(timeout)
+            # Um assinante esperando mantém o canal ativo
+            self.last_activity = time.time()
+            start = max(event_id + 1, self.first_id)
+            return [(i, self.events[i - self.first_id]) for i in range(start, self.last_id + 1)]
+
+
+class ProgressBroker:
+    """
+    Canais por file_id, criados só pelas publicações (um GET para um file_id desconhecido espera sem alocar nada).
+    Canais finalizados saem após retention_seconds; os que ficam sem publicações nem assinantes por
+    idle_seconds (job abandonado no meio) também.
+    """
+
+    def __init__(self, retention_seconds=600, idle_seconds=3600):
+        self.retention_seconds = retention_seconds
+        self.idle_seconds = idle_seconds
+        self._channels = {}
+        self._created = threading.Condition()
+
+    def publish(self, file_id, payload):
+        with self._created:
+            self._evict()
+            channel = self._channels.get(file_id)
+            if channel is None:
+                channel = self._channels[file_id] = ProgressChannel()
+                self._created.notify_all()
+        channel.publish(payload)
+
+    def subscribe(self, file_id, timeout):
+        """Canal do file_id, esperando até timeout pela primeira publicação; None se ela não chegar."""
+        deadline = time.time() + timeout
+        with self._created:
+            self._evict()
+            while file_id not in self._channels:
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    return None
+                self._created.wait(remaining)
+            return self._channels[file_id]
+
+    def __len__(self):
+        return len(self._channels)
+
+    def _evict(self):
+        now = time.time()
+        expired = [k for k, c in self._channels.items()
+                   if (c.finished_at and now - c.finished_at > self.retention_seconds) or now - c.last_activity > self.idle_seconds]
+        for file_id in expired:
+            del self._channels[file_id]
+
+
+class ProgressHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    broker = None
+    token = None
+    allow_origin = '*'
+    heartbeat_seconds = 15
+
+    def _file_id(self, prefix):
+        if not self.path.startswith(prefix):
+            return None
+        file_id = unquote(self.path[len(prefix):].split('?', 1)[0])
+        return file_id or None
+
+    def _reply(self, code, body=b''):
+        self.send_response(code)
+        self.send_header('Access-Control-Allow-Origin', self.allow_origin)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_OPTIONS(self):
+        self.send_response(204)
+        self.send_header('Access-Control-Allow-Origin', self.allow_origin)
+        self.send_header('Access-Control-Allow-Methods', 'GET, POST, OPTIONS')
+        self.send_header('Access-Control-Allow-Headers', 'Content-Type, Last-Event-ID')
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+    def do_POST(self):
+        file_id = self._file_id('/publish/')
+        if file_id is None:
+            return self._reply(404)
+        if self.token and self.headers.get('X-Progress-Token') != self.token:
+            return self._reply(403)
+        length = int(self.headers.get('Content-Length') or 0)
+        try:
+            payload = json.loads(self.rfile.read(length))
+        except ValueError:
+            return self._reply(400)
+        self.broker.publish(file_id, payload)
+        self._reply(204)
+
+    def do_GET(self):
+        file_id = self._file_id('/events/')
+        if file_id is None:
+            return self._reply(404)
+        # Na reconexão o EventSource envia o último id recebido: só o que faltou é reenviado
+        try:
+            last_id = max(0, int(self.headers.get('Last-Event-ID') or 0))
+        except ValueError:
+            last_id = 0
+
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Cache-Control', 'no-cache')
+        self.send_header('Connection', 'close')
+        self.send_header('Access-Control-Allow-Origin', self.allow_origin)
+        self.end_headers()
+        self.close_connection = True
+        try:
+            self.wfile.write(b'retry: 3000\n\n')
+            self.wfile.flush()
+            channel = None
+            while True:
+                # O assinante pode chegar antes da primeira publicação (INIT) do orquestrador
+                channel = channel or self.broker.subscribe(file_id, self.heartbeat_seconds)
+                events = channel.wait_after(last_id, self.heartbeat_seconds) if channel else []
+                if not events:
+                    self.wfile.write(b': keep-alive\n\n')
+                for event_id, payload in events:
+                    data = json.dumps(payload, ensure_ascii=False, separators=(',', ':'))
+                    self.wfile.write(f"id: {event_id}\ndata: {data}\n\n".encode('utf-8'))
+                    last_id = event_id
+                self.wfile.flush()
+                if events and events[-1][1].get("step") in TERMINAL_STEPS:
+                    return
+        except (BrokenPipeError, ConnectionResetError):
+            return
+
+    def log_message(self, format, *args):
+        pass
+
+
+def serve(host, port, token=None, allow_origin='*', retention_seconds=600, idle_seconds=3600):
+    handler = type('Handler', (ProgressHandler,), {
+        'broker': ProgressBroker(retention_seconds, idle_seconds), 'token': token, 'allow_origin': allow_origin,
+    })
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    return server
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Gateway SSE para o progresso do orquestrador.")
+    parser.add_argument('--host', default='0.0.0.0')
+    parser.add_argument('--port', type=int, default=int(os.environ.get('PORT', '8080')))
+    parser.add_argument('--token', default=os.environ.get('PROGRESS_PUSH_TOKEN'), help="Exige este valor no header X-Progress-Token das publicações")
+    parser.add_argument('--allow-origin', default=os.environ.get('PROGRESS_ALLOW_ORIGIN', '*'))
+    parser.add_argument('--retention-seconds', type=float, default=600, help="Tempo que um job finalizado continua disponível para reconexões")
+    parser.add_argument('--idle-seconds', type=float, default=3600, help="Descarta o canal de um job sem publicações nem assinantes por esse tempo")
+    args = parser.parse_args(argv)
+
+    server = serve(args.host, args.port, args.token, args.allow_origin, args.retention_seconds, args.idle_seconds)
+    print(f"Gateway de progresso em http://{args.host}:{args.port} (POST /publish/{{file_id}}, GET /events/{{file_id}})")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == '__main__':
+    main()
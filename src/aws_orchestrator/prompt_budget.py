@@ -0,0 +1,147 @@
+"""
+Prompt do relatório dentro de um orçamento de tokens: estatísticas, momentos representativos e transcrição compactada.
+"""
+import json
+import math
+import os
+from bisect import bisect_right
+
+from sentiment import SENTENCE_PATTERN
+from timeline import EMOTION_TYPES, RISK_EMOTIONS
+
+# Prompt do Bedrock: orçamento de tokens de entrada e quantidade de momentos representativos do vídeo
+PROMPT_TOKEN_BUDGET = int(os.environ.get('PROMPT_TOKEN_BUDGET', '6000'))
+PROMPT_MOMENTS = int(os.environ.get('PROMPT_MOMENTS', '12'))
+# Estimativa conservadora de caracteres por token para português no tokenizer do Claude
+PROMPT_CHARS_PER_TOKEN = 3.5
+
+def estimate_tokens(text):
+    return math.ceil(len(text) / PROMPT_CHARS_PER_TOKEN)
+
+def _section(title, value):
+    return f"\n    {title}: {json.dumps(value, ensure_ascii=False)}"
+
+def _spread(rows, count):
+    """count itens distribuídos uniformemente pela lista, para cobrir o vídeo inteiro e não só o início."""
+    if count >= len(rows):
+        return list(rows)
+    if count <= 1:
+        return rows[:count]
+    return [rows[round(i * (len(rows) - 1) / (count - 1))] for i in range(count)]
+
+def _fit_rows(title, rows, max_tokens):
+    """Maior seção (com linhas espalhadas) que cabe em max_tokens; busca binária na quantidade de linhas."""
+    lo, hi = 0, len(rows)
+    while lo < hi:
+        mid = (lo + hi + 1) // 2
+        if estimate_tokens(_section(title, _spread(rows, mid))) <= max_tokens:
+            lo = mid
+        else:
+            hi = mid - 1
+    return _section(title, _spread(rows, lo)) if lo else ""
+
+def _face_risk(face):
+    if face.get('Emotions'):
+        return sum(confidence for emotion, confidence in zip(EMOTION_TYPES, face['Emotions']) if emotion in RISK_EMOTIONS)
+    return face['Confidence'] if face['Emotion'] in RISK_EMOTIONS else 0.0
+
+def representative_moments(timeline, count=PROMPT_MOMENTS):
+    """Divide o vídeo em count faixas de tempo iguais e pega a detecção de maior risco de cada uma."""
+    if not timeline.faces or count <= 0:
+        return []
+    first, last = timeline.face_ms[0], timeline.face_ms[-1] + 1
+    moments = []
+    for i in range(count):
+        faces = timeline.faces_between(first + (last - first) * i // count, first + (last - first) * (i + 1) // count)
+        if faces:
+            face = max(faces, key=_face_risk)
+            moments.append({"t_s": round(face['Timestamp'] / 1000, 1), "emocao": face['Emotion'], "confianca": round(face['Confidence'], 1)})
+    return moments
+
+def compact_transcript(transcript, max_tokens, timeline=None):
+    """
+    Resumo extrativo para caber em max_tokens: ficam as frases dos segmentos mais negativos e as do início
+    e do fim (contexto), na ordem original, com [...] marcando os cortes.
+    """
+    if estimate_tokens(transcript) <= max_tokens:
+        return transcript
+    max_chars = int(max_tokens * PROMPT_CHARS_PER_TOKEN)
+    sentences = [(m.start(), m.end()) for m in SENTENCE_PATTERN.finditer(transcript) if m.group().strip()]
+    segments = timeline.segments if timeline is not None else []
+    segment_starts = [segment['Start'] for segment in segments]
+
+    def relevance(index):
+        i = bisect_right(segment_starts, sentences[index][0]) - 1
+        negative = segments[i].get('Scores', {}).get('Negative', 0.0) if i >= 0 else 0.0
+        return negative + (1.0 if index < 2 or index >= len(sentences) - 2 else 0.0)
+
+    chosen = []
+    used = 0
+    # Ordenação estável: em empate, as frases mais antigas entram primeiro
+    for index in sorted(range(len(sentences)), key=relevance, reverse=True):
+        length = sentences[index][1] - sentences[index][0] + len(" [...] ")
+        if used + length <= max_chars:
+            chosen.append(index)
+            used += length
+    if not chosen:
+        return transcript[:max_chars]
+
+    parts = []
+    previous = -1
+    for index in sorted(chosen):
+        if index != previous + 1:
+            parts.append("[...]")
+        parts.append(transcript[sentences[index][0]:sentences[index][1]].strip())
+        previous = index
+    if previous < len(sentences) - 1:
+        parts.append("[...]")
+    return " ".join(parts)
+
+def build_report_prompt(transcript, text_analysis, timeline, emotion_summary=None, chunk_summaries=None, budget=PROMPT_TOKEN_BUDGET):
+    """
+    Monta o prompt dentro de um orçamento de tokens. Instruções, sentimento geral e estatísticas de emoção
+    entram sempre; se o total passar do orçamento, cada lista (momentos, trechos, fala x expressões) fica com
+    até 1/5 do que sobrou e a transcrição é resumida no restante. Devolve o prompt e os tokens por seção.
+    """
+    header = """
+    VOCÊ É UM ASSISTENTE ESPECIALIZADO EM SAÚDE DA MULHER E SEGURANÇA.
+    Sua tarefa é analisar dados multimodais e justificar o nível de risco encontrado.
+"""
+    footer = """
+
+    REGISTRE O RELATÓRIO COM A FERRAMENTA registrar_relatorio, INFORMANDO:
+    1. SCORE DE RISCO (0-100) E NÍVEL (BAIXO até 30, ALTO a partir de 70, MÉDIO entre eles).
+    2. EVIDÊNCIAS QUE EMBASAM O SCORE, com a fonte (VIDEO, FALA ou SENTIMENTO) e o segundo do vídeo quando houver.
+    3. EVIDÊNCIAS VISUAIS: Explique quais tipos de expressões faciais ou momentos do vídeo embasam o score. Caso não haja expressões de risco explícitas, explique como a neutralidade ou estabilidade emocional contribui para a avaliação.
+    4. ANÁLISE DETALHADA E RECOMENDAÇÕES.
+    """
+    overall_sentiment = {k: v for k, v in (text_analysis or {}).items() if k != 'Segments'}
+    parts = {
+        "instrucoes": header + footer,
+        "estatisticas": _section("ESTATÍSTICAS DE EMOÇÃO (todas as detecções)", emotion_summary) if emotion_summary else "",
+        "sentimento": _section("SENTIMENTO", overall_sentiment),
+    }
+    lists = [
+        ("momentos", "MOMENTOS REPRESENTATIVOS (maior risco em cada faixa do vídeo)", representative_moments(timeline)),
+        ("trechos", "RESUMO POR TRECHO", chunk_summaries or []),
+        ("fala_x_expressoes", "FALA x EXPRESSÕES (emoções do rosto enquanto cada trecho era dito)", timeline.speech_emotions()),
+    ]
+    transcript = transcript or ""
+    full = {key: _section(title, rows) if rows else "" for key, title, rows in lists}
+    full["transcricao"] = f'\n    TRANSCRIÇÃO: "{transcript}"'
+    compacted = sum(estimate_tokens(v) for v in list(parts.values()) + list(full.values())) > budget
+
+    if not compacted:
+        parts.update(full)
+    else:
+        available = budget - sum(estimate_tokens(v) for v in parts.values())
+        for key, title, rows in lists:
+            parts[key] = _fit_rows(title, rows, available // 5)
+        remaining = available - sum(estimate_tokens(parts[key]) for key, _, _ in lists) - estimate_tokens('\n    TRANSCRIÇÃO: ""')
+        parts["transcricao"] = f'\n    TRANSCRIÇÃO: "{compact_transcript(transcript, max(0, remaining), timeline)}"'
+
+    prompt_text = (header + parts["estatisticas"] + parts["momentos"] + parts["trechos"] + parts["transcricao"]
+                   + parts["sentimento"] + parts["fala_x_expressoes"] + footer)
+    usage = {key: estimate_tokens(value) for key, value in parts.items()}
+    usage.update(total=estimate_tokens(prompt_text), orcamento=budget, compactado=compacted)
+    return prompt_text, usage
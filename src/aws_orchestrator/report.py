@@ -0,0 +1,219 @@
+"""
+Relatório de risco pelo Bedrock: contrato da ferramenta, geração em streaming (score e análise parcial
+antes do fim da resposta), validação com reparo e versão em texto.
+"""
+import json
+import logging
+import os
+import re
+import time
+
+from aws_clients import bedrock_runtime
+from limiter import LIMITERS
+from prompt_budget import build_report_prompt
+from timeline import MultimodalTimeline, clock
+from tracing import emit_metrics, span
+
+logger = logging.getLogger(__name__)
+
+# Bedrock: modelo, geração em streaming e intervalo mínimo entre publicações do relatório parcial no gateway de progresso
+BEDROCK_MODEL_ID = os.environ.get('BEDROCK_MODEL_ID', 'anthropic.claude-3-haiku-20240307-v1:0')
+BEDROCK_STREAMING = os.environ.get('BEDROCK_STREAMING', 'true').lower() == 'true'
+REPORT_STREAM_INTERVAL_SECONDS = float(os.environ.get('REPORT_STREAM_INTERVAL_SECONDS', '0.5'))
+
+# Contrato do relatório: o Bedrock responde chamando esta ferramenta em vez de texto livre.
+# O score vem primeiro para chegar cedo no streaming; a análise, mais longa, por último.
+RISK_LEVELS = ("BAIXO", "MÉDIO", "ALTO")
+EVIDENCE_SOURCES = ("VIDEO", "FALA", "SENTIMENTO")
+REPORT_TOOL = {
+    "name": "registrar_relatorio",
+    "description": "Registra o relatório de risco da análise multimodal.",
+    "input_schema": {
+        "type": "object",
+        "properties": {
+            "score": {"type": "integer", "minimum": 0, "maximum": 100, "description": "Score de risco de 0 a 100"},
+            "nivel": {"type": "string", "enum": list(RISK_LEVELS), "description": "BAIXO até 30, ALTO a partir de 70"},
+            "evidencias": {
+                "type": "array",
+                "items": {
+                    "type": "object",
+                    "properties": {
+                        "fonte": {"type": "string", "enum": list(EVIDENCE_SOURCES)},
+                        "momento_s": {"type": "number", "description": "Segundo do vídeo, quando a evidência tem um momento"},
+                        "descricao": {"type": "string"}
+                    },
+                    "required": ["fonte", "descricao"]
+                }
+            },
+            "recomendacoes": {"type": "array", "items": {"type": "string"}},
+            "analise": {"type": "string", "description": "Análise detalhada que justifica o score"}
+        },
+        "required": ["score", "nivel", "evidencias", "recomendacoes", "analise"]
+    }
+}
+
+REPORT_SCORE_PATTERN = re.compile(r'"score"\s*:\s*(\d+)\s*[,}]')
+REPORT_ANALYSIS_FIELD = re.compile(r'"analise"\s*:\s*"')
+TRUNCATED_ESCAPE_PATTERN = re.compile(r'\\(u[0-9a-fA-F]{0,3})?$')
+
+class ReportFormatError(Exception):
+    """Sinaliza que o relatório do Bedrock continuou fora do contrato mesmo após o reparo."""
+
+def generate_multimodal_report(video_data, transcript, text_analysis, critical_frames, chunk_summaries=None, timeline=None, emotion_summary=None, on_text=None, on_score=None):
+    """Relatório estruturado (score, nível, evidências, recomendações e análise), já validado."""
+    if timeline is None:
+        timeline = MultimodalTimeline(video_data, transcript, None, text_analysis)
+    prompt_text, usage = build_report_prompt(transcript, text_analysis, timeline, emotion_summary, chunk_summaries)
+    logger.info(f"PROMPT_TOKENS {json.dumps(usage)}")
+    messages = [{"role": "user", "content": [{"type": "text", "text": prompt_text}]}]
+    block = invoke_report(messages, usage, on_text, on_score)
+    report, errors = parse_report(block["input"])
+    if not errors:
+        return report
+
+    logger.warning(f"REPORT_INVALID {json.dumps(errors, ensure_ascii=False)}")
+    # Um único reparo: os problemas voltam ao modelo como resultado de erro da própria ferramenta
+    tool_use_id = block["id"] or "toolu_reparo"
+    messages += [
+        {"role": "assistant", "content": [{"type": "tool_use", "id": tool_use_id, "name": REPORT_TOOL["name"],
+                                           "input": block["input"] if isinstance(block["input"], dict) else {}}]},
+        {"role": "user", "content": [{"type": "tool_result", "tool_use_id": tool_use_id, "is_error": True,
+                                      "content": f"O relatório não segue o contrato: {'; '.join(errors)}. Chame {REPORT_TOOL['name']} novamente com todos os campos corrigidos."}]}
+    ]
+    block = invoke_report(messages, usage, on_text, on_score)
+    report, errors = parse_report(block["input"])
+    if errors:
+        raise ReportFormatError(f"Relatório do Bedrock fora do contrato: {'; '.join(errors)}")
+    return report
+
+def invoke_report(messages, usage, on_text=None, on_score=None):
+    """Chama o Bedrock forçando a ferramenta do relatório; devolve o id do tool_use e a entrada (None se não for JSON)."""
+    body = json.dumps({
+        "anthropic_version": "bedrock-2023-05-31",
+        "max_tokens": 2000,
+        "tools": [REPORT_TOOL],
+        "tool_choice": {"type": "tool", "name": REPORT_TOOL["name"]},
+        "messages": messages
+    })
+    if BEDROCK_STREAMING:
+        # Um throttle no meio do stream refaz a geração inteira (o texto parcial recomeça)
+        return LIMITERS['bedrock'].call(stream_report, body, usage, on_text, on_score)
+    with span("bedrock.invoke_model", prompt_bytes=len(body.encode('utf-8')), prompt_tokens=usage['total'], prompt_compacted=usage['compactado']) as attrs:
+        res = LIMITERS['bedrock'].call(bedrock_runtime.invoke_model, body=body, modelId=BEDROCK_MODEL_ID, accept="application/json", contentType="application/json")
+        content = json.loads(res.get('body').read()).get('content') or []
+        attrs['response_bytes'] = len(json.dumps(content, ensure_ascii=False).encode('utf-8'))
+    tool_use = next((item for item in content if item.get('type') == 'tool_use'), None)
+    if tool_use is None:
+        return {"id": None, "input": None}
+    return {"id": tool_use.get('id'), "input": tool_use.get('input')}
+
+def stream_report(body, usage, on_text=None, on_score=None):
+    """
+    Versão com invoke_model_with_response_stream. A análise parcial vai para on_text (no máximo a cada
+    REPORT_STREAM_INTERVAL_SECONDS) e o score para on_score assim que o campo fecha, antes do fim da resposta.
+    """
+    tool_use_id = None
+    raw = ""
+    score = None
+    first_token_ms = score_ms = None
+    last_push = 0.0
+    with span("bedrock.invoke_model_stream", prompt_bytes=len(body.encode('utf-8')), prompt_tokens=usage['total'], prompt_compacted=usage['compactado']) as attrs:
+        started_at = time.time()
+        res = bedrock_runtime.invoke_model_with_response_stream(body=body, modelId=BEDROCK_MODEL_ID, accept="application/json", contentType="application/json")
+        for event in res['body']:
+            chunk = json.loads(event['chunk']['bytes']) if 'chunk' in event else {}
+            if chunk.get('type') == 'content_block_start' and chunk['content_block'].get('type') == 'tool_use':
+                tool_use_id = chunk['content_block'].get('id')
+                continue
+            if chunk.get('type') != 'content_block_delta':
+                continue
+            delta = chunk['delta'].get('partial_json') or chunk['delta'].get('text') or ''
+            if first_token_ms is None:
+                first_token_ms = round((time.time() - started_at) * 1000, 1)
+            raw += delta
+            if score is None:
+                # Exige o fim do valor: "7" seguido de "5" no próximo delta não pode virar score 7
+                match = REPORT_SCORE_PATTERN.search(raw[-(len(delta) + 40):])
+                if match:
+                    score = int(match.group(1))
+                    score_ms = round((time.time() - started_at) * 1000, 1)
+                    if on_score and score <= 100:
+                        on_score(score)
+            if on_text and time.time() - last_push >= REPORT_STREAM_INTERVAL_SECONDS:
+                partial = _partial_json_string(raw, REPORT_ANALYSIS_FIELD)
+                if partial:
+                    on_text(partial)
+                    last_push = time.time()
+        total_ms = round((time.time() - started_at) * 1000, 1)
+        attrs.update(response_bytes=len(raw.encode('utf-8')), ttft_ms=first_token_ms, score_ms=score_ms)
+    emit_metrics("bedrock.invoke_model_stream", TimeToFirstToken=first_token_ms, TimeToScore=score_ms, StreamDuration=total_ms)
+    try:
+        tool_input = json.loads(raw) if tool_use_id else None
+    except ValueError:
+        tool_input = None
+    return {"id": tool_use_id, "input": tool_input}
+
+def _partial_json_string(raw, field_pattern):
+    """Valor, possivelmente ainda incompleto, do campo string (field_pattern casa '"campo": "') de um JSON em geração."""
+    match = field_pattern.search(raw)
+    if not match:
+        return None
+    value = raw[match.end() - 1:]
+    try:
+        return json.JSONDecoder().raw_decode(value)[0]
+    except ValueError:
+        # Ainda sem a aspa final: fecha a string depois de descartar um escape cortado no meio
+        value = TRUNCATED_ESCAPE_PATTERN.sub('', value)
+        try:
+            return json.loads(value + '"')
+        except ValueError:
+            return None
+
+def parse_report(data):
+    """
+    Valida a entrada da ferramenta contra REPORT_TOOL. Desvios baratos de corrigir (score como texto,
+    nível sem acento ou em minúsculas) são normalizados aqui; o resto volta como lista de problemas.
+    """
+    if not isinstance(data, dict):
+        return None, ["a resposta não chamou a ferramenta com um JSON completo (se foi cortada, seja mais conciso)"]
+    errors = []
+    report = dict(data)
+
+    score = report.get("score")
+    if isinstance(score, str) and score.strip().isdigit():
+        score = int(score.strip())
+    elif isinstance(score, float) and score.is_integer():
+        score = int(score)
+    if isinstance(score, bool) or not isinstance(score, int) or not 0 <= score <= 100:
+        errors.append("score deve ser um inteiro entre 0 e 100")
+    report["score"] = score
+
+    level = str(report.get("nivel") or "").strip().upper().replace("MEDIO", "MÉDIO")
+    if level not in RISK_LEVELS:
+        errors.append(f"nivel deve ser um de {', '.join(RISK_LEVELS)}")
+    report["nivel"] = level
+
+    evidence = report.get("evidencias")
+    if not isinstance(evidence, list) or not all(
+            isinstance(item, dict) and isinstance(item.get("descricao"), str) and item.get("fonte") in EVIDENCE_SOURCES
+            and (item.get("momento_s") is None or (isinstance(item["momento_s"], (int, float)) and not isinstance(item["momento_s"], bool)))
+            for item in evidence):
+        errors.append(f"evidencias deve ser uma lista de objetos com fonte ({', '.join(EVIDENCE_SOURCES)}), descricao e momento_s numérico opcional")
+
+    recommendations = report.get("recomendacoes")
+    if not isinstance(recommendations, list) or not all(isinstance(item, str) for item in recommendations):
+        errors.append("recomendacoes deve ser uma lista de textos")
+
+    if not isinstance(report.get("analise"), str) or not report["analise"].strip():
+        errors.append("analise deve ser um texto não vazio")
+    return report, errors
+
+def format_report(report):
+    """Versão em texto do relatório estruturado (campo report do JSON final, exibido no frontend)."""
+    lines = [f"Score de Risco: {report['score']}", f"Nível: {report['nivel']}", "", "EVIDÊNCIAS:"]
+    for item in report["evidencias"]:
+        moment = f" [{clock(item['momento_s'] * 1000)}]" if item.get("momento_s") is not None else ""
+        lines.append(f"- ({item['fonte']}){moment} {item['descricao']}")
+    lines += ["", "ANÁLISE:", report["analise"], "", "RECOMENDAÇÕES:"]
+    lines += [f"- {item}" for item in report["recomendacoes"]]
+    return "\n".join(lines)
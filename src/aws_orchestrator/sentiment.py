@@ -0,0 +1,84 @@
+"""
+Sentimento da transcrição pelo Comprehend, em segmentos de frases inteiras enviados em lotes paralelos.
+"""
+import logging
+import os
+import re
+from concurrent.futures import ThreadPoolExecutor
+
+from aws_clients import comprehend_client
+from limiter import LIMITERS
+from tracing import span, submit_with_context
+
+logger = logging.getLogger(__name__)
+
+SENTENCE_PATTERN = re.compile(r'[^.!?]+[.!?]*')
+WORD_PATTERN = re.compile(r'\S+')
+
+# Comprehend: frases agrupadas em segmentos de até COMPREHEND_SEGMENT_BYTES (o serviço aceita 5000 por documento),
+# enviados em lotes de 25 ao batch_detect_sentiment
+COMPREHEND_SEGMENT_BYTES = min(int(os.environ.get('COMPREHEND_SEGMENT_BYTES', '1000')), 5000)
+COMPREHEND_BATCH_SIZE = 25
+COMPREHEND_WORKERS = int(os.environ.get('COMPREHEND_WORKERS', '4'))
+
+class SentimentAnalysisError(Exception):
+    """Sinaliza que o Comprehend recusou todos os segmentos da transcrição."""
+
+def split_transcript(text, max_bytes=COMPREHEND_SEGMENT_BYTES):
+    """
+    Agrupa frases inteiras em segmentos de até max_bytes (UTF-8); uma frase maior que o limite é quebrada
+    entre palavras. Devolve pares (início, fim) em caracteres do texto original.
+    """
+    pieces = []
+    for sentence in SENTENCE_PATTERN.finditer(text):
+        start = sentence.start() + len(sentence.group()) - len(sentence.group().lstrip())
+        if start == sentence.end():
+            continue
+        if len(text[start:sentence.end()].encode('utf-8')) <= max_bytes:
+            pieces.append((start, sentence.end()))
+        else:
+            pieces += [(sentence.start() + word.start(), sentence.start() + word.end()) for word in WORD_PATTERN.finditer(sentence.group())]
+
+    segments = []
+    for start, end in pieces:
+        if segments and len(text[segments[-1][0]:end].encode('utf-8')) <= max_bytes:
+            segments[-1] = (segments[-1][0], end)
+        else:
+            segments.append((start, end))
+    return segments
+
+def _detect_sentiment_batch(text, batch):
+    with span("comprehend.batch_detect_sentiment", documents=len(batch)):
+        res = LIMITERS['comprehend'].call(comprehend_client.batch_detect_sentiment, TextList=[text[start:end] for start, end in batch], LanguageCode='pt')
+    segments = [{'Start': start, 'End': end} for start, end in batch]
+    for result in res['ResultList']:
+        segments[result['Index']].update(Sentiment=result['Sentiment'], Scores=result['SentimentScore'])
+    for error in res['ErrorList']:
+        logger.error(f"Comprehend falhou no segmento {batch[error['Index']]}: {error.get('ErrorCode')} {error.get('ErrorMessage', '')}")
+    return segments
+
+def analyze_text(text):
+    """
+    Sentimento da transcrição inteira, sem o limite de 5000 bytes do detect_sentiment: os segmentos vão em lotes
+    paralelos ao batch_detect_sentiment. O geral é a média dos scores ponderada pelo tamanho de cada segmento;
+    'Segments' traz o sentimento de cada trecho (offsets em caracteres da transcrição).
+    """
+    if not text: return {}
+    segments = split_transcript(text)
+    # Só espaços ou pontuação ("..."): nada a enviar ao Comprehend, mesmo resultado de uma transcrição vazia
+    if not segments: return {}
+    batches = [segments[i:i + COMPREHEND_BATCH_SIZE] for i in range(0, len(segments), COMPREHEND_BATCH_SIZE)]
+    with span("comprehend.analyze_text", bytes=len(text.encode('utf-8')), segments=len(segments), batches=len(batches)):
+        if len(batches) == 1:
+            results = [_detect_sentiment_batch(text, batches[0])]
+        else:
+            with ThreadPoolExecutor(max_workers=min(COMPREHEND_WORKERS, len(batches))) as executor:
+                results = [future.result() for future in [submit_with_context(executor, _detect_sentiment_batch, text, batch) for batch in batches]]
+
+    timeline = [segment for batch in results for segment in batch]
+    scored = [segment for segment in timeline if 'Scores' in segment]
+    if not scored:
+        raise SentimentAnalysisError(f"Comprehend não analisou nenhum dos {len(timeline)} segmentos da transcrição.")
+    total = sum(segment['End'] - segment['Start'] for segment in scored)
+    scores = {label: round(sum(segment['Scores'][label] * (segment['End'] - segment['Start']) for segment in scored) / total, 6) for label in scored[0]['Scores']}
+    return {'Sentiment': max(scores, key=scores.get).upper(), 'Scores': scores, 'Segments': timeline}
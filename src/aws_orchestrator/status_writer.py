@@ -0,0 +1,168 @@
+"""
+Status para o frontend: status/{file_id}.json no S3 (gravações coalescidas) e publicação no gateway de progresso.
+"""
+import json
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+from urllib.parse import quote
+
+from aws_clients import s3_client
+from tracing import span
+
+logger = logging.getLogger(__name__)
+
+# Status para o frontend: intervalo de coalescência das gravações (0 = gravação síncrona a cada etapa)
+STATUS_FLUSH_INTERVAL_SECONDS = float(os.environ.get('STATUS_FLUSH_INTERVAL_SECONDS', '1'))
+# Canal de progresso por push (progress_gateway.py): cada transição é publicada em {URL}/publish/{file_id}
+PROGRESS_PUSH_URL = os.environ.get('PROGRESS_PUSH_URL', '').rstrip('/')
+PROGRESS_PUSH_TOKEN = os.environ.get('PROGRESS_PUSH_TOKEN')
+PROGRESS_PUSH_TIMEOUT_SECONDS = float(os.environ.get('PROGRESS_PUSH_TIMEOUT_SECONDS', '2'))
+
+class StatusWriter:
+    """
+    Grava status/{file_id}.json fora do caminho crítico.
+    Transições próximas são coalescidas: só o estado mais recente (com um histórico compacto das etapas)
+    é enviado a cada STATUS_FLUSH_INTERVAL_SECONDS. Estados terminais (COMPLETED/ERROR) são gravados na hora.
+    """
+
+    TERMINAL_STEPS = ("COMPLETED", "ERROR")
+
+    def __init__(self, flush_interval):
+        self.flush_interval = flush_interval
+        self._pending = {}
+        self._history = {}
+        self._sequence = 0
+        self._written = {}
+        self._cond = threading.Condition()
+        self._write_lock = threading.Lock()
+        self._thread = None
+
+    def submit(self, bucket, file_id, status_data):
+        key = (bucket, file_id)
+        with self._cond:
+            history = self._history.setdefault(key, [])
+            # A mesma etapa publicada de novo atualiza o estado, mas não repete a entrada no histórico
+            if not history or history[-1][0] != status_data["step"]:
+                history.append([status_data["step"], round(status_data["timestamp"], 3)])
+            self._sequence += 1
+            self._pending[key] = (self._sequence, dict(status_data, history=list(history)))
+            terminal = status_data["step"] in self.TERMINAL_STEPS
+            if terminal:
+                self._history.pop(key, None)
+            elif self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="status-writer", daemon=True)
+                self._thread.start()
+            self._cond.notify()
+        # O frontend nunca pode perder o estado terminal
+        if terminal:
+            self.flush()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._pending:
+                    self._cond.wait()
+            # Janela de coalescência: transições dentro dela viram uma única escrita
+            time.sleep(self.flush_interval)
+            self.flush()
+
+    def flush(self):
+        """Grava de forma síncrona tudo o que está pendente (chamado também ao fim de cada invocação)."""
+        with self._cond:
+            pending, self._pending = self._pending, {}
+        with self._write_lock:
+            for key, (sequence, status_data) in pending.items():
+                # Uma escrita atrasada nunca sobrescreve um estado mais novo já gravado
+                if self._written.get(key, 0) > sequence:
+                    continue
+                _write_status(key[0], key[1], status_data)
+                self._written[key] = sequence
+
+STATUS_WRITER = StatusWriter(STATUS_FLUSH_INTERVAL_SECONDS)
+
+class ProgressPublisher:
+    """
+    Publica cada transição no gateway de progresso, sem coalescer e fora do caminho crítico.
+    Um único worker mantém a ordem das etapas; falhas só geram log (o status no S3 continua sendo a fonte de verdade).
+    """
+
+    def __init__(self, url, token=None, timeout=2):
+        self.url = url
+        self.token = token
+        self.timeout = timeout
+        self._executor = None
+        self._last_future = None
+        self._lock = threading.Lock()
+
+    def publish(self, file_id, status_data):
+        if not self.url:
+            return
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="progress-push")
+            self._last_future = self._executor.submit(self._post, file_id, status_data)
+
+    def _post(self, file_id, status_data):
+        import urllib.request
+        body = json.dumps(status_data, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+        headers = {'Content-Type': 'application/json'}
+        if self.token:
+            headers['X-Progress-Token'] = self.token
+        request = urllib.request.Request(f"{self.url}/publish/{quote(file_id, safe='')}", data=body, headers=headers, method='POST')
+        try:
+            with span("progress.publish", step=status_data["step"]):
+                with urllib.request.urlopen(request, timeout=self.timeout) as response:
+                    response.read()
+        except Exception as e:
+            logger.warning(f"Falha ao publicar progresso de {file_id}: {str(e)}")
+
+    def flush(self):
+        """Espera as publicações pendentes (a fila é ordenada, basta aguardar a última)."""
+        with self._lock:
+            future = self._last_future
+        if future is not None:
+            wait([future], timeout=self.timeout * 2)
+
+PROGRESS_PUBLISHER = ProgressPublisher(PROGRESS_PUSH_URL, PROGRESS_PUSH_TOKEN, PROGRESS_PUSH_TIMEOUT_SECONDS)
+
+def update_status(bucket, file_id, step, message, details=None):
+    """Registra o status para o frontend monitorar; a gravação no S3 é feita pelo STATUS_WRITER."""
+    status_data = _status_data(step, message, details)
+    PROGRESS_PUBLISHER.publish(file_id, status_data)
+    if STATUS_FLUSH_INTERVAL_SECONDS <= 0:
+        _write_status(bucket, file_id, status_data)
+    else:
+        STATUS_WRITER.submit(bucket, file_id, status_data)
+
+def publish_progress(file_id, step, message, details=None):
+    """
+    Progresso dentro de uma etapa (relatório parcial do streaming) só pelo gateway: o status no S3 guarda
+    as transições de etapa, sem uma gravação a cada trecho do texto.
+    """
+    PROGRESS_PUBLISHER.publish(file_id, _status_data(step, message, details))
+
+def _status_data(step, message, details):
+    return {
+        "step": step,
+        "message": message,
+        "timestamp": time.time(),
+        "details": details,
+        "status": "processing" if step != "COMPLETED" else "finished"
+    }
+
+def _write_status(bucket, file_id, status_data):
+    status_key = f"status/{file_id}.json"
+    try:
+        body = json.dumps(status_data, ensure_ascii=False, separators=(',', ':'))
+        with span("s3.put_status", step=status_data["step"], bytes=len(body.encode('utf-8'))):
+            s3_client.put_object(
+                Bucket=bucket,
+                Key=status_key,
+                Body=body,
+                ContentType='application/json'
+            )
+    except Exception as e:
+        logger.error(f"Erro ao atualizar status: {str(e)}")
@@ -0,0 +1,289 @@
+"""
+Linha do tempo multimodal (faces, palavras e sentimento no mesmo eixo) e resumo estatístico das emoções.
+"""
+import os
+from array import array
+from bisect import bisect_left, bisect_right
+
+from tracing import span
+
+# Resumo estatístico das emoções (NumPy): janela móvel em segundos e salto de risco (pontos percentuais) tratado como mudança
+EMOTION_WINDOW_SECONDS = int(os.environ.get('EMOTION_WINDOW_SECONDS', '5'))
+EMOTION_CHANGE_THRESHOLD = float(os.environ.get('EMOTION_CHANGE_THRESHOLD', '20'))
+
+# NumPy vem de uma layer e só é importado no primeiro resumo de emoções (ver _numpy)
+np = None
+_numpy_checked = False
+
+def _numpy():
+    global np, _numpy_checked
+    if not _numpy_checked:
+        try:
+            import numpy
+            np = numpy
+        except ImportError:
+            # Sem a layer, o resumo estatístico das emoções sai do caminho em Python puro
+            pass
+        _numpy_checked = True
+    return np
+
+# --- LINHA DO TEMPO MULTIMODAL ---
+
+EMOTION_TYPES = ('HAPPY', 'SAD', 'ANGRY', 'CONFUSED', 'DISGUSTED', 'SURPRISED', 'CALM', 'FEAR')
+
+class MultimodalTimeline:
+    """
+    Vídeo, fala e sentimento alinhados no mesmo eixo de tempo (ms), em arrays ordenados: faces (timestamp e
+    uma coluna de confiança por emoção), palavras (início/fim e posição no texto) e segmentos de sentimento
+    (início/fim vindos das palavras). Consultas por janela localizam a faixa com bisect, em O(log n).
+    """
+
+    def __init__(self, video_results, transcript="", words=None, text_analysis=None):
+        self.faces = sorted(video_results, key=lambda r: r['Timestamp'])
+        self.face_ms = array('q', (r['Timestamp'] for r in self.faces))
+        self.emotion_columns = {emotion: array('f', [0.0]) * len(self.faces) for emotion in EMOTION_TYPES}
+        for i, record in enumerate(self.faces):
+            # Com o vetor completo de emoções todas as colunas são preenchidas; senão (checkpoints antigos) só a dominante
+            vector = zip(EMOTION_TYPES, record['Emotions']) if record.get('Emotions') else [(record['Emotion'], record['Confidence'])]
+            for emotion, confidence in vector:
+                if emotion in self.emotion_columns:
+                    self.emotion_columns[emotion][i] = confidence
+
+        words = words or {}
+        self.transcript = transcript or ""
+        self.word_start_ms = array('q', words.get('start_ms', []))
+        self.word_end_ms = array('q', words.get('end_ms', []))
+        self.word_char = array('q', words.get('char', []))
+        self.word_char_end = array('q', words.get('char_end', []))
+
+        # Os segmentos do Comprehend vêm em offsets de caractere: as palavras dão o tempo de cada um
+        self.segments = []
+        for segment in (text_analysis or {}).get('Segments', []):
+            first = bisect_left(self.word_char, segment['Start'])
+            last = bisect_left(self.word_char, segment['End']) - 1
+            if first <= last:
+                self.segments.append(dict(segment, StartMs=self.word_start_ms[first], EndMs=self.word_end_ms[last]))
+        self.segment_start_ms = array('q', (segment['StartMs'] for segment in self.segments))
+
+    def _face_range(self, start_ms, end_ms):
+        return bisect_left(self.face_ms, start_ms), bisect_left(self.face_ms, end_ms)
+
+    def faces_between(self, start_ms, end_ms):
+        lo, hi = self._face_range(start_ms, end_ms)
+        return self.faces[lo:hi]
+
+    def emotion_profile(self, start_ms, end_ms):
+        """Confiança média de cada emoção em [start_ms, end_ms)."""
+        lo, hi = self._face_range(start_ms, end_ms)
+        if lo == hi:
+            return {}
+        return {emotion: round(sum(column[lo:hi]) / (hi - lo), 2) for emotion, column in self.emotion_columns.items()}
+
+    def text_between(self, start_ms, end_ms):
+        """Trecho da transcrição cujas palavras começam em [start_ms, end_ms)."""
+        lo, hi = bisect_left(self.word_start_ms, start_ms), bisect_left(self.word_start_ms, end_ms)
+        if lo == hi:
+            return ""
+        return self.transcript[self.word_char[lo]:self.word_char_end[hi - 1]]
+
+    def segment_at(self, ms):
+        """Segmento de sentimento que estava sendo falado no instante ms (ou None)."""
+        i = bisect_right(self.segment_start_ms, ms) - 1
+        if i >= 0 and ms <= self.segments[i]['EndMs']:
+            return self.segments[i]
+        return None
+
+    def speech_emotions(self, limit=None):
+        """Para cada segmento falado: o sentimento do texto e as emoções do rosto enquanto ele era dito."""
+        rows = []
+        for segment in self.segments[:limit]:
+            profile = self.emotion_profile(segment['StartMs'], segment['EndMs'] + 1)
+            rows.append({
+                "inicio_s": round(segment['StartMs'] / 1000, 1),
+                "fim_s": round(segment['EndMs'] / 1000, 1),
+                "sentimento": segment.get('Sentiment'),
+                "emocoes": dict(sorted(profile.items(), key=lambda item: item[1], reverse=True)[:3])
+            })
+        return rows
+
+# --- RESUMO ESTATÍSTICO DAS EMOÇÕES (NUMPY, COM ALTERNATIVA EM PYTHON PURO) ---
+
+RISK_EMOTIONS = ('FEAR', 'SAD', 'ANGRY', 'CONFUSED', 'DISGUSTED')
+
+def _emotion_rows(video_results):
+    """Vetor de 8 confianças de cada detecção, na ordem de EMOTION_TYPES."""
+    rows = []
+    for record in video_results:
+        if record.get('Emotions'):
+            rows.append(record['Emotions'])
+        else:
+            # Registros antigos só têm a emoção dominante
+            row = [0.0] * len(EMOTION_TYPES)
+            if record['Emotion'] in EMOTION_TYPES:
+                row[EMOTION_TYPES.index(record['Emotion'])] = record['Confidence']
+            rows.append(row)
+    return rows
+
+def emotion_matrix(video_results):
+    """Timestamps (n,) e matriz densa (n, 8) de confianças, com as colunas na ordem de EMOTION_TYPES."""
+    rows = _emotion_rows(video_results)
+    timestamps = np.fromiter((record['Timestamp'] for record in video_results), dtype=np.int64, count=len(video_results))
+    matrix = np.asarray(rows, dtype=np.float64).reshape(len(rows), len(EMOTION_TYPES))
+    order = np.argsort(timestamps, kind='stable')
+    return timestamps[order], matrix[order]
+
+def _emotion_dict(values):
+    return {emotion: round(float(value), 1) for emotion, value in zip(EMOTION_TYPES, values)}
+
+def summarize_emotions(video_results, window_seconds=EMOTION_WINDOW_SECONDS, change_threshold=EMOTION_CHANGE_THRESHOLD, top=3):
+    """
+    Reduz todas as detecções a um resumo compacto: médias e picos por emoção, proporção de risco, janelas
+    móveis de maior risco e pontos de mudança. Com NumPy, em passadas vetorizadas; sem a layer, as mesmas
+    contas em laços de Python puro. None sem faces.
+    """
+    if not video_results:
+        return None
+    with span("emotions.summarize", detections=len(video_results), numpy=_numpy() is not None):
+        aggregate = _aggregate_numpy if np is not None else _aggregate_python
+        return _emotion_summary(top=top, **aggregate(video_results, window_seconds, change_threshold))
+
+def _aggregate_numpy(video_results, window_seconds, change_threshold):
+    timestamps, matrix = emotion_matrix(video_results)
+    risk_columns = [EMOTION_TYPES.index(emotion) for emotion in RISK_EMOTIONS]
+    totals = matrix.sum(axis=1)
+    # Parcela (%) da massa emocional de cada detecção que está em emoções de risco
+    risk_share = np.divide(matrix[:, risk_columns].sum(axis=1) * 100, totals, out=np.zeros_like(totals), where=totals > 0)
+    dominant = matrix.argmax(axis=1)
+
+    # Máximos por segundo: reduceat a partir do primeiro índice de cada segundo (timestamps ordenados)
+    seconds = timestamps // 1000
+    starts = np.flatnonzero(np.r_[True, seconds[1:] != seconds[:-1]])
+    second_ts = seconds[starts]
+    per_second = np.maximum.reduceat(matrix, starts, axis=0)
+    per_second_risk = np.maximum.reduceat(risk_share, starts)
+
+    # Janela móvel sobre uma grade densa de segundos: trechos sem rosto não contam na média
+    first = second_ts[0]
+    span_seconds = int(second_ts[-1] - first + 1)
+    risk_grid = np.zeros(span_seconds)
+    present = np.zeros(span_seconds)
+    risk_grid[second_ts - first] = per_second_risk
+    present[second_ts - first] = 1
+    width = max(1, min(window_seconds, span_seconds))
+    kernel = np.ones(width)
+    window_sum = np.convolve(risk_grid, kernel, 'valid')
+    window_count = np.convolve(present, kernel, 'valid')
+    rolling = np.divide(window_sum, window_count, out=np.zeros_like(window_sum), where=window_count > 0)
+
+    # Mudança: risco médio de uma janela comparado ao da janela imediatamente anterior
+    jumps = rolling[width:] - rolling[:-width] if len(rolling) > width else np.zeros(0)
+    change_at = np.flatnonzero(np.abs(jumps) >= change_threshold)
+
+    return {
+        "detections": int(len(timestamps)),
+        "first": int(first),
+        "width": width,
+        "mean": matrix.mean(axis=0),
+        "per_second_mean": per_second.mean(axis=0),
+        "per_second_count": int(len(second_ts)),
+        "dominant_counts": np.bincount(dominant, minlength=len(EMOTION_TYPES)).tolist(),
+        "risk_mean": float(risk_share.mean()),
+        "seconds_in_risk": int((per_second_risk >= 50).sum()),
+        "dominant_switches": int(np.count_nonzero(np.diff(per_second.argmax(axis=1)))),
+        "rolling": rolling.tolist(),
+        "jumps": jumps.tolist(),
+        "change_at": change_at.tolist(),
+    }
+
+def _aggregate_python(video_results, window_seconds, change_threshold):
+    # Mesmas contas de _aggregate_numpy, detecção a detecção (runtime sem a layer do NumPy)
+    ordered = sorted(zip((int(record['Timestamp']) for record in video_results), _emotion_rows(video_results)), key=lambda item: item[0])
+    risk_columns = [EMOTION_TYPES.index(emotion) for emotion in RISK_EMOTIONS]
+    columns = range(len(EMOTION_TYPES))
+    sums = [0.0] * len(EMOTION_TYPES)
+    dominant_counts = [0] * len(EMOTION_TYPES)
+    risk_total = 0.0
+    per_second = []  # [segundo, máximos por emoção, risco máximo]
+    for timestamp, row in ordered:
+        total = sum(row)
+        risk = sum(row[c] for c in risk_columns) * 100 / total if total > 0 else 0.0
+        risk_total += risk
+        dominant_counts[max(columns, key=row.__getitem__)] += 1
+        for c in columns:
+            sums[c] += row[c]
+        second = timestamp // 1000
+        if per_second and per_second[-1][0] == second:
+            maxima = per_second[-1][1]
+            for c in columns:
+                maxima[c] = max(maxima[c], row[c])
+            per_second[-1][2] = max(per_second[-1][2], risk)
+        else:
+            per_second.append([second, list(row), risk])
+
+    first = per_second[0][0]
+    span_seconds = per_second[-1][0] - first + 1
+    risk_grid = [0.0] * span_seconds
+    present = [0] * span_seconds
+    for second, _, risk in per_second:
+        risk_grid[second - first] = risk
+        present[second - first] = 1
+    width = max(1, min(window_seconds, span_seconds))
+    rolling = []
+    for i in range(span_seconds - width + 1):
+        count = sum(present[i:i + width])
+        rolling.append(sum(risk_grid[i:i + width]) / count if count else 0.0)
+    jumps = [rolling[i + width] - rolling[i] for i in range(len(rolling) - width)]
+    dominant_per_second = [max(columns, key=maxima.__getitem__) for _, maxima, _ in per_second]
+
+    return {
+        "detections": len(ordered),
+        "first": first,
+        "width": width,
+        "mean": [total / len(ordered) for total in sums],
+        "per_second_mean": [sum(maxima[c] for _, maxima, _ in per_second) / len(per_second) for c in columns],
+        "per_second_count": len(per_second),
+        "dominant_counts": dominant_counts,
+        "risk_mean": risk_total / len(ordered),
+        "seconds_in_risk": sum(1 for _, _, risk in per_second if risk >= 50),
+        "dominant_switches": sum(1 for before, after in zip(dominant_per_second, dominant_per_second[1:]) if before != after),
+        "rolling": rolling,
+        "jumps": jumps,
+        "change_at": [i for i, jump in enumerate(jumps) if abs(jump) >= change_threshold],
+    }
+
+def _emotion_summary(top, detections, first, width, mean, per_second_mean, per_second_count, dominant_counts, risk_mean,
+                     seconds_in_risk, dominant_switches, rolling, jumps, change_at):
+    return {
+        "deteccoes": detections,
+        "segundos_com_rosto": per_second_count,
+        "media": _emotion_dict(mean),
+        "pico_por_segundo_medio": _emotion_dict(per_second_mean),
+        "predominancia": {EMOTION_TYPES[i]: round(count / detections, 3) for i, count in enumerate(dominant_counts) if count > 0},
+        "risco_medio_pct": round(risk_mean, 1),
+        "segundos_em_risco": seconds_in_risk,
+        "trocas_de_emocao_dominante": dominant_switches,
+        "janelas_de_maior_risco": [
+            {"inicio_s": first + i, "fim_s": first + i + width, "risco_pct": round(rolling[i], 1)}
+            for i in _non_overlapping_top(rolling, width, top)
+        ],
+        "mudancas_de_risco": [
+            {"t_s": first + i + width, "antes_pct": round(rolling[i], 1), "depois_pct": round(rolling[i + width], 1)}
+            for i in sorted(_non_overlapping_top([abs(jumps[i]) for i in change_at], width, top, change_at))
+        ]
+    }
+
+def _non_overlapping_top(values, width, count, positions=None):
+    """Índices dos maiores valores separados por pelo menos width (positions mapeia para o índice original)."""
+    positions = range(len(values)) if positions is None else positions
+    selected = []
+    # Em empates, vence o índice menor (a ordenação é estável)
+    for i in sorted(range(len(values)), key=values.__getitem__, reverse=True):
+        position = positions[i]
+        if all(abs(position - other) >= width for other in selected):
+            selected.append(position)
+            if len(selected) >= count:
+                break
+    return selected
+
+def clock(ms):
+    return f"{int(ms // 60000):02d}:{int(ms // 1000 % 60):02d}"
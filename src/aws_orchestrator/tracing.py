@@ -0,0 +1,155 @@
+"""
+Tracing do pipeline (spans e métricas EMF agrupados por file_id) e o contexto de execução que
+submit_with_context leva às threads dos pools: trace, span e plano do vídeo.
+"""
+import contextvars
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+# Tracing: spans em JSON no formato EMF (CloudWatch Embedded Metric Format) no stdout
+TRACE_ENABLED = os.environ.get('TRACE_ENABLED', 'true').lower() == 'true'
+TRACE_NAMESPACE = os.environ.get('TRACE_NAMESPACE', 'TechChallenge4/Orchestrator')
+# Diretório local onde a timeline de cada file_id é exportada (formato Chrome Trace, abre no Perfetto/speedscope)
+TRACE_EXPORT_DIR = os.environ.get('TRACE_EXPORT_DIR')
+
+_current_trace = contextvars.ContextVar('current_trace', default=None)
+_current_span = contextvars.ContextVar('current_span', default=None)
+# Plano de processamento do vídeo em andamento (chega às threads do pipeline via submit_with_context)
+_current_plan = contextvars.ContextVar('current_plan', default=None)
+
+class Trace:
+    """Spans de um file_id ao longo de uma invocação."""
+
+    def __init__(self, file_id):
+        self.file_id = file_id
+        self.trace_id = uuid.uuid4().hex
+        self.spans = []
+        self._lock = threading.Lock()
+
+    def add(self, record):
+        with self._lock:
+            self.spans.append(record)
+
+    def export(self, directory):
+        """Grava a timeline no formato Chrome Trace (eventos 'X'), uma linha por thread."""
+        events = [{
+            "name": record["Stage"],
+            "ph": "X",
+            "ts": int(record["start"] * 1e6),
+            "dur": int(record["Duration"] * 1000),
+            "pid": self.file_id,
+            "tid": record["thread"],
+            "args": {k: v for k, v in record.items() if k not in ("_aws", "Stage", "start", "Duration", "thread")}
+        } for record in self.spans]
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f"{self.file_id}_trace.json")
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, f, ensure_ascii=False)
+        return path
+
+@contextmanager
+def start_trace(file_id):
+    """Ativa um trace para o file_id; os spans abertos dentro dele (inclusive em threads via submit_with_context) são agrupados."""
+    trace = Trace(file_id)
+    token = _current_trace.set(trace)
+    try:
+        with span("pipeline"):
+            yield trace
+    finally:
+        _current_trace.reset(token)
+        if TRACE_EXPORT_DIR:
+            try:
+                trace.export(TRACE_EXPORT_DIR)
+            except Exception as e:
+                logger.error(f"Erro ao exportar trace: {str(e)}")
+
+@contextmanager
+def span(name, **attributes):
+    """
+    Mede um trecho do pipeline e emite uma linha EMF com duração, tentativas e tamanhos de payload.
+    O dicionário devolvido aceita atributos extras (ex.: span_attrs['bytes'] = len(body)).
+    """
+    if not TRACE_ENABLED:
+        yield attributes
+        return
+    trace = _current_trace.get()
+    parent = _current_span.get()
+    span_id = uuid.uuid4().hex[:16]
+    token = _current_span.set(span_id)
+    start = time.time()
+    status = "ok"
+    try:
+        yield attributes
+    except Exception:
+        status = "error"
+        raise
+    finally:
+        _current_span.reset(token)
+        duration_ms = round((time.time() - start) * 1000, 3)
+        record = {
+            "_aws": {
+                "Timestamp": int(start * 1000),
+                "CloudWatchMetrics": [{
+                    "Namespace": TRACE_NAMESPACE,
+                    "Dimensions": [["Stage"]],
+                    "Metrics": [{"Name": "Duration", "Unit": "Milliseconds"}]
+                }]
+            },
+            "Stage": name,
+            "Duration": duration_ms,
+            "status": status,
+            "file_id": trace.file_id if trace else None,
+            "trace_id": trace.trace_id if trace else None,
+            "span_id": span_id,
+            "parent_id": parent,
+            "start": start,
+            "thread": threading.current_thread().name,
+            **attributes
+        }
+        # print e não logger: o EMF exige a linha JSON pura, sem o prefixo do logger da Lambda
+        print(json.dumps(record, ensure_ascii=False, default=str))
+        if trace:
+            trace.add(record)
+
+def emit_metrics(stage, unit="Milliseconds", **values):
+    """Linha EMF com métricas avulsas além da Duration dos spans (ex.: tempo até o primeiro token, vazão do lote)."""
+    values = {name: value for name, value in values.items() if value is not None}
+    if not TRACE_ENABLED or not values:
+        return
+    trace = _current_trace.get()
+    print(json.dumps({
+        "_aws": {
+            "Timestamp": int(time.time() * 1000),
+            "CloudWatchMetrics": [{
+                "Namespace": TRACE_NAMESPACE,
+                "Dimensions": [["Stage"]],
+                "Metrics": [{"Name": name, "Unit": unit} for name in values]
+            }]
+        },
+        "Stage": stage,
+        "file_id": trace.file_id if trace else None,
+        "trace_id": trace.trace_id if trace else None,
+        **values
+    }))
+
+def submit_with_context(executor, fn, *args):
+    """executor.submit propagando o trace/span e o plano atuais para a thread do pool."""
+    return executor.submit(contextvars.copy_context().run, fn, *args)
+
+def current_plan():
+    return _current_plan.get() or {}
+
+@contextmanager
+def use_plan(plan):
+    token = _current_plan.set(plan)
+    try:
+        yield plan
+    finally:
+        _current_plan.reset(token)
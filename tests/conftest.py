@@ -0,0 +1,71 @@
+"""
+Testes com os dublês de local_stubs.py no lugar dos serviços AWS.
+O orquestrador lê a configuração no import, então o ambiente é fixado antes de importá-lo.
+"""
+import os
+import sys
+
+import pytest
+
+os.environ.setdefault('AWS_DEFAULT_REGION', 'us-east-1')
+os.environ['TRACE_ENABLED'] = 'false'
+os.environ['RESULT_CACHE_ENABLED'] = 'false'
+os.environ['PREFLIGHT_ENABLED'] = 'false'
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src', 'aws_orchestrator'))
+
+import aws_lambda_orchestrator as orchestrator  # noqa: E402
+import jobs  # noqa: E402
+import local_stubs  # noqa: E402
+from aws_clients import CLIENTS  # noqa: E402
+
+BUCKET = 'test-bucket'
+REPORT = {
+    "score": 80,
+    "nivel": "ALTO",
+    "evidencias": [{"fonte": "VIDEO", "momento_s": 1.0, "descricao": "medo"}],
+    "recomendacoes": ["acionar a rede de apoio"],
+    "analise": "Relatório de teste.",
+}
+
+
+class Services:
+    def __init__(self, tmp_path):
+        self.s3 = local_stubs.LocalS3()
+        self.rekognition = local_stubs.LocalRekognition(lambda bucket, key: local_stubs.synthetic_face_detections(4000, interval_ms=500))
+        self.transcribe = local_stubs.LocalTranscribe(lambda uri: local_stubs.synthetic_transcript(3), str(tmp_path))
+        self.comprehend = local_stubs.LocalComprehend()
+        self.bedrock = local_stubs.LocalBedrock(lambda prompt: dict(REPORT))
+
+    def upload(self, key, body):
+        self.s3.put_object(Bucket=BUCKET, Key=key, Body=body, ContentType='video/mp4')
+        return {'Records': [{'eventName': 'ObjectCreated:Put',
+                             's3': {'bucket': {'name': BUCKET}, 'object': {'key': key, 'size': len(body)}}}]}
+
+    def json(self, key):
+        import json
+        obj = self.s3.objects.get((BUCKET, key))
+        return json.loads(obj['Body']) if obj else None
+
+
+@pytest.fixture
+def services(monkeypatch, tmp_path):
+    stubs = Services(tmp_path)
+    # Os clientes dos módulos (s3_client, ...) delegam ao registro: trocar a entrada vale para todos
+    for service, client in (('s3', stubs.s3), ('rekognition', stubs.rekognition), ('transcribe', stubs.transcribe),
+                            ('comprehend', stubs.comprehend), ('bedrock-runtime', stubs.bedrock)):
+        monkeypatch.setitem(CLIENTS._clients, service, client)
+    monkeypatch.setattr(jobs, 'POLL_INITIAL_SECONDS', 0.01)
+    monkeypatch.setattr(jobs, 'POLL_MAX_SECONDS', 0.05)
+    # Sem FFmpeg nos testes: os frames críticos voltam sem extração
+    monkeypatch.setattr(orchestrator, 'extract_and_upload_frames', lambda bucket, key, file_id, frames: frames)
+    monkeypatch.setenv('PIPELINE_BUCKET', BUCKET)
+    return stubs
+
+
+@pytest.fixture
+def event_mode(services, monkeypatch):
+    """ORCHESTRATION_MODE=event: a Lambda encerra após iniciar os jobs e as conclusões chegam pela fila local."""
+    monkeypatch.setattr(orchestrator, 'ORCHESTRATION_MODE', 'event')
+    monkeypatch.setenv('REKOGNITION_SNS_TOPIC_ARN', 'arn:aws:sns:us-east-1:000000000000:rekognition')
+    monkeypatch.setenv('REKOGNITION_ROLE_ARN', 'arn:aws:iam::000000000000:role/rekognition')
+    return local_stubs.LocalQueue()
@@ -0,0 +1,40 @@
+import json
+
+from conftest import BUCKET, orchestrator
+
+
+def _sqs_uploads(services, *keys):
+    records = []
+    for key in keys:
+        upload = services.upload(key, b'video')
+        records.append({'eventSource': 'aws:sqs', 'messageId': f'msg-{key}', 'body': json.dumps(upload)})
+    return {'Records': records}
+
+
+def test_only_transient_failures_return_to_the_queue(services, monkeypatch):
+    rekognition, transcribe = services.rekognition, services.transcribe
+    get_face_detection, get_transcription_job = rekognition.get_face_detection, transcribe.get_transcription_job
+
+    def failed_for_v1(JobId, **kwargs):
+        if rekognition.jobs[JobId]['key'] == 'uploads/v1.mp4':
+            return {'JobStatus': 'FAILED', 'StatusMessage': 'Formato de vídeo não suportado'}
+        return get_face_detection(JobId, **kwargs)
+
+    def unavailable_for_v2(TranscriptionJobName, **kwargs):
+        if transcribe.jobs[TranscriptionJobName]['uri'].endswith('uploads/v2.mp4'):
+            raise RuntimeError('Transcribe indisponível')
+        return get_transcription_job(TranscriptionJobName, **kwargs)
+
+    monkeypatch.setattr(rekognition, 'get_face_detection', failed_for_v1)
+    monkeypatch.setattr(transcribe, 'get_transcription_job', unavailable_for_v2)
+
+    response = orchestrator.lambda_handler(_sqs_uploads(services, 'uploads/v1.mp4', 'uploads/v2.mp4', 'uploads/v3.mp4'), None)
+
+    assert response['statusCode'] == 207
+    statuses = {video['file_key']: video['statusCode'] for video in json.loads(response['body'])['videos']}
+    assert statuses == {'uploads/v1.mp4': 500, 'uploads/v2.mp4': 503, 'uploads/v3.mp4': 200}
+    # O job FAILED encerra o vídeo: devolvê-lo à fila só iniciaria outro job a cada entrega
+    assert response['batchItemFailures'] == [{'itemIdentifier': 'msg-uploads/v2.mp4'}]
+    assert services.json('status/v1.json')['step'] == 'ERROR'
+    assert services.json('status/v2.json')['step'] == 'RETRYING'
+    assert services.s3.objects[(BUCKET, 'reports/v3_report.json')]
@@ -0,0 +1,31 @@
+import checkpoint
+from conftest import orchestrator
+
+
+
+def test_new_content_under_the_same_name_starts_over(services):
+    assert orchestrator.lambda_handler(services.upload('uploads/v1.mp4', b'primeiro'), None)['statusCode'] == 200
+    first_jobs = dict(services.json('state/v1.json'))
+
+    # As saídas em state/v1/ pertencem ao conteúdo anterior e deixam de valer
+    assert orchestrator.lambda_handler(services.upload('uploads/v1.mp4', b'segundo'), None)['statusCode'] == 200
+    manifest = services.json('state/v1.json')
+    assert manifest['content_key'] != first_jobs['content_key']
+    assert manifest['rek_job_id'] != first_jobs['rek_job_id']
+    assert len(services.rekognition.jobs) == len(services.transcribe.jobs) == 2
+
+
+def test_completed_steps_are_not_recomputed(services):
+    computed = []
+
+    def analyze():
+        computed.append('TEXT_ANALYSIS')
+        return {"Sentiment": "NEUTRAL"}
+
+    store = checkpoint.PipelineCheckpoint.begin('test-bucket', 'v1', 'uploads/v1.mp4', 'etag')
+    assert store.stage('TEXT_ANALYSIS', analyze) == {"Sentiment": "NEUTRAL"}
+    assert store.stage('TEXT_ANALYSIS', analyze) == {"Sentiment": "NEUTRAL"}
+    # Nova invocação: o checkpoint é carregado de state/v1.json e a etapa continua salva
+    restored = checkpoint.PipelineCheckpoint.load('test-bucket', 'v1')
+    assert restored.stage('TEXT_ANALYSIS', analyze) == {"Sentiment": "NEUTRAL"}
+    assert computed == ['TEXT_ANALYSIS']
@@ -0,0 +1,61 @@
+import chunking
+import local_stubs
+from checkpoint import PipelineCheckpoint
+from conftest import BUCKET
+from jobs import transcript_words
+
+
+def _chunks(*bounds_ms):
+    return [{"index": index, "key": f"chunks/v1/part_{index:03d}.mp4", "offset_ms": start, "end_ms": end,
+             "rek_job_id": None, "trans_job_name": None}
+            for index, (start, end) in enumerate(bounds_ms)]
+
+
+def _chunk_result(seed):
+    transcript_json = local_stubs.synthetic_transcript(3, seed=seed)
+    return {"transcript": transcript_json['results']['transcripts'][0]['transcript'], "words": transcript_words(transcript_json)}
+
+
+def _word_rows(text, words):
+    """(palavra no texto, início, fim) de cada palavra das colunas de transcript_words."""
+    return [(text[char:char_end], start, end)
+            for char, char_end, start, end in zip(words['char'], words['char_end'], words['start_ms'], words['end_ms'])]
+
+
+def test_stitched_words_keep_their_time_and_position():
+    chunks = _chunks((0, 3000), (3000, 6000), (6000, 9000))
+    # O trecho do meio não tem fala: não entra no texto nem desloca as posições seguintes
+    results = [_chunk_result(0), {"transcript": "", "words": {}}, _chunk_result(2)]
+
+    transcript, words = chunking.stitch_transcripts(chunks, results)
+
+    assert transcript == results[0]['transcript'] + " " + results[2]['transcript']
+    expected = [(word, start + chunk['offset_ms'], end + chunk['offset_ms'])
+                for chunk, result in zip(chunks, results) if result['words']
+                for word, start, end in _word_rows(result['transcript'], result['words'])]
+    assert _word_rows(transcript, words) == expected
+    assert words['start_ms'] == sorted(words['start_ms'])
+
+
+def test_chunked_analysis_moves_faces_and_words_to_the_full_timeline(services, monkeypatch):
+    chunks = _chunks((0, 4000), (4000, 8000))
+    monkeypatch.setattr(services.transcribe, 'transcript_for', lambda uri: local_stubs.synthetic_transcript(3, seed=int(uri[-7:-4])))
+    for chunk in chunks:
+        services.s3.put_object(Bucket=BUCKET, Key=chunk['key'], Body=b'trecho')
+    checkpoint = PipelineCheckpoint.begin(BUCKET, 'v1', 'uploads/v1.mp4', 'etag')
+
+    faces, transcript, _ = chunking.run_chunked_analysis(BUCKET, 'v1', chunks, checkpoint=checkpoint)
+
+    # O Rekognition devolve tempos relativos a cada trecho (0-4000 ms nos dois)
+    per_chunk = [face['Timestamp'] for face in local_stubs.synthetic_face_detections(4000, interval_ms=500)]
+    assert [face['Timestamp'] for face in faces] == [t + chunk['offset_ms'] for chunk in chunks for t in per_chunk]
+
+    words = checkpoint.get('AUDIO_WORDS')
+    expected = []
+    for chunk in chunks:
+        result = _chunk_result(chunk['index'])
+        expected += [(word, start + chunk['offset_ms'], end + chunk['offset_ms'])
+                     for word, start, end in _word_rows(result['transcript'], result['words'])]
+    assert _word_rows(transcript, words) == expected
+    # Os trechos só servem aos jobs e saem do bucket depois do reduce
+    assert not any(key.startswith('chunks/') for _, key in services.s3.objects)
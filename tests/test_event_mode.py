@@ -0,0 +1,110 @@
+import json
+
+from conftest import orchestrator
+
+
+def _results(responses):
+    return sorted(result for response in responses for result in json.loads(response['body']))
+
+
+def _new_jobs(stub, seen):
+    jobs = [job for job in stub.jobs if job not in seen]
+    seen.update(jobs)
+    return jobs
+
+
+def test_reupload_of_same_name_in_event_mode(services, event_mode):
+    queue = event_mode
+    rek_seen, trans_seen = set(), set()
+
+    assert orchestrator.lambda_handler(services.upload('uploads/v1.mp4', b'primeiro'), None)['statusCode'] == 202
+    (first_rek,), (first_trans,) = _new_jobs(services.rekognition, rek_seen), _new_jobs(services.transcribe, trans_seen)
+    queue.publish_rekognition_completion(first_rek)
+    queue.publish_transcribe_completion(first_trans)
+    queue.drain(orchestrator.lambda_handler)
+    assert services.json('status/v1.json')['step'] == 'COMPLETED'
+
+    # Mesmo nome, outro conteúdo: novos jobs e nova execução
+    assert orchestrator.lambda_handler(services.upload('uploads/v1.mp4', b'segundo'), None)['statusCode'] == 202
+    (second_rek,), (second_trans,) = _new_jobs(services.rekognition, rek_seen), _new_jobs(services.transcribe, trans_seen)
+
+    # O vídeo novo terminou, o áudio não: os marcadores da execução anterior não podem retomar cedo
+    queue.publish_rekognition_completion(second_rek)
+    # Reentrega atrasada de um job da execução anterior
+    queue.publish_transcribe_completion(first_trans)
+    responses = queue.drain(orchestrator.lambda_handler)
+    assert _results(responses) == ['Stale', 'Waiting']
+    assert services.json('status/v1.json')['step'] != 'COMPLETED'
+
+    queue.publish_transcribe_completion(second_trans)
+    responses = queue.drain(orchestrator.lambda_handler)
+    assert _results(responses) == ['Success']
+    assert services.json('status/v1.json')['step'] == 'COMPLETED'
+    assert services.json('state/v1.json')['trans_job_name'] == second_trans
+
+
+def test_duplicate_completion_does_not_resume_twice(services, event_mode):
+    queue = event_mode
+    orchestrator.lambda_handler(services.upload('uploads/v2.mp4', b'video'), None)
+    rek_job, = services.rekognition.jobs
+    trans_job, = services.transcribe.jobs
+    queue.publish_rekognition_completion(rek_job)
+    queue.publish_transcribe_completion(trans_job)
+    queue.drain(orchestrator.lambda_handler)
+    queue.publish_transcribe_completion(trans_job)
+    responses = queue.drain(orchestrator.lambda_handler)
+    assert _results(responses) == ['AlreadyResumed']
+    assert services.bedrock.calls['invoke_model_with_response_stream'] == 1
+
+
+def test_malformed_message_does_not_block_the_batch(services, event_mode):
+    queue = event_mode
+    orchestrator.lambda_handler(services.upload('uploads/v3.mp4', b'video'), None)
+    rek_job, = services.rekognition.jobs
+    queue.send_message('{"JobId": ')
+    queue.send_message('[]')
+    queue.publish_rekognition_completion(rek_job)
+
+    response = orchestrator.lambda_handler(queue.receive_event(), None)
+    assert json.loads(response['body']) == ['Waiting']
+    assert response['batchItemFailures'] == []
+
+
+def test_transient_failure_returns_only_its_message(services, event_mode, monkeypatch):
+    queue = event_mode
+    orchestrator.lambda_handler(services.upload('uploads/v4.mp4', b'video'), None)
+    rek_job, = services.rekognition.jobs
+    trans_job, = services.transcribe.jobs
+
+    def unavailable(**kwargs):
+        raise Exception('bedrock indisponível')
+    with monkeypatch.context() as patch:
+        patch.setattr(services.bedrock, 'invoke_model_with_response_stream', unavailable)
+        queue.publish_rekognition_completion(rek_job)
+        queue.publish_transcribe_completion(trans_job)
+        event = queue.receive_event()
+        response = orchestrator.lambda_handler(event, None)
+    assert json.loads(response['body']) == ['Waiting', 'Retry']
+    assert response['batchItemFailures'] == [{'itemIdentifier': event['Records'][1]['messageId']}]
+    assert services.json('status/v4.json')['step'] == 'RETRYING'
+
+    # O SQS reentrega só a mensagem que falhou, e ela retoma o pipeline
+    response = orchestrator.lambda_handler({'Records': [event['Records'][1]]}, None)
+    assert json.loads(response['body']) == ['Success']
+    assert services.json('status/v4.json')['step'] == 'COMPLETED'
+
+
+def test_completion_after_a_failed_job_keeps_the_error(services, event_mode):
+    queue = event_mode
+    orchestrator.lambda_handler(services.upload('uploads/v5.mp4', b'video'), None)
+    rek_job, = services.rekognition.jobs
+    trans_job, = services.transcribe.jobs
+    queue.publish_rekognition_completion(rek_job, status='FAILED')
+    assert _results(queue.drain(orchestrator.lambda_handler)) == ['Error']
+    assert services.json('status/v5.json')['step'] == 'ERROR'
+
+    # O Transcribe termina depois: nada de AUDIO_DONE por cima do ERROR, nem retomada
+    queue.publish_transcribe_completion(trans_job)
+    assert _results(queue.drain(orchestrator.lambda_handler)) == ['AlreadyFailed']
+    assert services.json('status/v5.json')['step'] == 'ERROR'
+    assert services.bedrock.calls['invoke_model_with_response_stream'] == 0
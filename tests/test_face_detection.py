@@ -0,0 +1,38 @@
+import jobs
+import local_stubs
+
+# 20 detecções (uma a cada 500 ms) e um rosto sem emoções no meio, que não vira registro
+DETECTIONS = list(local_stubs.synthetic_face_detections(10000, interval_ms=500))
+DETECTIONS.insert(7, {'Timestamp': 3250, 'Face': {'Confidence': 99.0, 'Emotions': []}})
+
+
+def _job(services):
+    services.rekognition.faces_for = lambda bucket, key: DETECTIONS
+    return services.rekognition.start_face_detection(Video={'S3Object': {'Bucket': 'b', 'Name': 'uploads/v1.mp4'}})['JobId']
+
+
+def test_every_page_is_read_and_each_face_yielded_once(services):
+    job_id = _job(services)
+
+    records = list(jobs.iter_face_detections(job_id, max_results=3))
+
+    # 21 detecções em páginas de 3: 7 chamadas seguindo o NextToken
+    assert services.rekognition.calls['get_face_detection'] == 7
+    assert records == [jobs.compact_face(face) for face in DETECTIONS if face['Face']['Emotions']]
+    assert len({record['Timestamp'] for record in records}) == 20
+    assert set(records[0]) == {'Timestamp', 'Emotion', 'Confidence', 'Emotions'}
+
+
+def test_pages_are_fetched_as_the_records_are_consumed(services):
+    job_id = _job(services)
+    # A primeira página vem do polling do job e não é buscada de novo
+    first_page = services.rekognition.get_face_detection(JobId=job_id, MaxResults=3)
+
+    records = jobs.iter_face_detections(job_id, max_results=3, first_page=first_page)
+    assert [next(records) for _ in range(3)] == [jobs.compact_face(face) for face in DETECTIONS[:3]]
+    assert services.rekognition.calls['get_face_detection'] == 1
+
+    next(records)
+    assert services.rekognition.calls['get_face_detection'] == 2
+    assert len(list(records)) == 16
+    assert services.rekognition.calls['get_face_detection'] == 7
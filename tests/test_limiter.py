@@ -0,0 +1,61 @@
+import pytest
+from botocore.exceptions import ClientError, EndpointConnectionError
+
+import aws_clients
+import limiter
+
+
+def _error(code, status):
+    return ClientError({'Error': {'Code': code, 'Message': code}, 'ResponseMetadata': {'HTTPStatusCode': status}}, 'Operation')
+
+
+class Flaky:
+    def __init__(self, *errors):
+        self.errors = list(errors)
+        self.calls = 0
+
+    def __call__(self):
+        self.calls += 1
+        if self.errors:
+            raise self.errors.pop(0)
+        return 'ok'
+
+
+@pytest.fixture
+def service_limiter(monkeypatch):
+    monkeypatch.setattr(limiter, 'THROTTLE_BASE_SECONDS', 0.001)
+    return limiter.ServiceLimiter('teste', tps=1000, concurrency=2, max_attempts=4)
+
+
+def test_throttle_is_retried_and_drains_the_bucket(service_limiter):
+    call = Flaky(_error('ThrottlingException', 400), _error('ThrottlingException', 400))
+    assert service_limiter.call(call) == 'ok'
+    assert call.calls == 3
+    assert service_limiter.stats['throttled'] == 2
+
+
+def test_server_and_connection_errors_are_retried(service_limiter):
+    call = Flaky(_error('InternalServerError', 500), EndpointConnectionError(endpoint_url='https://rekognition'))
+    assert service_limiter.call(call) == 'ok'
+    assert call.calls == 3
+    assert service_limiter.stats['throttled'] == 0
+
+
+def test_client_errors_are_not_retried(service_limiter):
+    call = Flaky(_error('InvalidParameterException', 400))
+    with pytest.raises(ClientError):
+        service_limiter.call(call)
+    assert call.calls == 1
+
+
+def test_gives_up_after_max_attempts(service_limiter):
+    call = Flaky(*[_error('ThrottlingException', 400)] * 5)
+    with pytest.raises(ClientError):
+        service_limiter.call(call)
+    assert call.calls == 4
+
+
+def test_limited_clients_do_not_retry_on_their_own():
+    registry = aws_clients.ClientRegistry({})
+    assert registry.get('comprehend').meta.config.retries['total_max_attempts'] == 1
+    assert registry.get('s3').meta.config.retries.get('total_max_attempts') != 1
@@ -0,0 +1,140 @@
+import pytest
+
+from conftest import orchestrator
+
+# Saídas capturadas do ffprobe (-print_format json -show_format -show_streams) e do cabeçalho do FFmpeg (-i)
+PHONE_PROBE = {
+    "streams": [
+        {"codec_type": "video", "codec_name": "h264", "width": 1920, "height": 1080, "avg_frame_rate": "30/1",
+         "disposition": {"attached_pic": 0}, "side_data_list": [{"side_data_type": "Display Matrix", "rotation": -90}]},
+        {"codec_type": "audio", "codec_name": "aac", "sample_rate": "44100", "channel_layout": "stereo"},
+    ],
+    "format": {"format_name": "mov,mp4,m4a,3gp,3g2,mj2", "duration": "2.000000"},
+}
+PHONE_BANNER = """\
+Input #0, mov,mp4,m4a,3gp,3g2,mj2, from 'phone.mp4':
+  Metadata:
+    major_brand     : isom
+  Duration: 00:00:02.00, start: 0.000000, bitrate: 321 kb/s
+  Stream #0:0[0x1](und): Video: h264 (High) (avc1 / 0x31637661), yuv420p(progressive), 1920x1080 [SAR 1:1 DAR 16:9], 178 kb/s, 30 fps, 30 tbr, 15360 tbn (default)
+      Metadata:
+        handler_name    : VideoHandler
+      Side data:
+        displaymatrix: rotation of 90.00 degrees
+  Stream #0:1[0x2](und): Audio: aac (LC) (mp4a / 0x6134706D), 44100 Hz, stereo, fltp, 127 kb/s (default)
+At least one output file must be specified
+"""
+SCREEN_PROBE = {
+    "streams": [{"codec_type": "video", "codec_name": "vp9", "width": 2560, "height": 1440, "avg_frame_rate": "25/1"}],
+    "format": {"format_name": "matroska,webm", "duration": "61.500000"},
+}
+SCREEN_BANNER = """\
+Input #0, matroska,webm, from 'screen.webm':
+  Duration: 00:01:01.50, start: 0.000000, bitrate: 900 kb/s
+  Stream #0:0: Video: vp9 (Profile 0), yuv420p(tv, progressive), 2560x1440, SAR 1:1 DAR 16:9, 25 fps, 25 tbr, 1k tbn (default)
+At least one output file must be specified
+"""
+# A capa do MP3 aparece como stream de vídeo (attached pic) e não conta como vídeo
+VOICE_PROBE = {
+    "streams": [
+        {"codec_type": "audio", "codec_name": "mp3", "sample_rate": "16000", "channel_layout": "mono"},
+        {"codec_type": "video", "codec_name": "mjpeg", "width": 600, "height": 600, "disposition": {"attached_pic": 1}},
+    ],
+    "format": {"format_name": "mp3", "duration": "3.100000"},
+}
+VOICE_BANNER = """\
+Input #0, mp3, from 'voice.mp3':
+  Metadata:
+    encoder         : Lavf61.1.100
+  Duration: 00:00:03.10, start: 0.069063, bitrate: 24 kb/s
+  Stream #0:0: Audio: mp3 (mp3float), 16000 Hz, mono, fltp, 24 kb/s
+  Stream #0:1: Video: mjpeg (Baseline), yuvj420p(pc, bt470bg/unknown/unknown), 600x600 [SAR 1:1 DAR 1:1], 90k tbr, 90k tbn (attached pic)
+At least one output file must be specified
+"""
+
+PHONE = {"duration_s": 2.0, "format": "mov,mp4,m4a,3gp,3g2,mj2",
+         "video": {"codec": "h264", "width": 1080, "height": 1920, "fps": 30.0},
+         "audio": {"codec": "aac", "sample_rate": 44100, "channel_layout": "stereo"}}
+SCREEN = {"duration_s": 61.5, "format": "matroska,webm",
+          "video": {"codec": "vp9", "width": 2560, "height": 1440, "fps": 25.0}, "audio": None}
+VOICE = {"duration_s": 3.1, "format": "mp3", "video": None,
+         "audio": {"codec": "mp3", "sample_rate": 16000, "channel_layout": "mono"}}
+
+MEDIA_CASES = [
+    pytest.param(PHONE_PROBE, PHONE_BANNER, PHONE, id="celular-em-pe"),
+    pytest.param(SCREEN_PROBE, SCREEN_BANNER, SCREEN, id="video-sem-audio"),
+    pytest.param(VOICE_PROBE, VOICE_BANNER, VOICE, id="audio-com-capa"),
+    pytest.param({}, "Invalid data found when processing input\n", {}, id="ilegivel"),
+]
+
+
+@pytest.mark.parametrize('probe, banner, expected', MEDIA_CASES)
+def test_media_from_ffprobe(probe, banner, expected):
+    assert orchestrator.media_from_ffprobe(probe) == expected
+
+
+@pytest.mark.parametrize('probe, banner, expected', MEDIA_CASES)
+def test_media_from_ffmpeg_banner(probe, banner, expected):
+    assert orchestrator.media_from_ffmpeg_banner(banner) == expected
+
+
+def _media(duration_s, video=True, audio=True, width=1280, height=720):
+    return {"duration_s": duration_s, "format": "mov,mp4,m4a,3gp,3g2,mj2",
+            "video": {"codec": "h264", "width": width, "height": height, "fps": 30.0} if video else None,
+            "audio": {"codec": "aac", "sample_rate": 44100, "channel_layout": "stereo"} if audio else None}
+
+
+@pytest.mark.parametrize('media, mode, expected', [
+    pytest.param(None, 'concurrent', {"audio": True, "video": True, "chunk_seconds": None}, id="sem-sondagem"),
+    pytest.param(VOICE, 'concurrent', {"audio": True, "video": False, "chunk_seconds": None,
+                                       "expected_job_seconds": 21.6, "poll_initial_seconds": 2.16}, id="so-audio"),
+    pytest.param(SCREEN, 'concurrent', {"audio": False, "video": True, "chunk_seconds": None, "frame_width": 1280,
+                                        "expected_job_seconds": 50.8, "poll_initial_seconds": 5.08}, id="sem-audio-largo"),
+    # Em pé, a largura exibida (1080) já cabe em FRAME_MAX_WIDTH
+    pytest.param(PHONE, 'concurrent', {"audio": True, "video": True, "chunk_seconds": None,
+                                       "expected_job_seconds": 21.0, "poll_initial_seconds": 2.1}, id="celular-em-pe"),
+    pytest.param(_media(1), 'concurrent', {"audio": True, "video": True, "chunk_seconds": None,
+                                           "expected_job_seconds": 20.5, "poll_initial_seconds": 2.05}, id="curto"),
+    # 25 min em trechos de até 10 min: 3 trechos iguais, e o polling segue a duração de um trecho
+    pytest.param(_media(1500), 'concurrent', {"audio": True, "video": True, "chunk_seconds": 500.0,
+                                              "expected_job_seconds": 270.0, "poll_initial_seconds": 20}, id="longo-em-trechos"),
+    pytest.param(_media(600), 'concurrent', {"audio": True, "video": True, "chunk_seconds": None,
+                                             "expected_job_seconds": 320.0, "poll_initial_seconds": 20}, id="abaixo-do-minimo"),
+    pytest.param(_media(1500), 'event', {"audio": True, "video": True, "chunk_seconds": None,
+                                         "expected_job_seconds": 770.0, "poll_initial_seconds": 20}, id="modo-event"),
+    pytest.param(_media(1500, video=False), 'concurrent', {"audio": True, "video": False, "chunk_seconds": None,
+                                                           "expected_job_seconds": 770.0, "poll_initial_seconds": 20},
+                 id="audio-longo"),
+])
+def test_build_processing_plan(monkeypatch, media, mode, expected):
+    for name, value in (('ORCHESTRATION_MODE', mode), ('CHUNK_SECONDS', 600.0), ('CHUNK_MIN_DURATION_SECONDS', 900.0),
+                        ('FRAME_WIDTH', 0), ('FRAME_MAX_WIDTH', 1280), ('POLL_INITIAL_SECONDS', 1.0), ('POLL_MAX_SECONDS', 20.0),
+                        ('EXPECTED_JOB_BASE_SECONDS', 20.0), ('EXPECTED_JOB_SECONDS_PER_MEDIA_MINUTE', 30.0)):
+        monkeypatch.setattr(orchestrator, name, value)
+
+    assert orchestrator.build_processing_plan(media) == expected
+
+
+@pytest.fixture
+def preflight(services, monkeypatch):
+    """Pré-voo ligado, com a sondagem devolvendo a mídia escolhida pelo teste."""
+    probed = {}
+    monkeypatch.setattr(orchestrator, 'PREFLIGHT_ENABLED', True)
+    monkeypatch.setattr(orchestrator, 'POLL_MAX_SECONDS', 0.05)
+    monkeypatch.setattr(orchestrator, 'probe_media', lambda video_input: probed['media'])
+    return probed
+
+
+@pytest.mark.parametrize('media, rekognition_jobs, transcribe_jobs', [
+    pytest.param(VOICE, 0, 1, id="so-audio-sem-rekognition"),
+    pytest.param(SCREEN, 1, 0, id="sem-audio-sem-transcribe"),
+])
+def test_plan_skips_the_missing_track(services, preflight, media, rekognition_jobs, transcribe_jobs):
+    preflight['media'] = media
+
+    response = orchestrator.lambda_handler(services.upload('uploads/v1.mp4', b'video'), None)
+
+    assert response['statusCode'] == 200
+    assert services.rekognition.calls['start_face_detection'] == rekognition_jobs
+    assert services.transcribe.calls['start_transcription_job'] == transcribe_jobs
+    assert services.json('status/v1.json')['step'] == 'COMPLETED'
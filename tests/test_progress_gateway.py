@@ -0,0 +1,43 @@
+import threading
+
+import progress_gateway
+
+
+def test_subscribing_does_not_create_channels():
+    broker = progress_gateway.ProgressBroker()
+    assert broker.subscribe('desconhecido', timeout=0.01) is None
+    assert len(broker) == 0
+
+
+def test_subscriber_waits_for_the_first_publish():
+    broker = progress_gateway.ProgressBroker()
+    threading.Timer(0.05, broker.publish, ('v1', {"step": "INIT"})).start()
+    channel = broker.subscribe('v1', timeout=2)
+    assert channel.wait_after(0, timeout=0) == [(1, {"step": "INIT"})]
+
+
+def test_idle_channels_are_evicted(monkeypatch):
+    broker = progress_gateway.ProgressBroker(retention_seconds=600, idle_seconds=60)
+    broker.publish('abandonado', {"step": "VIDEO_WAIT"})
+    broker.publish('finalizado', {"step": "COMPLETED"})
+    now = progress_gateway.time.time()
+
+    monkeypatch.setattr(progress_gateway.time, 'time', lambda: now + 120)
+    broker.publish('ativo', {"step": "INIT"})
+    assert broker.subscribe('abandonado', timeout=0) is None
+    assert broker.subscribe('finalizado', timeout=0) is None
+    assert broker.subscribe('ativo', timeout=0) is not None
+
+
+def test_reupload_continues_the_event_ids():
+    broker = progress_gateway.ProgressBroker()
+    for step in ("INIT", "FUSION", "COMPLETED"):
+        broker.publish('v1', {"step": step})
+    channel = broker.subscribe('v1', timeout=0)
+    last_id = channel.wait_after(0, timeout=0)[-1][0]
+
+    # Assinante conectado antes do reenvio recebe o INIT novo em vez de esperar o id 4 do histórico antigo
+    threading.Timer(0.05, broker.publish, ('v1', {"step": "INIT"})).start()
+    assert channel.wait_after(last_id, timeout=2) == [(4, {"step": "INIT"})]
+    # Reconexão com um id que o canal nunca emitiu (gateway reiniciado) recebe o histórico atual
+    assert channel.wait_after(99, timeout=0) == [(4, {"step": "INIT"})]
@@ -0,0 +1,52 @@
+import json
+
+import local_stubs
+import prompt_budget
+from jobs import compact_face, transcript_words
+from sentiment import SENTENCE_PATTERN
+from timeline import MultimodalTimeline
+
+
+def _video(duration_seconds, negative_sentence=None):
+    """Transcrição, análise por frase (uma só bem negativa) e linha do tempo de um vídeo sintético."""
+    transcript_json = local_stubs.synthetic_transcript(duration_seconds, seed=1)
+    transcript = transcript_json['results']['transcripts'][0]['transcript']
+    sentences = [m.span() for m in SENTENCE_PATTERN.finditer(transcript) if m.group().strip()]
+    segments = [{"Start": start, "End": end, "Sentiment": "NEUTRAL",
+                 "Scores": {"Positive": 0.1, "Negative": 0.9 if index == negative_sentence else 0.1, "Neutral": 0.8, "Mixed": 0.0}}
+                for index, (start, end) in enumerate(sentences)]
+    text_analysis = {"Sentiment": "NEUTRAL", "Scores": {"Positive": 0.1, "Negative": 0.1, "Neutral": 0.8, "Mixed": 0.0}, "Segments": segments}
+    faces = [compact_face(face) for face in local_stubs.synthetic_face_detections(duration_seconds * 1000, interval_ms=500)]
+    timeline = MultimodalTimeline(faces, transcript, transcript_words(transcript_json), text_analysis)
+    return transcript, text_analysis, timeline, sentences
+
+
+def test_small_input_goes_in_whole():
+    transcript, text_analysis, timeline, _ = _video(20)
+
+    prompt, usage = prompt_budget.build_report_prompt(transcript, text_analysis, timeline)
+
+    assert not usage['compactado']
+    assert usage['total'] <= usage['orcamento']
+    assert f'TRANSCRIÇÃO: "{transcript}"' in prompt
+    assert "[...]" not in prompt
+    assert json.dumps(timeline.speech_emotions(), ensure_ascii=False) in prompt
+
+
+def test_long_input_is_compacted_under_the_budget():
+    transcript, text_analysis, timeline, sentences = _video(1800, negative_sentence=300)
+    budget = prompt_budget.PROMPT_TOKEN_BUDGET
+    assert prompt_budget.estimate_tokens(transcript) > budget
+
+    prompt, usage = prompt_budget.build_report_prompt(transcript, text_analysis, timeline, budget=budget)
+
+    assert usage['compactado']
+    assert usage['total'] <= budget
+    assert "[...]" in prompt
+    # O resumo guarda o início e o fim (contexto) e o trecho mais negativo do meio
+    for index in (0, 300, len(sentences) - 1):
+        start, end = sentences[index]
+        assert transcript[start:end].strip() in prompt
+    # As listas também são cortadas, mas continuam cobrindo o vídeo
+    assert 0 < usage['fala_x_expressoes'] <= budget // 5
+    assert json.dumps(timeline.speech_emotions(), ensure_ascii=False) not in prompt
@@ -0,0 +1,30 @@
+from conftest import BUCKET, REPORT, orchestrator
+
+
+def _uploading_frames(services, extracted):
+    """Extração sem FFmpeg: cada frame vira um objeto em frames/, como em _extract_and_upload."""
+    def extract(bucket, key, file_id, frames):
+        for frame in frames:
+            frame['FrameKey'] = f"frames/{file_id}_{int(frame['Timestamp'])}.jpg"
+            services.s3.put_object(Bucket=bucket, Key=frame['FrameKey'], Body=b'jpeg')
+        extracted.append([frame['FrameKey'] for frame in frames])
+        return frames
+    return extract
+
+
+def test_early_frames_of_a_discarded_score_are_deleted(services, monkeypatch):
+    # O primeiro relatório é recusado (nível inválido) e o reparo chega com outro score
+    reports = iter([dict(REPORT, score=95, nivel='EXTREMO'), dict(REPORT, score=5, nivel='BAIXO')])
+    monkeypatch.setattr(services.bedrock, 'report_for', lambda prompt: next(reports))
+    extracted = []
+    monkeypatch.setattr(orchestrator, 'extract_and_upload_frames', _uploading_frames(services, extracted))
+    monkeypatch.setattr(orchestrator, 'presign_frames', lambda bucket, frames: frames)
+
+    assert orchestrator.lambda_handler(services.upload('uploads/v1.mp4', b'video'), None)['statusCode'] == 200
+
+    report = services.json('reports/v1_report.json')
+    assert report['risk_score'] == 5
+    kept = {frame['FrameKey'] for frame in report['critical_frames']}
+    stored = {key for bucket, key in services.s3.objects if bucket == BUCKET and key.startswith('frames/')}
+    assert len(extracted) == 2 and set(extracted[0]) - kept
+    assert stored == kept
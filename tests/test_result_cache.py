@@ -0,0 +1,15 @@
+import checkpoint
+from conftest import orchestrator
+
+
+def test_same_content_under_another_name_reuses_the_cache(services, monkeypatch):
+    monkeypatch.setattr(checkpoint, 'RESULT_CACHE_ENABLED', True)
+    # Os frames do fixture não passam pelo FFmpeg (sem FrameKey para assinar de novo)
+    monkeypatch.setattr(orchestrator, 'presign_frames', lambda bucket, frames: frames)
+    assert orchestrator.lambda_handler(services.upload('uploads/v1.mp4', b'video'), None)['statusCode'] == 200
+
+    # Mesmo ETag: as etapas vêm de cache/{etag}/ e nenhum job é iniciado de novo
+    assert orchestrator.lambda_handler(services.upload('uploads/copia.mp4', b'video'), None)['statusCode'] == 200
+    assert services.json('status/copia.json')['step'] == 'COMPLETED'
+    assert len(services.rekognition.jobs) == len(services.transcribe.jobs) == 1
+    assert services.json('reports/copia_report.json')['risk_score'] == services.json('reports/v1_report.json')['risk_score']
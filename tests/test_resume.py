@@ -0,0 +1,92 @@
+import json
+
+import pytest
+
+import jobs
+from conftest import orchestrator
+
+
+class LambdaRecorder:
+    def __init__(self):
+        self.invocations = []
+
+    def invoke(self, FunctionName, InvocationType, Payload):
+        self.invocations.append(json.loads(Payload))
+        return {'StatusCode': 202}
+
+
+class Context:
+    """Contexto da Lambda já dentro da margem do timeout: o polling para na primeira espera."""
+    function_name = 'orchestrator'
+
+    def get_remaining_time_in_millis(self):
+        return jobs.POLL_DEADLINE_MARGIN_MS - 1
+
+
+def _fail_first_report(services, monkeypatch):
+    def unavailable(**kwargs):
+        raise Exception('bedrock indisponível')
+    monkeypatch.setattr(services.bedrock, 'invoke_model_with_response_stream', unavailable)
+    monkeypatch.setattr(services.bedrock, 'invoke_model', unavailable)
+
+
+def test_transient_failure_is_redelivered_and_keeps_jobs(services, monkeypatch):
+    event = services.upload('uploads/v1.mp4', b'video')
+    with monkeypatch.context() as patch:
+        _fail_first_report(services, patch)
+        with pytest.raises(Exception, match='bedrock indisponível'):
+            orchestrator.lambda_handler(event, None)
+
+    assert services.json('status/v1.json')['step'] == 'RETRYING'
+    manifest = services.json('state/v1.json')
+    assert manifest['rek_job_id'] in services.rekognition.jobs
+    assert manifest['trans_job_name'] in services.transcribe.jobs
+
+    # Nova entrega do mesmo evento: termina sem iniciar outros jobs
+    assert orchestrator.lambda_handler(event, None)['statusCode'] == 200
+    assert services.json('status/v1.json')['step'] == 'COMPLETED'
+    assert len(services.rekognition.jobs) == len(services.transcribe.jobs) == 1
+    assert services.json('state/v1.json')['failures'] == 0
+
+
+def test_exhausted_attempts_end_in_error(services, monkeypatch):
+    event = services.upload('uploads/v1.mp4', b'video')
+    _fail_first_report(services, monkeypatch)
+    for _ in range(orchestrator.PIPELINE_MAX_ATTEMPTS - 1):
+        with pytest.raises(Exception):
+            orchestrator.lambda_handler(event, None)
+
+    assert orchestrator.lambda_handler(event, None)['statusCode'] == 500
+    assert services.json('status/v1.json')['step'] == 'ERROR'
+
+
+def test_failed_job_is_the_only_one_discarded(services, monkeypatch):
+    event = services.upload('uploads/v1.mp4', b'video')
+    monkeypatch.setattr(services.rekognition, 'get_face_detection',
+                        lambda **kwargs: {'JobStatus': 'FAILED', 'StatusMessage': 'formato inválido'})
+
+    assert orchestrator.lambda_handler(event, None)['statusCode'] == 500
+    assert services.json('status/v1.json')['step'] == 'ERROR'
+    manifest = services.json('state/v1.json')
+    assert manifest['rek_job_id'] is None
+    assert manifest['trans_job_name'] in services.transcribe.jobs
+
+
+def test_deadline_reinvokes_by_default(services, monkeypatch):
+    recorder = LambdaRecorder()
+    monkeypatch.setitem(orchestrator.CLIENTS._clients, 'lambda', recorder)
+    services.rekognition.job_seconds = 60
+
+    response = orchestrator.lambda_handler(services.upload('uploads/v1.mp4', b'video'), Context())
+    assert response == {'statusCode': 202, 'body': 'Checkpointed'}
+    assert recorder.invocations == [{'resume': {'bucket': 'test-bucket', 'file_id': 'v1'}}]
+
+
+def test_deadline_without_reinvocation_is_redelivered(services, monkeypatch):
+    monkeypatch.setattr(orchestrator, 'RESUME_ON_DEADLINE', False)
+    services.rekognition.job_seconds = 60
+
+    with pytest.raises(jobs.PollDeadlineExceeded):
+        orchestrator.lambda_handler(services.upload('uploads/v1.mp4', b'video'), Context())
+    assert services.json('status/v1.json')['step'] == 'VIDEO_WAIT'
+    assert services.json('state/v1.json')['rek_job_id'] in services.rekognition.jobs
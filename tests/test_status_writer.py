@@ -0,0 +1,89 @@
+import json
+import time
+
+import report
+import status_writer
+from conftest import BUCKET, orchestrator
+
+
+def _status_writes(services, monkeypatch):
+    """Cada gravação de status/ no S3, na ordem em que aconteceu."""
+    writes = []
+    put_object = services.s3.put_object
+
+    def recording_put_object(**kwargs):
+        if kwargs['Key'].startswith('status/'):
+            writes.append(kwargs['Key'])
+        return put_object(**kwargs)
+    monkeypatch.setattr(services.s3, 'put_object', recording_put_object)
+    return writes
+
+
+def _submit(writer, step):
+    writer.submit(BUCKET, 'v1', {"step": step, "message": step, "timestamp": time.time(), "details": None})
+
+
+def test_close_transitions_are_coalesced(services, monkeypatch):
+    writes = _status_writes(services, monkeypatch)
+    writer = status_writer.StatusWriter(flush_interval=60)
+    for step in ("INIT", "VIDEO_START", "AUDIO_START", "VIDEO_WAIT"):
+        _submit(writer, step)
+    assert writes == []
+
+    writer.flush()
+    status = services.json('status/v1.json')
+    assert writes == ['status/v1.json']
+    assert status['step'] == 'VIDEO_WAIT'
+    assert [step for step, _ in status['history']] == ["INIT", "VIDEO_START", "AUDIO_START", "VIDEO_WAIT"]
+
+
+def test_terminal_step_is_written_at_once(services, monkeypatch):
+    writes = _status_writes(services, monkeypatch)
+    writer = status_writer.StatusWriter(flush_interval=60)
+    _submit(writer, "FUSION")
+    _submit(writer, "COMPLETED")
+
+    # Sem esperar a janela de coalescência: o frontend nunca perde o estado terminal
+    assert writes == ['status/v1.json']
+    assert services.json('status/v1.json')['step'] == 'COMPLETED'
+
+    # Um novo upload com o mesmo nome recomeça o histórico
+    _submit(writer, "INIT")
+    writer.flush()
+    assert [step for step, _ in services.json('status/v1.json')['history']] == ["INIT"]
+
+
+def test_background_flush_after_the_window(services):
+    writer = status_writer.StatusWriter(flush_interval=0.01)
+    _submit(writer, "INIT")
+    deadline = time.time() + 2
+    while services.json('status/v1.json') is None and time.time() < deadline:
+        time.sleep(0.01)
+    assert services.json('status/v1.json')['step'] == 'INIT'
+
+
+def test_repeated_step_keeps_one_history_entry(services):
+    writer = status_writer.StatusWriter(flush_interval=60)
+    for step in ("TEXT_ANALYSIS", "FUSION", "FUSION", "FUSION"):
+        _submit(writer, step)
+    writer.flush()
+    assert [step for step, _ in services.json('status/v1.json')['history']] == ["TEXT_ANALYSIS", "FUSION"]
+
+
+def test_partial_report_goes_only_to_the_gateway(services, monkeypatch):
+    monkeypatch.setattr(report, 'REPORT_STREAM_INTERVAL_SECONDS', 0)
+    published, written = [], []
+    monkeypatch.setattr(status_writer.PROGRESS_PUBLISHER, 'publish', lambda file_id, status_data: published.append(status_data))
+    put_object = services.s3.put_object
+
+    def recording_put_object(**kwargs):
+        if kwargs['Key'].startswith('status/'):
+            written.append(json.loads(kwargs['Body']))
+        return put_object(**kwargs)
+    monkeypatch.setattr(services.s3, 'put_object', recording_put_object)
+
+    assert orchestrator.lambda_handler(services.upload('uploads/v1.mp4', b'video'), None)['statusCode'] == 200
+
+    assert any((status['details'] or {}).get('partial_report') for status in published)
+    assert not any((status['details'] or {}).get('partial_report') for status in written)
+    assert [step for step, _ in written[-1]['history']].count('FUSION') == 1
@@ -0,0 +1,28 @@
+import pytest
+
+import sentiment
+
+
+@pytest.mark.parametrize('text', ['...', '   ', '?!'])
+def test_transcript_without_segments_is_empty(services, text):
+    assert sentiment.analyze_text(text) == {}
+    assert services.comprehend.calls['batch_detect_sentiment'] == 0
+
+
+def test_all_segments_rejected(services, monkeypatch):
+    def rejected(TextList, LanguageCode):
+        return {'ResultList': [], 'ErrorList': [{'Index': i, 'ErrorCode': 'INTERNAL_SERVER_ERROR'} for i in range(len(TextList))]}
+    monkeypatch.setattr(services.comprehend, 'batch_detect_sentiment', rejected)
+
+    with pytest.raises(sentiment.SentimentAnalysisError):
+        sentiment.analyze_text('Eu tenho medo. Ele grita comigo.')
+
+
+def test_long_transcript_is_weighted_across_batches(services, monkeypatch):
+    monkeypatch.setattr(sentiment, 'COMPREHEND_BATCH_SIZE', 2)
+    text = ' '.join(f"Frase número {i}." for i in range(1000))
+
+    result = sentiment.analyze_text(text)
+    assert result['Sentiment'] in ('POSITIVE', 'NEGATIVE', 'NEUTRAL', 'MIXED')
+    assert len(result['Segments']) > 2
+    assert abs(sum(result['Scores'].values()) - 1) < 1e-3
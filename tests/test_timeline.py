@@ -0,0 +1,38 @@
+import pytest
+
+import timeline
+
+
+def _face(ms, **confidences):
+    emotion = max(confidences, key=confidences.get)
+    return {"Timestamp": ms, "Emotion": emotion, "Confidence": confidences[emotion],
+            "Emotions": [confidences.get(name, 0.0) for name in timeline.EMOTION_TYPES]}
+
+
+# Calma nos 4 primeiros segundos, medo nos 4 seguintes e uma última face dividida entre tristeza e alegria
+FACES = ([_face(ms, CALM=75.0, HAPPY=25.0) for ms in (0, 500, 1000, 2000, 2500, 3000)]
+         + [_face(ms, FEAR=75.0, CALM=25.0) for ms in (7500, 4000, 5000, 4500, 6000, 7000)]
+         + [_face(9000, SAD=50.0, HAPPY=50.0)])
+
+
+def test_numpy_summary_of_a_fixed_input():
+    pytest.importorskip('numpy')
+    summary = timeline.summarize_emotions(FACES, window_seconds=2, change_threshold=20)
+
+    assert summary["deteccoes"] == 13
+    assert summary["segundos_com_rosto"] == 9
+    assert summary["pico_por_segundo_medio"]["FEAR"] == 33.3
+    assert summary["segundos_em_risco"] == 5
+    assert summary["trocas_de_emocao_dominante"] == 2
+    assert summary["mudancas_de_risco"] == [{"t_s": 4, "antes_pct": 0.0, "depois_pct": 75.0},
+                                            {"t_s": 8, "antes_pct": 75.0, "depois_pct": 50.0}]
+
+
+def test_python_fallback_matches_numpy(monkeypatch):
+    pytest.importorskip('numpy')
+    vectorized = timeline.summarize_emotions(FACES, window_seconds=2, change_threshold=20)
+
+    # Runtime sem a layer do NumPy
+    monkeypatch.setattr(timeline, 'np', None)
+    monkeypatch.setattr(timeline, '_numpy_checked', True)
+    assert timeline.summarize_emotions(FACES, window_seconds=2, change_threshold=20) == vectorized
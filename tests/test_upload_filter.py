@@ -0,0 +1,86 @@
+from collections import Counter
+
+import pytest
+
+from conftest import BUCKET, orchestrator
+
+
+@pytest.fixture
+def ignored(monkeypatch):
+    """Contadores do container zerados para o teste."""
+    counters = Counter()
+    monkeypatch.setattr(orchestrator, 'IGNORED_EVENTS', counters)
+    return counters
+
+
+def _upload(key, size=1024, event_name='ObjectCreated:Put'):
+    obj = {'key': key} if size is None else {'key': key, 'size': size}
+    return (BUCKET, key, {'eventName': event_name, 's3': {'bucket': {'name': BUCKET}, 'object': obj}}, None)
+
+
+@pytest.mark.parametrize('upload, reason', [
+    pytest.param(_upload('uploads/v1.mp4', event_name='ObjectRemoved:Delete'), 'event_type', id="remocao"),
+    pytest.param(_upload('status/v1.json'), 'prefix', id="status-do-pipeline"),
+    pytest.param(_upload('chunks/v1/part_000.mp4'), 'prefix', id="trecho-do-pipeline"),
+    pytest.param(_upload('outros/v1.mp4'), 'prefix', id="fora-de-uploads"),
+    pytest.param(_upload('uploads/notas.txt'), 'extension', id="extensao"),
+    pytest.param(_upload('uploads/vazio.mp4', size=0), 'size', id="vazio"),
+    pytest.param(_upload('uploads/grande.mp4', size=2048), 'size', id="acima-do-maximo"),
+])
+def test_rejected_by_the_event_alone(services, ignored, monkeypatch, upload, reason):
+    monkeypatch.setattr(orchestrator, 'UPLOAD_MAX_BYTES', 1500)
+
+    assert orchestrator.filter_uploads([upload]) == []
+    assert ignored == {reason: 1}
+    assert services.s3.calls['head_object'] == 0
+
+
+def test_pipeline_prefixes_are_rejected_without_an_upload_prefix(services, ignored, monkeypatch):
+    # Sem UPLOAD_PREFIXES qualquer chave de vídeo entra, menos as que o próprio pipeline grava
+    monkeypatch.setattr(orchestrator, 'UPLOAD_PREFIXES', ())
+    uploads = [_upload('chunks/v1/part_000.mp4'), _upload('frames/v1/frame_1.mp4'), _upload('v1.MOV'), _upload('celular/v2.mp4')]
+
+    assert [key for _, key, _, _ in orchestrator.filter_uploads(uploads)] == ['v1.MOV', 'celular/v2.mp4']
+    assert ignored == {'prefix': 2}
+
+
+def test_content_type_is_checked_only_for_the_remaining_candidates(services, ignored, monkeypatch):
+    monkeypatch.setattr(orchestrator, 'UPLOAD_CONTENT_TYPES', ('video/',))
+    services.s3.put_object(Bucket=BUCKET, Key='uploads/v1.mp4', Body=b'video', ContentType='video/mp4')
+    services.s3.put_object(Bucket=BUCKET, Key='uploads/v2.mp4', Body=b'texto', ContentType='text/plain')
+    uploads = [_upload('uploads/v1.mp4', size=5), _upload('uploads/v2.mp4', size=5), _upload('uploads/notas.txt'),
+               _upload('reports/v1_report.mp4'), _upload('uploads/vazio.mp4', size=0)]
+
+    videos = orchestrator.filter_uploads(uploads)
+
+    assert [key for _, key, _, _ in videos] == ['uploads/v1.mp4']
+    assert ignored == {'content_type': 1, 'extension': 1, 'prefix': 1, 'size': 1}
+    # Chave e tamanho decidem três eventos: só os dois candidatos restantes vão ao HEAD
+    assert services.s3.calls['head_object'] == 2
+    # O ETag do HEAD fica no record e get_content_key não repete a chamada
+    assert videos[0][2]['s3']['object']['eTag'] == services.s3.objects[(BUCKET, 'uploads/v1.mp4')]['ETag']
+
+
+def test_head_only_when_the_event_has_no_size(services, ignored):
+    services.s3.put_object(Bucket=BUCKET, Key='uploads/v1.mp4', Body=b'video', ContentType='video/mp4')
+    services.s3.put_object(Bucket=BUCKET, Key='uploads/vazio.mp4', Body=b'', ContentType='video/mp4')
+    uploads = [_upload('uploads/v1.mp4', size=None), _upload('uploads/vazio.mp4', size=None),
+               _upload('uploads/apagado.mp4', size=None), _upload('uploads/v3.mp4', size=5)]
+
+    videos = orchestrator.filter_uploads(uploads)
+
+    assert [key for _, key, _, _ in videos] == ['uploads/v1.mp4', 'uploads/v3.mp4']
+    assert ignored == {'size': 1, 'not_found': 1}
+    assert services.s3.calls['head_object'] == 3
+    assert videos[0][2]['s3']['object']['size'] == 5
+
+
+def test_counters_accumulate_across_invocations(services, ignored):
+    status_write = {'Records': [_upload('status/v1.json')[2], _upload('reports/v1_report.json')[2]]}
+
+    assert orchestrator.lambda_handler(status_write, None) == {'statusCode': 200, 'body': 'Ignored'}
+    assert orchestrator.lambda_handler({'Records': []}, None) == {'statusCode': 200, 'body': 'Ignored'}
+    assert orchestrator.lambda_handler(status_write, None) == {'statusCode': 200, 'body': 'Ignored'}
+
+    assert ignored == {'prefix': 4, 'no_records': 1}
+    assert sum(services.s3.calls.values()) == 0